@@ -46,12 +46,21 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'mainApp.tracing.TracingMiddleware',  # Solo activo con TRACING_ENABLED=True
+    'mainApp.metrics.MetricsMiddleware',  # Solo activo con METRICS_ENABLED=True
+    'mainApp.instrumentation.QueryInstrumentationMiddleware',  # Solo activo con QUERY_INSTRUMENTATION=True
+    'mainApp.memoria.MemoryProfilingMiddleware',  # Solo activo con MEMORY_PROFILING=True
+    'mainApp.cache.GeneracionCacheMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Para servir archivos estáticos en producción
+    'mainApp.estaticos.WhiteNoiseMiddleware',  # WhiteNoise (estáticos en producción) con soporte async
+    'mainApp.medios.MediosMiddleware',  # Carpetas públicas de /media/, antes de la sesión
+    'mainApp.compresion.CompresionMiddleware',  # Brotli/gzip para HTML y JSON (COMPRESSION_ENABLED)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'mainApp.replicas.ReplicaMiddleware',  # Solo activo con DATABASE_REPLICA_URL
+    'mainApp.profiling.ProfilerMiddleware',  # Solo activo con PROFILING_ENABLED=True
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -60,7 +69,7 @@ ROOT_URLCONF = 'DjangoRescatando.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'mainApp.tracing.DjangoTemplates',  # DjangoTemplates con un span por render
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -81,6 +90,20 @@ WSGI_APPLICATION = 'DjangoRescatando.wsgi.application'
 import pymysql
 pymysql.install_as_MySQLdb()
 
+# Conexiones
+# DB_CONN_MAX_AGE: segundos que cada worker (o hilo) reutiliza su conexión
+# en lugar de abrir una por request; 0 la cierra al terminar cada request.
+# DB_POOL=True (solo PostgreSQL, requiere psycopg[pool]) usa el pool de
+# psycopg: cada proceso mantiene entre DB_POOL_MIN_SIZE y DB_POOL_MAX_SIZE
+# conexiones compartidas por sus hilos, y un request espera hasta
+# DB_POOL_TIMEOUT segundos por una libre. El pool reemplaza a las conexiones
+# persistentes, así que con DB_POOL se ignora DB_CONN_MAX_AGE.
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', '600'))
+DB_POOL = os.environ.get('DB_POOL', 'False') == 'True'
+DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', '2'))
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '10'))
+
 # Database configuration para desarrollo y producción
 if 'DATABASE_URL' in os.environ:
     # Producción (Render con PostgreSQL)
@@ -88,7 +111,7 @@ if 'DATABASE_URL' in os.environ:
     DATABASES = {
         'default': dj_database_url.config(
             default=os.environ.get('DATABASE_URL'),
-            conn_max_age=600,
+            conn_max_age=DB_CONN_MAX_AGE,
             conn_health_checks=True,
         )
     }
@@ -102,6 +125,8 @@ else:
             'PASSWORD': 'rescatando1',
             'HOST': 'localhost',
             'PORT': '3306',
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
             'OPTIONS': {
                 'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
                 'charset': 'utf8mb4',
@@ -109,6 +134,63 @@ else:
         }
     }
 
+# Réplica de lectura opcional (mainApp.replicas): las vistas marcadas con
+# @lectura_en_replica leen de DATABASE_REPLICA_URL. Después de escribir, el
+# resto del request y los requests de la misma sesión durante
+# REPLICA_STICKY_SECONDS (el retraso de replicación tolerado) leen de la
+# primaria. Sin réplica el alias apunta a la misma base y no se usa; existe
+# para que las pruebas puedan ejercitar el router (TEST MIRROR).
+DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL', '')
+REPLICA_ENABLED = bool(DATABASE_REPLICA_URL)
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', '5'))
+if REPLICA_ENABLED:
+    import dj_database_url
+    DATABASES['replica'] = dj_database_url.parse(DATABASE_REPLICA_URL, conn_max_age=DB_CONN_MAX_AGE,
+                                                 conn_health_checks=True)
+else:
+    DATABASES['replica'] = dict(DATABASES['default'])
+DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+DATABASE_ROUTERS = ['mainApp.replicas.ReplicaRouter']
+
+for _db in DATABASES.values():
+    if DB_POOL and _db['ENGINE'] == 'django.db.backends.postgresql':
+        _db['CONN_MAX_AGE'] = 0
+        _db['CONN_HEALTH_CHECKS'] = False  # el pool ya revisa las conexiones
+        _db.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': DB_POOL_MIN_SIZE,
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': DB_POOL_TIMEOUT,
+        }
+    # Mismos backends con métricas de conexión (mainApp.backends)
+    if _db['ENGINE'] in ('django.db.backends.postgresql', 'django.db.backends.mysql', 'django.db.backends.sqlite3'):
+        _db['ENGINE'] = _db['ENGINE'].replace('django.db.backends.', 'mainApp.backends.')
+
+# Caché
+# CACHE_BACKEND: 'locmem' (desarrollo, por proceso), 'file' (un solo servidor,
+# compartida entre workers) o 'redis' (CACHE_URL). Subir CACHE_VERSION
+# invalida todas las claves existentes sin tener que vaciar la caché.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+_CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'rescatando'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache',
+             os.environ.get('CACHE_DIR', os.path.join(BASE_DIR, 'cache'))),
+    'redis': ('django.core.cache.backends.redis.RedisCache',
+              os.environ.get('CACHE_URL', 'redis://localhost:6379/0')),
+}
+CACHES = {
+    'default': {
+        'BACKEND': _CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': _CACHE_BACKENDS[CACHE_BACKEND][1],
+        'TIMEOUT': int(os.environ.get('CACHE_TIMEOUT', '300')),
+        'KEY_PREFIX': 'rescatando',
+        'VERSION': int(os.environ.get('CACHE_VERSION', '1')),
+        'OPTIONS': {'MAX_ENTRIES': 5000} if CACHE_BACKEND != 'redis' else {},
+    }
+}
+# Fragmentos por fila ({% cache_fila %}); la clave incluye la marca
+# 'actualizado' de la fila, así que un TTL largo no sirve datos viejos
+CACHE_FRAGMENTOS_TIMEOUT = int(os.environ.get('CACHE_FRAGMENTOS_TIMEOUT', '86400'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -148,8 +230,16 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [STATIC_DIR]
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')  # Para collectstatic en producción
 
-# WhiteNoise - Compresión y caché de archivos estáticos
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# WhiteNoise - Compresión y caché de archivos estáticos. En desarrollo no se
+# exige el manifest de collectstatic. Los archivos subidos llevan el hash del
+# contenido en el nombre (mainApp.medios.AlmacenamientoMedios).
+STORAGES = {
+    'default': {'BACKEND': 'mainApp.medios.AlmacenamientoMedios'},
+    'staticfiles': {
+        'BACKEND': ('django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+                    else 'whitenoise.storage.CompressedManifestStaticFilesStorage'),
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -158,6 +248,14 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Archivos subidos servidos por mainApp.medios también en producción.
+# Las carpetas privadas solo las ven admin/voluntarios y el adoptante dueño.
+MEDIA_PRIVATE_DIRS = ['carnets/', 'contratos/']
+MEDIA_MAX_AGE = int(os.environ.get('MEDIA_MAX_AGE', '3600'))  # nombres sin hash de contenido
+# 'x-accel' (nginx, con una location internal en MEDIA_SENDFILE_PREFIX) o
+# 'x-sendfile' (Apache/mod_xsendfile) para que el servidor web envíe el archivo
+MEDIA_SENDFILE = os.environ.get('MEDIA_SENDFILE', '')
+MEDIA_SENDFILE_PREFIX = os.environ.get('MEDIA_SENDFILE_PREFIX', '/media-interno/')
 
 # CSRF Settings
 CSRF_TRUSTED_ORIGINS = os.environ.get('CSRF_TRUSTED_ORIGINS', 'http://127.0.0.1:8000,http://localhost:8000').split(',')
@@ -167,16 +265,19 @@ SESSION_COOKIE_SECURE = not DEBUG
 
 # Email Configuration
 # PRODUCCIÓN: Gmail configurado para benjaminignacio1998@gmail.com
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
-EMAIL_HOST = 'smtp.gmail.com'
-EMAIL_PORT = 587
-EMAIL_USE_TLS = True
+# mainApp.correo.EmailBackend registra métricas y delega el envío en EMAIL_BACKEND_DESTINO
+EMAIL_BACKEND = 'mainApp.correo.EmailBackend'
+EMAIL_BACKEND_DESTINO = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'smtp.gmail.com')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', '587'))
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'True') == 'True'
+EMAIL_TIMEOUT = int(os.environ.get('EMAIL_TIMEOUT', '30'))
 EMAIL_HOST_USER = 'benjaminignacio1998@gmail.com'
 EMAIL_HOST_PASSWORD = 'bmzh owgr crek occl'  # Contraseña de aplicación: RescatandoAndoStg
 DEFAULT_FROM_EMAIL = 'benjaminignacio1998@gmail.com'
 
 # DESARROLLO: Descomentar para mostrar emails en consola sin enviar
-# EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+# EMAIL_BACKEND_DESTINO = 'django.core.mail.backends.console.EmailBackend'
 # DEFAULT_FROM_EMAIL = 'benjaminignacio1998@gmail.com'
 
 # Security Settings
@@ -187,6 +288,30 @@ FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5 MB
 # Límite de tamaño de request
 DATA_UPLOAD_MAX_NUMBER_FIELDS = 1000
 
+# Imágenes subidas (mainApp.subidas): se escriben a disco a medida que llegan
+# y se descartan apenas superan el tamaño o no son JPEG/PNG/GIF/WebP
+UPLOAD_MAX_IMAGE_BYTES = int(os.environ.get('UPLOAD_MAX_IMAGE_BYTES', str(10 * 1024 * 1024)))
+UPLOAD_MAX_REQUEST_BYTES = int(os.environ.get('UPLOAD_MAX_REQUEST_BYTES', str(25 * 1024 * 1024)))
+UPLOAD_MAX_PIXELS = 50_000_000
+# Subidas por partes (reanudables): tamaño máximo de cada parte, carpeta de
+# los archivos a medio subir y horas sin actividad antes de limpiar_subidas
+UPLOAD_CHUNK_BYTES = int(os.environ.get('UPLOAD_CHUNK_BYTES', str(1024 * 1024)))
+UPLOAD_PARTS_DIR = os.environ.get('UPLOAD_PARTS_DIR', os.path.join(BASE_DIR, 'subidas_parciales'))
+UPLOAD_PARTS_TTL_HOURS = 24
+
+# Avisos en vivo del dashboard (mainApp.eventos): cada cuántos segundos se
+# revisa la tabla de eventos en un stream SSE, cuánto dura el stream antes de
+# que el navegador se reconecte, cada cuántos segundos pregunta el navegador
+# bajo WSGI y los días que se guardan los eventos (limpiar_eventos)
+EVENTS_POLL_SECONDS = int(os.environ.get('EVENTS_POLL_SECONDS', '2'))
+EVENTS_STREAM_SECONDS = int(os.environ.get('EVENTS_STREAM_SECONDS', '300'))
+EVENTS_CLIENT_POLL_SECONDS = int(os.environ.get('EVENTS_CLIENT_POLL_SECONDS', '15'))
+EVENTS_TTL_DAYS = 7
+
+# Días de anticipación de los recordatorios de control veterinario
+# (manage.py recordatorios_control, mainApp.recordatorios)
+CHECKUP_REMINDER_DAYS = int(os.environ.get('CHECKUP_REMINDER_DAYS', '7'))
+
 # Protección contra Clickjacking
 X_FRAME_OPTIONS = 'DENY'
 
@@ -212,3 +337,87 @@ MESSAGE_TAGS = {
     messages.INFO: 'info',
 }
 
+# Instrumentación de rendimiento
+# QUERY_INSTRUMENTATION=True agrega Server-Timing con consultas/tiempo SQL y
+# registra en el log los requests más lentos que SLOW_REQUEST_MS
+QUERY_INSTRUMENTATION = os.environ.get('QUERY_INSTRUMENTATION', 'False') == 'True'
+SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', '500'))
+
+# Perfilado bajo demanda: un admin puede perfilar un request puntual con un
+# token firmado (ver /perfilar/). Los .prof quedan en PROFILING_DIR.
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'False') == 'True'
+PROFILING_DIR = os.environ.get('PROFILING_DIR', os.path.join(BASE_DIR, 'perfiles'))
+PROFILING_TOKEN_MAX_AGE = 300  # segundos
+
+# Compresión de respuestas dinámicas (mainApp.compresion). Brotli requiere
+# el paquete brotli; sin él se usa gzip. Calidad 4-5 de Brotli comprime más
+# que gzip 6 con un costo de CPU parecido; las calidades altas son para
+# archivos estáticos precomprimidos.
+COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'True') == 'True'
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', '5'))
+
+# Métricas Prometheus en /metrics (Authorization: Bearer METRICS_TOKEN o sesión admin)
+# Con varios workers de gunicorn, METRICS_DIR debe ser un directorio compartido
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'False') == 'True'
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_FLUSH_SECONDS = 5
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Trazas por request (SQL, plantillas, correo y PDF como spans hijos)
+TRACING_ENABLED = os.environ.get('TRACING_ENABLED', 'False') == 'True'
+TRACING_SAMPLE_RATE = float(os.environ.get('TRACING_SAMPLE_RATE', '0.1'))
+TRACING_EXPORTER = os.environ.get('TRACING_EXPORTER', 'jsonl')  # 'jsonl', 'otlp' o '' para no exportar
+TRACING_JSONL_PATH = os.environ.get('TRACING_JSONL_PATH', os.path.join(BASE_DIR, 'trazas.jsonl'))
+TRACING_OTLP_ENDPOINT = os.environ.get('TRACING_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces')
+TRACING_SERVICE_NAME = 'rescatando'
+
+# Medición de memoria por request con tracemalloc (mainApp.memoria). Agrega
+# overhead considerable: usar solo en diagnóstico y con workers sync
+MEMORY_PROFILING = os.environ.get('MEMORY_PROFILING', 'False') == 'True'
+MEMORY_PROFILING_FRAMES = int(os.environ.get('MEMORY_PROFILING_FRAMES', '1'))
+MEMORY_LOG_THRESHOLD_KB = int(os.environ.get('MEMORY_LOG_THRESHOLD_KB', '10240'))
+
+# Auditoría de moderación (mainApp.auditoria). Los eventos se insertan desde
+# un hilo, de a AUDIT_BATCH_SIZE o cada AUDIT_FLUSH_SECONDS; con
+# AUDIT_ASYNC=False se escriben dentro del request. En PostgreSQL,
+# particiones_auditoria crea AUDIT_PARTITIONS_AHEAD meses de particiones.
+AUDIT_ASYNC = os.environ.get('AUDIT_ASYNC', 'True') == 'True'
+AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', '100'))
+AUDIT_FLUSH_SECONDS = int(os.environ.get('AUDIT_FLUSH_SECONDS', '1'))
+AUDIT_PARTITIONS_AHEAD = int(os.environ.get('AUDIT_PARTITIONS_AHEAD', '3'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'trace_id': {
+            '()': 'mainApp.tracing.TraceIdFilter',
+        },
+    },
+    'formatters': {
+        'con_traza': {
+            'format': '%(levelname)s %(name)s [trace=%(trace_id)s] %(message)s',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'filters': ['trace_id'],
+            'formatter': 'con_traza',
+        },
+    },
+    'loggers': {
+        'mainApp.rendimiento': {
+            'handlers': ['console'],
+            'level': os.environ.get('PERF_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+        'mainApp.tracing': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
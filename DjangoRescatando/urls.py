@@ -16,8 +16,9 @@ Including another URLconf
 """
 from django.conf import settings
 from django.contrib import admin
-from django.urls import path
-from django.conf.urls.static import static
+import re
+
+from django.urls import path, re_path
 from django.contrib.auth import views as auth_views
 from mainApp import views
 
@@ -41,6 +42,19 @@ urlpatterns = [
     path('agregar_animal/', views.agregar_animal, name='agregar_animal'),
     path('gestionar_animales/', views.gestionar_animales, name='gestionar_animales'),
     path('api/ficha/<int:id_animal>/', views.obtener_ficha_medica, name='obtener_ficha_medica'),
+    path('api/ficha/<int:id_animal>/historial/', views.historial_ficha_medica, name='historial_ficha_medica'),
+    path('api/fichas/', views.obtener_fichas_medicas, name='obtener_fichas_medicas'),
+    
+    # API JSON de solo lectura del dashboard de moderación (admin/voluntario)
+    path('api/solicitudes/', views.api_moderacion, {'recurso': 'solicitudes'}, name='api_solicitudes'),
+    path('api/adopciones/', views.api_moderacion, {'recurso': 'adopciones'}, name='api_adopciones'),
+    path('api/voluntariado/', views.api_moderacion, {'recurso': 'voluntariado'}, name='api_voluntariado'),
+    path('api/donaciones/', views.api_moderacion, {'recurso': 'donaciones'}, name='api_donaciones'),
+    path('api/eventos/', views.eventos_dashboard, name='eventos_dashboard'),
+
+    # Subidas por partes (carnets y comprobantes)
+    path('api/subidas/', views.crear_subida, name='crear_subida'),
+    path('api/subidas/<uuid:id_subida>/', views.subida_parcial, name='subida_parcial'),
     
     # Adopciones (público y admin/voluntario)
     path('solicitar_adopcion/<int:animal_id>/', views.solicitar_adopcion, name='solicitar_adopcion'),
@@ -59,7 +73,14 @@ urlpatterns = [
     # Gestión de usuarios (solo admin)
     path('gestionar_usuarios/', views.gestionar_usuarios_view, name='gestionar_usuarios'),
     path('cambiar_rol/<int:usuario_id>/', views.cambiar_rol_usuario, name='cambiar_rol_usuario'),
+    
+    # Rendimiento (solo admin)
+    path('perfilar/', views.perfilar, name='perfilar'),
+    path('metrics', views.metricas, name='metricas'),
+    
+    # Carpetas privadas de archivos subidos (control de acceso en mainApp.medios).
+    # Las públicas las sirve MediosMiddleware antes de la sesión.
+    re_path(r'^{}(?P<ruta>(?:{}).+)$'.format(re.escape(settings.MEDIA_URL.lstrip('/')),
+                                            '|'.join(re.escape(carpeta) for carpeta in settings.MEDIA_PRIVATE_DIRS)),
+            views.servir_medio, name='servir_medio'),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -0,0 +1,120 @@
+"""
+Tamaño y latencia de la API JSON de moderación frente a las páginas HTML.
+
+Levanta gunicorn y pide --requests veces cada página del dashboard y la API
+equivalente: con los campos por defecto, con un fields= mínimo y recorriendo
+todas las páginas con `siguiente`. Reporta bytes en la red (sin comprimir y
+con Brotli), cantidad de filas y la latencia p50.
+
+Uso:
+    python bench/api.py --requests 30
+    python bench/api.py --limite 100 --admin admin_bench
+
+Sin --admin se ejecuta antes `manage.py seed_bench` para tener datos y una
+cuenta admin. Requiere httpx (pip install -r bench/requirements.txt).
+"""
+
+import argparse
+import json
+import signal
+import statistics
+import time
+from types import SimpleNamespace
+
+from compresion import iniciar_sesion
+from loadtest import iniciar_gunicorn, puerto_libre, sembrar_datos
+
+import httpx
+
+CAMPOS_MINIMOS = 'estado,animal.nombre,adoptante.nombre'
+
+
+def casos(limite):
+    """(nombre, url o None para recorrer la API paginada)"""
+    return [
+        ('ver_solicitudes (HTML)', '/ver_solicitudes/'),
+        ('api solicitudes', f'/api/solicitudes/?limite={limite}'),
+        ('api solicitudes fields', f'/api/solicitudes/?limite={limite}&fields={CAMPOS_MINIMOS}'),
+        ('api pendientes fields', f'/api/solicitudes/?limite={limite}&estado=pendiente&fields={CAMPOS_MINIMOS}'),
+        ('api adopciones', f'/api/adopciones/?limite={limite}'),
+        ('api solicitudes todas', None),
+    ]
+
+
+def pedir(client, url, codificacion):
+    """(bytes en la red, filas, siguiente) de un GET"""
+    with client.stream('GET', url, headers={'Accept-Encoding': codificacion}) as response:
+        response.raise_for_status()
+        contenido = response.read()
+        # Bytes tal como llegaron por la red, antes de descomprimir
+        bytes_red = response.num_bytes_downloaded
+    if 'json' not in response.headers.get('content-type', ''):
+        return bytes_red, None, None
+    datos = json.loads(contenido)
+    return bytes_red, len(datos['resultados']), datos['siguiente']
+
+
+def recorrer(client, limite, codificacion):
+    """Todas las solicitudes siguiendo `siguiente`, como un cliente que sincroniza"""
+    url, total_bytes, total_filas = f'/api/solicitudes/?limite={limite}&fields={CAMPOS_MINIMOS}', 0, 0
+    while url:
+        bytes_red, filas, url = pedir(client, url, codificacion)
+        total_bytes += bytes_red
+        total_filas += filas
+    return total_bytes, total_filas
+
+
+def medir_caso(client, url, limite, requests):
+    resultado = {}
+    for codificacion in ('identity', 'br'):
+        tamanos, latencias, filas = [], [], None
+        for _ in range(requests):
+            inicio = time.perf_counter()
+            if url is None:
+                bytes_red, filas = recorrer(client, limite, codificacion)
+            else:
+                bytes_red, filas, _ = pedir(client, url, codificacion)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            tamanos.append(bytes_red)
+        resultado[codificacion] = {'bytes': int(statistics.median(tamanos)),
+                                   'p50_ms': round(statistics.median(latencias), 2)}
+        resultado['filas'] = filas
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--limite', type=int, default=50, help='Filas por página de la API')
+    parser.add_argument('--admin', help='Cuenta admin (contraseña bench12345)')
+    parser.add_argument('--animales', type=int, default=50, help='Tamaño de los datos si se ejecuta seed_bench')
+    parser.add_argument('--json', help='Guardar el resultado en este archivo')
+    args = parser.parse_args()
+    if not args.admin:
+        args.admin, _ = sembrar_datos(args)
+
+    puerto = puerto_libre()
+    proceso = iniciar_gunicorn(SimpleNamespace(workers=1, threads=1, worker_class='sync'), puerto)
+    resultados = {}
+    try:
+        with httpx.Client(base_url=f'http://127.0.0.1:{puerto}', timeout=60) as client:
+            iniciar_sesion(client, args.admin)
+            for nombre, url in casos(args.limite):
+                resultados[nombre] = medir_caso(client, url, args.limite, args.requests)
+    finally:
+        proceso.send_signal(signal.SIGTERM)
+        proceso.wait(30)
+
+    print(f"\nMediana de {args.requests} requests (API con limite={args.limite})")
+    print(f"{'caso':<26}{'filas':>7}{'bytes':>11}{'bytes br':>10}{'p50 ms':>9}")
+    for nombre, r in resultados.items():
+        filas = '-' if r['filas'] is None else r['filas']
+        print(f"{nombre:<26}{filas:>7}{r['identity']['bytes']:>11}{r['br']['bytes']:>10}"
+              f"{r['identity']['p50_ms']:>9.1f}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as archivo:
+            json.dump({'configuracion': vars(args), 'resultados': resultados}, archivo, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
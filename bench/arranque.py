@@ -0,0 +1,130 @@
+"""
+Arranque en frío y latencia del primer request: gunicorn sin configuración
+contra el perfil de producción (gunicorn.conf.py: preload y precalentamiento).
+
+Para cada perfil y repetición lanza gunicorn con un solo worker (así el
+primer request llega seguro a un worker recién creado) y mide:
+
+- listo: desde el lanzamiento hasta la primera respuesta HTTP.
+- primer request y siguientes (mediana) de cada URL de --urls.
+- reciclado: se mata el worker (como al alcanzar max_requests) y se mide el
+  siguiente request a la primera URL, que espera al worker nuevo.
+
+Uso:
+    python bench/arranque.py --repeticiones 5
+    python bench/arranque.py --perfiles produccion --urls /,/donacion/ --json arranque.json
+
+Solo Linux (lee los workers de /proc). Usa la base configurada en el
+entorno (DATABASE_URL). Requiere httpx
+(pip install -r bench/requirements.txt).
+"""
+
+import argparse
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+
+from loadtest import BASE_DIR, puerto_libre
+
+import httpx
+
+PERFILES = {
+    # Un archivo de configuración vacío evita que gunicorn lea ./gunicorn.conf.py
+    'base': ['--config', os.devnull],
+    'produccion': ['--config', str(BASE_DIR / 'gunicorn.conf.py')],
+}
+URLS = ['/', '/ayudar/', '/donacion/', '/recuperar-contrasena/', '/ver_comprobantes/']
+REPETICIONES_CALIENTE = 5
+
+
+def workers(pid_maestro):
+    with open(f'/proc/{pid_maestro}/task/{pid_maestro}/children') as archivo:
+        return [int(pid) for pid in archivo.read().split()]
+
+
+def medir_arranque(perfil, urls):
+    puerto = puerto_libre()
+    comando = [
+        sys.executable, '-m', 'gunicorn', 'DjangoRescatando.wsgi:application', *PERFILES[perfil],
+        '--bind', f'127.0.0.1:{puerto}', '--workers', '1', '--log-level', 'warning',
+    ]
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen(comando, cwd=BASE_DIR)
+    base_url = f'http://127.0.0.1:{puerto}'
+    try:
+        with httpx.Client(base_url=base_url, timeout=30) as client:
+            limite = time.monotonic() + 60
+            while True:
+                if proceso.poll() is not None or time.monotonic() > limite:
+                    sys.exit(f'gunicorn ({perfil}) no respondió')
+                try:
+                    # Cualquier respuesta sirve; /robots.txt no renderiza plantillas del sitio
+                    client.get('/robots.txt')
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.02)
+            resultado = {'listo_ms': (time.perf_counter() - inicio) * 1000, 'urls': {}}
+
+            for url in urls:
+                tiempos = []
+                for _ in range(1 + REPETICIONES_CALIENTE):
+                    t0 = time.perf_counter()
+                    client.get(url)
+                    tiempos.append((time.perf_counter() - t0) * 1000)
+                resultado['urls'][url] = {'primero_ms': tiempos[0], 'caliente_ms': statistics.median(tiempos[1:])}
+
+            for worker in workers(proceso.pid):
+                os.kill(worker, signal.SIGKILL)
+            t0 = time.perf_counter()
+            client.get(urls[0])
+            resultado['reciclado_ms'] = (time.perf_counter() - t0) * 1000
+        return resultado
+    finally:
+        proceso.send_signal(signal.SIGTERM)
+        proceso.wait(30)
+
+
+def resumir(mediciones):
+    """Mediana de cada métrica entre repeticiones"""
+    return {
+        'listo_ms': round(statistics.median(m['listo_ms'] for m in mediciones), 1),
+        'reciclado_ms': round(statistics.median(m['reciclado_ms'] for m in mediciones), 1),
+        'urls': {
+            url: {clave: round(statistics.median(m['urls'][url][clave] for m in mediciones), 1)
+                  for clave in ('primero_ms', 'caliente_ms')}
+            for url in mediciones[0]['urls']
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--perfiles', type=lambda t: t.split(','), default=list(PERFILES))
+    parser.add_argument('--urls', type=lambda t: t.split(','), default=URLS)
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--json', help='Guardar el resultado en este archivo')
+    args = parser.parse_args()
+
+    resultados = {perfil: resumir([medir_arranque(perfil, args.urls) for _ in range(args.repeticiones)])
+                  for perfil in args.perfiles}
+
+    print(f"\nMediana de {args.repeticiones} arranques, 1 worker (ms)")
+    print(f"{'perfil':<12}{'listo':>8}{'reciclado':>11}")
+    for perfil, r in resultados.items():
+        print(f"{perfil:<12}{r['listo_ms']:>8.0f}{r['reciclado_ms']:>11.0f}")
+    print(f"\n{'url':<26}" + ''.join(f"{perfil + ' 1º':>16}{'caliente':>10}" for perfil in resultados))
+    for url in args.urls:
+        fila = ''.join(f"{r['urls'][url]['primero_ms']:>16.1f}{r['urls'][url]['caliente_ms']:>10.1f}"
+                       for r in resultados.values())
+        print(f"{url:<26}{fila}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as archivo:
+            json.dump({'configuracion': vars(args), 'resultados': resultados}, archivo, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Bytes transferidos y costo de CPU de comprimir el HTML dinámico.
+
+Levanta gunicorn con las métricas activadas y pide cada página --requests
+veces sin compresión, con gzip y con Brotli. Reporta el tamaño en la red,
+la latencia p50 y el tiempo que el servidor pasó comprimiendo por request
+(histograma rescatando_compression_seconds de /metrics).
+
+Uso:
+    python bench/compresion.py --requests 50
+    python bench/compresion.py --paginas /,/ver_solicitudes/ --calidad-brotli 4
+
+Sin --admin se ejecuta antes `manage.py seed_bench` para tener datos y una
+cuenta admin (las páginas del dashboard requieren sesión). Requiere httpx
+(pip install -r bench/requirements.txt).
+"""
+
+import argparse
+import json
+import re
+import signal
+import statistics
+import tempfile
+import time
+from types import SimpleNamespace
+
+from loadtest import _CSRF, CONTRASENA_BENCH, iniciar_gunicorn, puerto_libre, sembrar_datos
+
+import httpx
+
+CODIFICACIONES = {'identidad': 'identity', 'gzip': 'gzip', 'br': 'br'}
+TOKEN = 'bench-compresion'
+_MUESTRA = re.compile(r'^rescatando_compression_seconds_(sum|count)\{codificacion="(\w+)"\} (\S+)$', re.MULTILINE)
+
+
+def compresion_en_metricas(client):
+    texto = client.get('/metrics', headers={'Authorization': f'Bearer {TOKEN}'}).text
+    totales = {}
+    for campo, codificacion, valor in _MUESTRA.findall(texto):
+        totales[(codificacion, campo)] = float(valor)
+    return totales
+
+
+def iniciar_sesion(client, cuenta):
+    pagina = client.get('/login/')
+    token = _CSRF.search(pagina.text)
+    client.post('/login/', data={'csrfmiddlewaretoken': token.group(1) if token else '', 'cuenta': cuenta,
+                                 'contraseña': CONTRASENA_BENCH})
+
+
+def medir_pagina(client, pagina, codificacion, requests):
+    tamanos, latencias = [], []
+    for _ in range(requests):
+        inicio = time.perf_counter()
+        with client.stream('GET', pagina, headers={'Accept-Encoding': codificacion}) as response:
+            # Bytes tal como llegaron por la red, sin descomprimir
+            tamanos.append(sum(len(parte) for parte in response.iter_raw()))
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tamanos), statistics.median(latencias)
+
+
+def medir(args, base_url):
+    resultados = {}
+    with httpx.Client(base_url=base_url, timeout=30) as client:
+        iniciar_sesion(client, args.admin)
+        for pagina in args.paginas:
+            resultados[pagina] = {}
+            for nombre, codificacion in CODIFICACIONES.items():
+                antes = compresion_en_metricas(client)
+                bytes_red, p50 = medir_pagina(client, pagina, codificacion, args.requests)
+                despues = compresion_en_metricas(client)
+                segundos = despues.get((codificacion, 'sum'), 0) - antes.get((codificacion, 'sum'), 0)
+                resultados[pagina][nombre] = {
+                    'bytes': int(bytes_red),
+                    'p50_ms': round(p50, 2),
+                    'cpu_ms_por_request': round(segundos * 1000 / args.requests, 3),
+                }
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--paginas', type=lambda t: t.split(','),
+                        default=['/', '/ver_comprobantes/', '/ver_solicitudes/', '/gestionar_animales/'])
+    parser.add_argument('--requests', type=int, default=30)
+    parser.add_argument('--calidad-brotli', type=int, default=5)
+    parser.add_argument('--admin', help='Cuenta admin (contraseña bench12345)')
+    parser.add_argument('--animales', type=int, default=50, help='Tamaño de los datos si se ejecuta seed_bench')
+    parser.add_argument('--json', help='Guardar el resultado en este archivo')
+    args = parser.parse_args()
+    if not args.admin:
+        args.admin, _ = sembrar_datos(args)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        entorno = {'METRICS_ENABLED': 'True', 'METRICS_TOKEN': TOKEN, 'METRICS_DIR': directorio,
+                   'COMPRESSION_BROTLI_QUALITY': str(args.calidad_brotli)}
+        puerto = puerto_libre()
+        proceso = iniciar_gunicorn(SimpleNamespace(workers=1, threads=1, worker_class='sync'), puerto, entorno=entorno)
+        try:
+            resultados = medir(args, f'http://127.0.0.1:{puerto}')
+        finally:
+            proceso.send_signal(signal.SIGTERM)
+            proceso.wait(30)
+
+    print(f"\nMediana de {args.requests} requests por página (Brotli calidad {args.calidad_brotli})")
+    print(f"{'página':<24}{'codificación':<13}{'bytes':>10}{'ratio':>8}{'CPU ms':>9}{'p50 ms':>9}")
+    for pagina, por_codificacion in resultados.items():
+        base = por_codificacion['identidad']['bytes']
+        for nombre, r in por_codificacion.items():
+            print(f"{pagina:<24}{nombre:<13}{r['bytes']:>10}{r['bytes'] / base:>8.2f}"
+                  f"{r['cpu_ms_por_request']:>9.2f}{r['p50_ms']:>9.1f}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as archivo:
+            json.dump({'configuracion': vars(args), 'resultados': resultados}, archivo, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Costo de obtener la conexión a la base por request, según la estrategia:
+
+- sin_persistencia: DB_CONN_MAX_AGE=0, una conexión nueva por request.
+- persistente: DB_CONN_MAX_AGE=600, cada hilo reutiliza su conexión.
+- pool: DB_POOL=True, pool de psycopg por worker (solo PostgreSQL).
+
+Para cada modo levanta gunicorn con las métricas activadas, envía
+--requests GET a --urls con --concurrencia clientes y lee de /metrics el
+histograma rescatando_db_connection_seconds (abrir una conexión o esperarla
+del pool).
+
+Uso:
+    DATABASE_URL=postgres://... python bench/conexiones.py --workers 2 --threads 4
+    python bench/conexiones.py --modos sin_persistencia,persistente --requests 1000
+
+Usa la base configurada en el entorno (DATABASE_URL). Requiere httpx
+(pip install -r bench/requirements.txt).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import signal
+import tempfile
+import time
+from types import SimpleNamespace
+
+from loadtest import iniciar_gunicorn, percentil, puerto_libre
+
+import httpx
+
+MODOS = {
+    'sin_persistencia': {'DB_CONN_MAX_AGE': '0', 'DB_POOL': 'False'},
+    'persistente': {'DB_CONN_MAX_AGE': '600', 'DB_POOL': 'False'},
+    'pool': {'DB_POOL': 'True'},
+}
+TOKEN = 'bench-conexiones'
+_MUESTRA = re.compile(r'^(rescatando_db_connection_seconds_(?:sum|count))\{[^}]*\} (\S+)$', re.MULTILINE)
+
+
+async def cargar(args, base_url):
+    latencias, errores = [], 0
+    pendientes = iter(range(args.requests))
+
+    async def cliente():
+        nonlocal errores
+        async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+            for i in pendientes:
+                inicio = time.perf_counter()
+                try:
+                    response = await client.get(args.urls[i % len(args.urls)])
+                    errores += response.status_code >= 400
+                except httpx.HTTPError:
+                    errores += 1
+                latencias.append((time.perf_counter() - inicio) * 1000)
+
+    await asyncio.gather(*(cliente() for _ in range(args.concurrencia)))
+    return latencias, errores
+
+
+def conexiones_en_metricas(base_url):
+    texto = httpx.get(f'{base_url}/metrics', headers={'Authorization': f'Bearer {TOKEN}'}, timeout=30).text
+    totales = {'sum': 0.0, 'count': 0.0}
+    for nombre, valor in _MUESTRA.findall(texto):
+        totales[nombre.rsplit('_', 1)[1]] += float(valor)
+    return totales
+
+
+def medir(args, modo):
+    with tempfile.TemporaryDirectory() as directorio:
+        entorno = {**MODOS[modo], 'METRICS_ENABLED': 'True', 'METRICS_TOKEN': TOKEN, 'METRICS_DIR': directorio}
+        puerto = puerto_libre()
+        opciones = SimpleNamespace(workers=args.workers, threads=args.threads,
+                                   worker_class='gthread' if args.threads > 1 else 'sync')
+        proceso = iniciar_gunicorn(opciones, puerto, entorno=entorno)
+        base_url = f'http://127.0.0.1:{puerto}'
+        try:
+            # Las conexiones que abre cada worker al iniciar no cuentan
+            inicial = conexiones_en_metricas(base_url)
+            latencias, errores = asyncio.run(cargar(args, base_url))
+            final = conexiones_en_metricas(base_url)
+        finally:
+            proceso.send_signal(signal.SIGTERM)
+            proceso.wait(30)
+
+    conexiones = final['count'] - inicial['count']
+    segundos = final['sum'] - inicial['sum']
+    return {
+        'requests': len(latencias),
+        'errores': errores,
+        'conexiones': int(conexiones),
+        'conexiones_por_request': round(conexiones / len(latencias), 3),
+        'ms_conexion_por_request': round(segundos * 1000 / len(latencias), 3),
+        'ms_por_conexion': round(segundos * 1000 / conexiones, 3) if conexiones else 0.0,
+        'p50_ms': round(percentil(latencias, 50), 1),
+        'p95_ms': round(percentil(latencias, 95), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modos', type=lambda t: t.split(','), default=list(MODOS))
+    parser.add_argument('--urls', type=lambda t: t.split(','), default=['/ver_comprobantes/', '/'])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--concurrencia', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--json', help='Guardar el resultado en este archivo')
+    args = parser.parse_args()
+
+    if 'pool' in args.modos and not os.environ.get('DATABASE_URL', '').startswith(('postgres', 'postgresql')):
+        print('El modo pool requiere PostgreSQL (DATABASE_URL=postgres://...); se omite')
+        args.modos.remove('pool')
+
+    resultados = {modo: medir(args, modo) for modo in args.modos}
+
+    print(f"\n{args.workers} workers x {args.threads} hilos, {args.concurrencia} clientes, {args.requests} requests")
+    print(f"{'modo':<18}{'err':>5}{'conex':>7}{'conex/req':>11}{'ms conex/req':>14}{'ms/conex':>10}{'p50':>8}{'p95':>8}")
+    for modo, r in resultados.items():
+        print(f"{modo:<18}{r['errores']:>5}{r['conexiones']:>7}{r['conexiones_por_request']:>11.3f}"
+              f"{r['ms_conexion_por_request']:>14.3f}{r['ms_por_conexion']:>10.3f}{r['p50_ms']:>8.1f}{r['p95_ms']:>8.1f}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as archivo:
+            json.dump({'configuracion': vars(args), 'resultados': resultados}, archivo, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
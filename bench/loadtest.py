@@ -0,0 +1,393 @@
+"""
+Prueba de carga local contra gunicorn.
+
+Levanta DjangoRescatando.wsgi:application con gunicorn (o usa un servidor ya
+corriendo con --url), reproduce una mezcla ponderada de escenarios con
+usuarios virtuales concurrentes y reporta requests por segundo, percentiles
+p50/p95/p99, histograma de latencias y tasa de errores.
+
+Uso:
+    python bench/loadtest.py --workers 3 --usuarios 20 --duracion 30
+    python bench/loadtest.py --url http://127.0.0.1:8000 --admin bench_xxx_admin --adoptante bench_xxx_user0
+
+Sin --admin/--adoptante se ejecuta antes `manage.py seed_bench` para crear
+las cuentas y los datos. Requiere httpx (pip install -r bench/requirements.txt).
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import math
+import os
+import random
+import re
+import signal
+import socket
+import subprocess
+import sys
+import time
+import zlib
+from collections import defaultdict
+from pathlib import Path
+
+try:
+    import httpx
+except ImportError:
+    sys.exit('Falta httpx: pip install -r bench/requirements.txt')
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+CONTRASENA_BENCH = 'bench12345'
+
+_CSRF = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+_ANIMALES = re.compile(r'/solicitar_adopcion/(\d+)/')
+# Nivel ERROR de django.contrib.messages
+NIVEL_ERROR = 40
+
+# Límites superiores (ms) de los buckets del histograma
+BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, math.inf]
+
+
+class Estadisticas:
+    def __init__(self):
+        self.latencias = defaultdict(list)
+        self.errores = defaultdict(int)
+        self.status = defaultdict(int)
+        self.motivos = defaultdict(int)
+
+    def registrar(self, escenario, ms, status=None, error=None):
+        self.latencias[escenario].append(ms)
+        if status is not None:
+            self.status[status] += 1
+        if error is None and status is not None and status >= 400:
+            error = f'HTTP {status}'
+        if error:
+            self.errores[escenario] += 1
+            self.motivos[f'{escenario}: {error if isinstance(error, str) else type(error).__name__}'] += 1
+
+
+def _niveles_mensajes(response):
+    """
+    Niveles de los mensajes de django.contrib.messages que deja la respuesta
+    en la cookie `messages` (CookieStorage: JSON firmado, a veces comprimido).
+    """
+    valor = response.cookies.get('messages')
+    if not valor:
+        return []
+    datos = valor.strip('"').split(':')[0]
+    comprimido = datos.startswith('.')
+    datos = datos.lstrip('.')
+    try:
+        crudo = base64.urlsafe_b64decode(datos + '=' * (-len(datos) % 4))
+        mensajes = json.loads(zlib.decompress(crudo) if comprimido else crudo)
+    except (ValueError, zlib.error):
+        return []
+    return [m[2] for m in mensajes if isinstance(m, list) and m[:1] == ['__json_message']]
+
+
+def redirige_a(destino):
+    """Éxito de un formulario: un 302 a `destino` sin mensajes de error"""
+    def validar(response):
+        if response.status_code != 302:
+            return f'HTTP {response.status_code} en vez de 302'
+        if response.headers.get('location') != destino:
+            return f'redirige a {response.headers.get("location")}'
+        if NIVEL_ERROR in _niveles_mensajes(response):
+            return 'mensaje de error'
+        return None
+    return validar
+
+
+def con_csrf(response):
+    return None if _CSRF.search(response.text) else 'sin token CSRF'
+
+
+class UsuarioVirtual:
+    """Un cliente con su propio cookie jar (sesión y CSRF)"""
+
+    def __init__(self, base_url, cuentas, estadisticas, timeout):
+        self.client = httpx.AsyncClient(base_url=base_url, timeout=timeout, follow_redirects=False)
+        self.cuentas = cuentas
+        self.estadisticas = estadisticas
+        self.sesion = None
+
+    async def request(self, escenario, metodo, url, validar=None, **kwargs):
+        """
+        `validar(response)` devuelve el motivo por el que la respuesta no es
+        la esperada (o None): un 200 o un 302 no siempre es un éxito. Si no
+        pasa, cuenta como error y devuelve None.
+        """
+        inicio = time.perf_counter()
+        try:
+            response = await self.client.request(metodo, url, **kwargs)
+        except httpx.HTTPError as e:
+            self.estadisticas.registrar(escenario, (time.perf_counter() - inicio) * 1000, error=e)
+            return None
+        ms = (time.perf_counter() - inicio) * 1000
+        error = validar(response) if validar and response.status_code < 400 else None
+        self.estadisticas.registrar(escenario, ms, status=response.status_code, error=error)
+        return None if error or response.status_code >= 400 else response
+
+    async def login(self, escenario, rol):
+        if self.sesion == rol:
+            return True
+        self.client.cookies.clear()
+        pagina = await self.request(escenario, 'GET', '/login/', validar=con_csrf)
+        if pagina is None:
+            return False
+        # Un login correcto redirige al index
+        response = await self.request(escenario, 'POST', '/login/', validar=redirige_a('/'), data={
+            'csrfmiddlewaretoken': _CSRF.search(pagina.text).group(1),
+            'cuenta': self.cuentas[rol],
+            'contraseña': CONTRASENA_BENCH,
+        })
+        self.sesion = rol if response is not None else None
+        return self.sesion == rol
+
+    async def close(self):
+        await self.client.aclose()
+
+
+# ------------------------
+# ESCENARIOS
+# ------------------------
+async def catalogo_anonimo(usuario, animales):
+    if usuario.sesion:
+        usuario.client.cookies.clear()
+        usuario.sesion = None
+    url = random.choice(['/', '/', '/', '/ver_comprobantes/', '/ayudar/'])
+    await usuario.request('catalogo_anonimo', 'GET', url)
+
+
+async def login(usuario, animales):
+    usuario.sesion = None
+    await usuario.login('login', 'adoptante')
+
+
+async def solicitud_adopcion(usuario, animales):
+    if not animales or not await usuario.login('solicitud_adopcion', 'adoptante'):
+        return
+    pagina = await usuario.request('solicitud_adopcion', 'GET', '/', validar=con_csrf)
+    if pagina is None:
+        return
+    # Una solicitud aceptada vuelve al catálogo con el mensaje de éxito; los
+    # rechazos también vuelven ahí, pero con un mensaje de error
+    await usuario.request('solicitud_adopcion', 'POST', f'/solicitar_adopcion/{random.choice(animales)}/',
+                          validar=redirige_a('/'), data={
+        'csrfmiddlewaretoken': _CSRF.search(pagina.text).group(1),
+        'nombre': 'Usuario Carga', 'telefono': '+56911111111', 'rut': '11111111-1',
+        'direccion': 'Calle Carga 123', 'ciudad': 'Santiago', 'comuna': 'Ñuñoa', 'edad': '30',
+        'por_que_adoptar': 'Prueba de carga', 'tiene_o_tuvo_mascotas': '1', 'alimento_mascotas': 'Premium',
+        'miembros_familia': '2', 'decision_compartida': '1', 'tipo_vivienda': 'Casa',
+        'permiten_mascotas': '1', 'tiene_recursos_economicos': '1', 'que_pasa_si_mudanza': 'Se muda con nosotros',
+        'acepta_videollamada': '1', 'acepta_seguimiento': '1', 'acepta_enviar_fotos': '1', 'acepta_tenencia_indoor': '1',
+    })
+
+
+async def dashboard(usuario, animales):
+    if not await usuario.login('dashboard', 'admin'):
+        return
+    url = random.choice(['/ver_solicitudes/', '/gestionar_animales/', '/gestionar_usuarios/'])
+    await usuario.request('dashboard', 'GET', url)
+
+
+ESCENARIOS = {
+    'catalogo_anonimo': catalogo_anonimo,
+    'login': login,
+    'solicitud_adopcion': solicitud_adopcion,
+    'dashboard': dashboard,
+}
+
+
+def parsear_mezcla(texto):
+    """'catalogo_anonimo=70,login=10,...' -> {'catalogo_anonimo': 70, ...}"""
+    mezcla = {}
+    for parte in texto.split(','):
+        nombre, _, peso = parte.partition('=')
+        if nombre.strip() not in ESCENARIOS:
+            raise argparse.ArgumentTypeError(f'Escenario desconocido: {nombre}')
+        mezcla[nombre.strip()] = float(peso or 1)
+    return mezcla
+
+
+# ------------------------
+# SERVIDOR
+# ------------------------
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def iniciar_gunicorn(args, puerto, aplicacion='DjangoRescatando.wsgi:application', entorno=None):
+    comando = [
+        sys.executable, '-m', 'gunicorn', aplicacion,
+        '--bind', f'127.0.0.1:{puerto}',
+        '--workers', str(args.workers),
+        '--threads', str(args.threads),
+        '--worker-class', args.worker_class,
+        '--log-level', 'warning',
+    ]
+    proceso = subprocess.Popen(comando, cwd=BASE_DIR, env={**os.environ, **(entorno or {})})
+    limite = time.monotonic() + 30
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            sys.exit('gunicorn terminó antes de aceptar conexiones')
+        try:
+            with socket.create_connection(('127.0.0.1', puerto), timeout=0.5):
+                return proceso
+        except OSError:
+            time.sleep(0.2)
+    proceso.terminate()
+    sys.exit('gunicorn no respondió en 30 segundos')
+
+
+def sembrar_datos(args):
+    salida = subprocess.run(
+        [sys.executable, 'manage.py', 'seed_bench', '--animals', str(args.animales),
+         '--solicitudes', str(args.animales * 2), '--donaciones', str(args.animales)],
+        cwd=BASE_DIR, capture_output=True, text=True, check=True,
+    ).stdout
+    admin = re.search(r'Cuenta admin: (\S+)', salida)
+    adoptante = re.search(r'Cuenta adoptante: (\S+)', salida)
+    if not admin or not adoptante:
+        sys.exit(f'No se pudieron leer las cuentas creadas por seed_bench:\n{salida}')
+    return admin.group(1), adoptante.group(1)
+
+
+# ------------------------
+# CARGA
+# ------------------------
+async def ejecutar(args, base_url, cuentas):
+    estadisticas = Estadisticas()
+    nombres = list(args.mezcla)
+    pesos = [args.mezcla[n] for n in nombres]
+
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        index = await client.get('/')
+        animales = sorted(set(_ANIMALES.findall(index.text)))
+
+    fin = time.monotonic() + args.duracion
+
+    async def bucle(usuario):
+        while time.monotonic() < fin:
+            await ESCENARIOS[random.choices(nombres, pesos)[0]](usuario, animales)
+            if args.pausa:
+                await asyncio.sleep(random.expovariate(1 / args.pausa))
+
+    usuarios = [UsuarioVirtual(base_url, cuentas, estadisticas, args.timeout) for _ in range(args.usuarios)]
+    inicio = time.monotonic()
+    try:
+        await asyncio.gather(*(bucle(u) for u in usuarios))
+    finally:
+        await asyncio.gather(*(u.close() for u in usuarios))
+    return estadisticas, time.monotonic() - inicio
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+def resumir(estadisticas, segundos):
+    resumen = {'duracion_s': round(segundos, 2), 'escenarios': {}, 'status': dict(estadisticas.status),
+               'motivos_error': dict(estadisticas.motivos)}
+    todas = []
+    for escenario, latencias in sorted(estadisticas.latencias.items()):
+        todas.extend(latencias)
+        resumen['escenarios'][escenario] = {
+            'requests': len(latencias),
+            'rps': round(len(latencias) / segundos, 2),
+            'errores': estadisticas.errores[escenario],
+            'tasa_error': round(estadisticas.errores[escenario] / len(latencias), 4),
+            'p50_ms': round(percentil(latencias, 50), 2),
+            'p95_ms': round(percentil(latencias, 95), 2),
+            'p99_ms': round(percentil(latencias, 99), 2),
+        }
+    if todas:
+        histograma = [0] * len(BUCKETS_MS)
+        for ms in todas:
+            histograma[next(i for i, limite in enumerate(BUCKETS_MS) if ms <= limite)] += 1
+        errores = sum(estadisticas.errores.values())
+        resumen['total'] = {
+            'requests': len(todas),
+            'rps': round(len(todas) / segundos, 2),
+            'errores': errores,
+            'tasa_error': round(errores / len(todas), 4),
+            'p50_ms': round(percentil(todas, 50), 2),
+            'p95_ms': round(percentil(todas, 95), 2),
+            'p99_ms': round(percentil(todas, 99), 2),
+            'histograma': {('+Inf' if math.isinf(b) else str(b)): n for b, n in zip(BUCKETS_MS, histograma)},
+        }
+    return resumen
+
+
+def imprimir(resumen):
+    print(f"\nDuración: {resumen['duracion_s']} s")
+    print(f"{'escenario':<20}{'req':>8}{'rps':>9}{'err%':>8}{'p50':>9}{'p95':>9}{'p99':>9}")
+    filas = list(resumen['escenarios'].items())
+    if 'total' in resumen:
+        filas.append(('TOTAL', resumen['total']))
+    for nombre, datos in filas:
+        print(f"{nombre:<20}{datos['requests']:>8}{datos['rps']:>9.1f}{datos['tasa_error'] * 100:>7.1f}%"
+              f"{datos['p50_ms']:>9.1f}{datos['p95_ms']:>9.1f}{datos['p99_ms']:>9.1f}")
+    if 'total' in resumen:
+        print('\nHistograma de latencia (ms):')
+        maximo = max(resumen['total']['histograma'].values()) or 1
+        for limite, n in resumen['total']['histograma'].items():
+            print(f"  <= {limite:>6}  {n:>7}  {'#' * round(40 * n / maximo)}")
+    print(f"\nStatus: {resumen['status']}")
+    if resumen['motivos_error']:
+        print('Errores:')
+        for motivo, n in sorted(resumen['motivos_error'].items(), key=lambda item: -item[1]):
+            print(f'  {n:>7}  {motivo}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='Usar un servidor ya corriendo en vez de levantar gunicorn')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--worker-class', default='sync')
+    parser.add_argument('--usuarios', type=int, default=10, help='Usuarios virtuales concurrentes')
+    parser.add_argument('--duracion', type=float, default=30, help='Segundos de carga')
+    parser.add_argument('--pausa', type=float, default=0, help='Pausa media entre requests de un usuario (s)')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--mezcla', type=parsear_mezcla,
+                        default=parsear_mezcla('catalogo_anonimo=70,login=10,solicitud_adopcion=5,dashboard=15'))
+    parser.add_argument('--admin', help='Cuenta admin (contraseña bench12345)')
+    parser.add_argument('--adoptante', help='Cuenta de usuario adoptante (contraseña bench12345)')
+    parser.add_argument('--animales', type=int, default=200, help='Tamaño de los datos si se ejecuta seed_bench')
+    parser.add_argument('--json', help='Guardar el resumen en este archivo')
+    args = parser.parse_args()
+
+    if args.admin and args.adoptante:
+        cuentas = {'admin': args.admin, 'adoptante': args.adoptante}
+    else:
+        admin, adoptante = sembrar_datos(args)
+        cuentas = {'admin': admin, 'adoptante': adoptante}
+
+    proceso = None
+    base_url = args.url
+    if not base_url:
+        puerto = puerto_libre()
+        proceso = iniciar_gunicorn(args, puerto)
+        base_url = f'http://127.0.0.1:{puerto}'
+    try:
+        estadisticas, segundos = asyncio.run(ejecutar(args, base_url, cuentas))
+    finally:
+        if proceso:
+            proceso.send_signal(signal.SIGTERM)
+            proceso.wait(timeout=30)
+
+    resumen = resumir(estadisticas, segundos)
+    resumen['configuracion'] = {'workers': args.workers, 'threads': args.threads, 'worker_class': args.worker_class,
+                                'usuarios': args.usuarios, 'mezcla': args.mezcla, 'url': args.url}
+    imprimir(resumen)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as archivo:
+            json.dump(resumen, archivo, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
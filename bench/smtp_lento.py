@@ -0,0 +1,190 @@
+"""
+Concurrencia con un servidor SMTP lento: WSGI (workers sync) contra ASGI
+(workers uvicorn).
+
+Levanta un servidor SMTP falso que tarda --demora segundos en aceptar cada
+correo y, para cada modo, un gunicorn apuntando a él. Luego envía --requests
+POST a /recuperar-contrasena/ con --concurrencia clientes simultáneos
+mientras una sonda pide /ayudar/ cada 100 ms, para ver si el resto del sitio
+sigue respondiendo mientras los workers esperan al SMTP.
+
+Uso:
+    python bench/smtp_lento.py --workers 2 --concurrencia 20 --requests 60 --demora 1
+    python bench/smtp_lento.py --modos asgi --email user0.abc123@bench.cl
+
+Sin --email se ejecuta antes `manage.py seed_bench` para tener una cuenta
+con correo. Requiere httpx, uvicorn y uvicorn-worker
+(pip install -r bench/requirements.txt).
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import signal
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+from loadtest import BASE_DIR, _CSRF, iniciar_gunicorn, percentil, puerto_libre
+
+import httpx
+
+APLICACIONES = {
+    'wsgi': ('DjangoRescatando.wsgi:application', 'sync'),
+    'asgi': ('DjangoRescatando.asgi:application', 'uvicorn_worker.UvicornWorker'),
+}
+
+
+# ------------------------
+# SMTP FALSO
+# ------------------------
+async def iniciar_smtp(demora):
+    """Servidor SMTP mínimo que acepta todo y tarda `demora` segundos por correo"""
+    async def atender(reader, writer):
+        writer.write(b'220 bench ESMTP\r\n')
+        en_datos = False
+        while line := await reader.readline():
+            if en_datos:
+                if line == b'.\r\n':
+                    en_datos = False
+                    await asyncio.sleep(demora)
+                    writer.write(b'250 OK\r\n')
+            else:
+                comando = line[:4].upper()
+                if comando == b'EHLO':
+                    writer.write(b'250-bench\r\n250 AUTH PLAIN\r\n')
+                elif comando == b'AUTH':
+                    writer.write(b'235 OK\r\n')
+                elif comando == b'DATA':
+                    en_datos = True
+                    writer.write(b'354 Fin con .\r\n')
+                elif comando == b'QUIT':
+                    writer.write(b'221 Chao\r\n')
+                    await writer.drain()
+                    break
+                else:
+                    writer.write(b'250 OK\r\n')
+            await writer.drain()
+        writer.close()
+
+    servidor = await asyncio.start_server(atender, '127.0.0.1', 0)
+    return servidor, servidor.sockets[0].getsockname()[1]
+
+
+# ------------------------
+# CARGA
+# ------------------------
+async def recuperar(client, email, latencias, errores):
+    inicio = time.perf_counter()
+    try:
+        pagina = await client.get('/recuperar-contrasena/')
+        token = _CSRF.search(pagina.text)
+        response = await client.post('/recuperar-contrasena/', data={
+            'csrfmiddlewaretoken': token.group(1) if token else '',
+            'email': email,
+        })
+        # El envío correcto redirige al login
+        if response.status_code != 302:
+            errores.append(response.status_code)
+    except httpx.HTTPError as e:
+        errores.append(type(e).__name__)
+    latencias.append((time.perf_counter() - inicio) * 1000)
+
+
+async def sonda(base_url, latencias, detener):
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        while not detener.is_set():
+            inicio = time.perf_counter()
+            try:
+                await client.get('/ayudar/')
+            except httpx.HTTPError:
+                pass
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            await asyncio.sleep(0.1)
+
+
+async def medir(args, base_url):
+    latencias, errores, latencias_sonda = [], [], []
+    pendientes = iter(range(args.requests))
+    detener = asyncio.Event()
+
+    async def cliente():
+        async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+            for _ in pendientes:
+                await recuperar(client, args.email, latencias, errores)
+
+    tarea_sonda = asyncio.create_task(sonda(base_url, latencias_sonda, detener))
+    inicio = time.monotonic()
+    await asyncio.gather(*(cliente() for _ in range(args.concurrencia)))
+    segundos = time.monotonic() - inicio
+    detener.set()
+    await tarea_sonda
+
+    return {
+        'requests': len(latencias),
+        'errores': len(errores),
+        'duracion_s': round(segundos, 2),
+        'rps': round(len(latencias) / segundos, 2),
+        'recuperar_p50_ms': round(percentil(latencias, 50), 1),
+        'recuperar_p95_ms': round(percentil(latencias, 95), 1),
+        'sonda_p50_ms': round(percentil(latencias_sonda, 50), 1),
+        'sonda_p95_ms': round(percentil(latencias_sonda, 95), 1),
+    }
+
+
+async def ejecutar(args):
+    servidor, puerto_smtp = await iniciar_smtp(args.demora)
+    entorno = {'EMAIL_HOST': '127.0.0.1', 'EMAIL_PORT': str(puerto_smtp), 'EMAIL_USE_TLS': 'False'}
+    resultados = {}
+    async with servidor:
+        for modo in args.modos:
+            aplicacion, worker_class = APLICACIONES[modo]
+            puerto = puerto_libre()
+            opciones = SimpleNamespace(workers=args.workers, threads=1, worker_class=worker_class)
+            # iniciar_gunicorn bloquea mientras espera el puerto; en un hilo el SMTP falso sigue atendiendo
+            proceso = await asyncio.to_thread(iniciar_gunicorn, opciones, puerto, aplicacion, entorno)
+            try:
+                resultados[modo] = await medir(args, f'http://127.0.0.1:{puerto}')
+            finally:
+                proceso.send_signal(signal.SIGTERM)
+                await asyncio.to_thread(proceso.wait, 30)
+    return resultados
+
+
+def email_sembrado():
+    salida = subprocess.run([sys.executable, 'manage.py', 'seed_bench', '--animals', '10'],
+                            cwd=BASE_DIR, capture_output=True, text=True, check=True).stdout
+    cuenta = re.search(r'Cuenta adoptante: bench_(\w+)_user0', salida)
+    if not cuenta:
+        sys.exit(f'No se pudo leer la cuenta creada por seed_bench:\n{salida}')
+    return f'user0.{cuenta.group(1)}@bench.cl'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modos', type=lambda t: t.split(','), default=['wsgi', 'asgi'])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrencia', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=60)
+    parser.add_argument('--demora', type=float, default=1.0, help='Segundos que tarda el SMTP por correo')
+    parser.add_argument('--email', help='Correo de un usuario existente')
+    parser.add_argument('--json', help='Guardar el resultado en este archivo')
+    args = parser.parse_args()
+    args.email = args.email or email_sembrado()
+
+    resultados = asyncio.run(ejecutar(args))
+
+    print(f"\nSMTP con {args.demora} s por correo, {args.workers} workers, {args.concurrencia} clientes")
+    print(f"{'modo':<6}{'req':>6}{'err':>5}{'rps':>8}{'p50':>9}{'p95':>9}{'sonda p50':>11}{'sonda p95':>11}")
+    for modo, r in resultados.items():
+        print(f"{modo:<6}{r['requests']:>6}{r['errores']:>5}{r['rps']:>8.1f}{r['recuperar_p50_ms']:>9.0f}"
+              f"{r['recuperar_p95_ms']:>9.0f}{r['sonda_p50_ms']:>11.0f}{r['sonda_p95_ms']:>11.0f}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as archivo:
+            json.dump({'configuracion': vars(args), 'resultados': resultados}, archivo, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
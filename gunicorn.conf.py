@@ -0,0 +1,88 @@
+"""
+Perfil de producción de gunicorn (lo carga automáticamente desde la raíz del
+proyecto; el Procfile lo indica con -c).
+
+- Workers e hilos según CPUs y memoria (mainApp.warmup.dimensionar). Se
+  puede forzar con WEB_CONCURRENCY y GUNICORN_THREADS.
+- preload_app: Django, las vistas, reportlab y las plantillas se cargan una
+  vez en el maestro y los workers los heredan al hacer fork.
+- max_requests con jitter: cada worker se recicla tras ~1000 requests para
+  acotar fugas de memoria, sin que todos se reinicien a la vez.
+"""
+import glob
+import os
+import sys
+
+from gunicorn.workers.sync import SyncWorker
+
+# gunicorn lee este archivo antes de aplicar --chdir y el ejecutable
+# `gunicorn` no agrega el directorio actual a sys.path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mainApp.warmup import (MEMORIA_POR_WORKER_MB, abrir_conexion, cpus_disponibles, dimensionar,  # noqa: E402
+                            memoria_disponible_mb, precalentar)
+
+_workers, _hilos = dimensionar(
+    cpus_disponibles(),
+    memoria_disponible_mb(),
+    int(os.environ.get('GUNICORN_MEMORIA_POR_WORKER_MB', MEMORIA_POR_WORKER_MB)),
+)
+
+# bind: gunicorn usa 0.0.0.0:$PORT si la plataforma define PORT
+workers = int(os.environ.get('WEB_CONCURRENCY', _workers))
+threads = int(os.environ.get('GUNICORN_THREADS', _hilos))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread' if threads > 1 else 'sync')
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True') == 'True'
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', '100'))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = 30
+keepalive = 5
+# El heartbeat de los workers en disco puede bloquearse en contenedores; en memoria no
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+loglevel = os.environ.get('GUNICORN_LOGLEVEL', 'info')
+
+
+def on_starting(server):
+    # Volcados de métricas de workers de un arranque anterior (mainApp.metrics)
+    directorio = os.environ.get('METRICS_DIR')
+    if directorio:
+        for ruta in glob.glob(os.path.join(directorio, '*.json')):
+            os.remove(ruta)
+
+
+def worker_exit(server, worker):
+    # Último volcado del worker antes de salir, para que child_exit lo archive
+    if os.environ.get('METRICS_DIR'):
+        from mainApp.metrics import registro
+
+        registro.volcar(forzar=True)
+
+
+def child_exit(server, worker):
+    # En el maestro: suma el volcado del worker a terminados.json y lo borra
+    directorio = os.environ.get('METRICS_DIR')
+    if directorio:
+        from mainApp.metrics import archivar_proceso
+
+        archivar_proceso(directorio, worker.pid)
+
+
+def when_ready(server):
+    # Corre en el maestro justo antes de crear los workers
+    if server.cfg.preload_app:
+        precalentar()
+
+
+def post_worker_init(worker):
+    # Sin preload cada worker se precalienta por su cuenta
+    if not worker.cfg.preload_app:
+        precalentar()
+    # Solo el worker sync atiende requests en este hilo; con gthread (o ASGI)
+    # una conexión propia de este hilo quedaría abierta sin usarse. El pool
+    # no pertenece a ningún hilo y se llena igual.
+    abrir_conexion(solo_pool=not isinstance(worker, SyncWorker))
@@ -1,9 +1,14 @@
 from django.contrib import admin
 from django.contrib.auth.hashers import make_password
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
 from mainApp.models import (
     Usuario, Voluntario, HogarTemporal, Animal, Adoptante,
     SolicitudAdopcion, Adopcion, FichaMedica, Contrato, Donacion,
-    EntrevistaVoluntario, EntrevistaAdopcion, SolicitudVoluntariado
+    EntrevistaVoluntario, EntrevistaAdopcion, SolicitudVoluntariado,
+    PerfilRendimiento, EventoAuditoria
 )
 
 # Register your models here.
@@ -33,4 +38,73 @@ admin.site.register(Contrato)
 admin.site.register(Donacion)
 admin.site.register(EntrevistaVoluntario)
 admin.site.register(EntrevistaAdopcion)
-admin.site.register(SolicitudVoluntariado)
\ No newline at end of file
+admin.site.register(SolicitudVoluntariado)
+
+
+class PerfilRendimientoAdmin(admin.ModelAdmin):
+    list_display = ['fecha', 'metodo', 'ruta', 'vista', 'status', 'duracion_ms', 'usuario', 'descargar']
+    list_filter = ['vista', 'metodo']
+    search_fields = ['ruta', 'vista']
+    exclude = ['archivo']
+    readonly_fields = ['fecha', 'usuario', 'metodo', 'ruta', 'vista', 'status', 'duracion_ms', 'descargar']
+
+    def has_add_permission(self, request):
+        # Los perfiles solo los crea ProfilerMiddleware
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        urls = [
+            path('<int:perfil_id>/descargar/', self.admin_site.admin_view(self.descargar_view),
+                 name='mainApp_perfilrendimiento_descargar'),
+        ]
+        return urls + super().get_urls()
+
+    @admin.display(description='Archivo .prof')
+    def descargar(self, obj):
+        url = reverse('admin:mainApp_perfilrendimiento_descargar', args=[obj.id])
+        return format_html('<a href="{}">Descargar</a>', url)
+
+    def descargar_view(self, request, perfil_id):
+        perfil = get_object_or_404(PerfilRendimiento, id=perfil_id)
+        if not self.has_view_permission(request, perfil):
+            raise Http404
+        try:
+            archivo = perfil.archivo.open('rb')
+        except FileNotFoundError:
+            raise Http404('El archivo del perfil ya no existe')
+        return FileResponse(archivo, as_attachment=True, filename=perfil.archivo.name)
+
+    def delete_model(self, request, obj):
+        obj.archivo.delete(save=False)
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        for perfil in queryset:
+            perfil.archivo.delete(save=False)
+        super().delete_queryset(request, queryset)
+
+admin.site.register(PerfilRendimiento, PerfilRendimientoAdmin)
+
+
+class EventoAuditoriaAdmin(admin.ModelAdmin):
+    list_display = ['fecha', 'actor', 'accion', 'operacion', 'modelo', 'objeto_id']
+    list_filter = ['operacion', 'modelo']
+    search_fields = ['actor', 'accion']
+    # Filtrar por fecha permite a PostgreSQL leer solo las particiones de ese rango
+    date_hierarchy = 'fecha'
+    readonly_fields = ['fecha', 'actor_id', 'actor', 'accion', 'operacion', 'modelo', 'objeto_id', 'cambios']
+
+    def has_add_permission(self, request):
+        # Solo los escribe mainApp.auditoria
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+admin.site.register(EventoAuditoria, EventoAuditoriaAdmin)
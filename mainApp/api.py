@@ -0,0 +1,269 @@
+"""
+API JSON de solo lectura para el dashboard de moderación.
+
+GET /api/solicitudes/, /api/adopciones/, /api/voluntariado/ y /api/donaciones/
+(admin y voluntarios) con:
+
+- estado=pendiente o estado=entrevista_agendada,entrevista_realizada
+- fields=id,estado,adoptante.nombre: solo esos campos. Se traducen a .only()
+  (Adoptante tiene más de 30 columnas, varias de texto libre) y los objetos
+  relacionados se traen en la misma consulta con select_related.
+- Paginación por clave: los resultados van del más nuevo al más antiguo y
+  `siguiente` trae despues=<último id>. Cada página es un `WHERE id < n
+  ORDER BY id DESC LIMIT`, que no se vuelve más lento en las páginas finales
+  como OFFSET, ni repite o salta filas si llegan solicitudes nuevas mientras
+  se pagina.
+
+Sin fields= se usan los campos de RECURSOS[...].por_defecto.
+
+Fichas médicas de gestionar_animales:
+
+- GET /api/ficha/<id_animal>/ busca la ficha por id_animal_id en una sola
+  consulta, sin cargar antes el animal; si no hay animal o no tiene ficha
+  responde 404.
+- GET /api/fichas/?ids=1,2,3 devuelve las fichas de hasta LIMITE_MAXIMO
+  animales en una consulta. Cada ficha trae su ETag (hash del contenido); las
+  que el cliente manda en If-None-Match vuelven como sin_cambios, sin datos.
+  vacunas_al_dia se calcula en la misma consulta (mainApp.vacunas).
+- GET /api/ficha/<id_animal>/historial/?antes=<id> devuelve el historial
+  médico del más reciente al más antiguo, por páginas (mainApp.historial).
+"""
+import hashlib
+import json
+from collections import namedtuple
+
+from asgiref.sync import sync_to_async
+
+from django.db.models import FileField, ForeignKey
+from django.http import HttpResponseNotAllowed, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_etags
+
+from mainApp import vacunas
+from mainApp.models import Adopcion, Donacion, FichaMedica, SolicitudAdopcion, SolicitudVoluntariado
+
+ROLES_CON_ACCESO = ('admin', 'voluntario')
+LIMITE_POR_DEFECTO = 50
+LIMITE_MAXIMO = 200
+# Nunca salen por la API aunque se pidan
+EXCLUIDOS = {'contraseña'}
+
+# relaciones: nombre en el JSON -> ForeignKey del modelo
+Recurso = namedtuple('Recurso', 'modelo relaciones por_defecto')
+
+RECURSOS = {
+    'solicitudes': Recurso(
+        SolicitudAdopcion,
+        {'animal': 'id_animal', 'adoptante': 'id_adoptante', 'procesado_por': 'procesado_por'},
+        ['id', 'estado', 'fecha_solicitud', 'fecha_entrevista', 'animal.nombre', 'animal.especie',
+         'adoptante.nombre', 'adoptante.email', 'adoptante.telefono'],
+    ),
+    'adopciones': Recurso(
+        Adopcion,
+        {'animal': 'id_animal', 'adoptante': 'id_adoptante', 'aprobado_por': 'aprobado_por'},
+        ['id', 'estado', 'fecha_adopcion', 'fecha_contrato', 'fecha_completada', 'animal.nombre',
+         'adoptante.nombre', 'adoptante.email'],
+    ),
+    'voluntariado': Recurso(
+        SolicitudVoluntariado,
+        {'usuario': 'usuario_solicitante', 'procesado_por': 'procesado_por'},
+        ['id', 'nombre_completo', 'email', 'telefono', 'equipo', 'estado', 'fecha_solicitud', 'fecha_entrevista'],
+    ),
+    'donaciones': Recurso(
+        Donacion,
+        {'usuario': 'id_usuario'},
+        ['id', 'nombre_donante', 'monto', 'fecha', 'comprobante'],
+    ),
+}
+
+
+class ErrorConsulta(Exception):
+    pass
+
+
+def _campos_simples(modelo):
+    return {campo.name for campo in modelo._meta.concrete_fields
+            if not isinstance(campo, ForeignKey) and campo.name not in EXCLUIDOS}
+
+
+def _interpretar_campos(recurso, pedidos):
+    """{None: campos propios, 'relacion': campos de la relación}"""
+    campos = {None: ['id']}
+    for pedido in pedidos:
+        relacion, _, campo = pedido.rpartition('.')
+        if not relacion:
+            modelo = recurso.modelo
+        elif relacion in recurso.relaciones:
+            modelo = recurso.modelo._meta.get_field(recurso.relaciones[relacion]).related_model
+            campos.setdefault(relacion, ['id'])
+        else:
+            raise ErrorConsulta(f'Relación desconocida: {relacion}')
+        if campo not in _campos_simples(modelo):
+            raise ErrorConsulta(f'Campo desconocido: {pedido}')
+        if campo not in campos.setdefault(relacion or None, ['id']):
+            campos[relacion or None].append(campo)
+    return campos
+
+
+def _valor(objeto, campo):
+    valor = getattr(objeto, campo)
+    if isinstance(objeto._meta.get_field(campo), FileField):
+        return valor.url if valor else None
+    return valor
+
+
+def _serializar(objeto, recurso, campos):
+    datos = {campo: _valor(objeto, campo) for campo in campos[None]}
+    for relacion, campos_relacion in campos.items():
+        if relacion is None:
+            continue
+        relacionado = getattr(objeto, recurso.relaciones[relacion])
+        datos[relacion] = (None if relacionado is None
+                           else {campo: _valor(relacionado, campo) for campo in campos_relacion})
+    return datos
+
+
+def _entero(valor, nombre, minimo):
+    try:
+        numero = int(valor)
+    except ValueError:
+        raise ErrorConsulta(f'{nombre} debe ser un número entero')
+    if numero < minimo:
+        raise ErrorConsulta(f'{nombre} debe ser al menos {minimo}')
+    return numero
+
+
+def consultar(recurso, parametros):
+    """(página, siguiente cursor o None) para los parámetros del request"""
+    pedidos = [c for c in parametros.get('fields', '').split(',') if c] or recurso.por_defecto
+    campos = _interpretar_campos(recurso, pedidos)
+    limite = min(_entero(parametros.get('limite', LIMITE_POR_DEFECTO), 'limite', 1), LIMITE_MAXIMO)
+
+    relaciones, solo = [], list(campos[None])
+    for relacion, campos_relacion in campos.items():
+        if relacion is not None:
+            fk = recurso.relaciones[relacion]
+            relaciones.append(fk)
+            solo += [fk] + [f'{fk}__{campo}' for campo in campos_relacion]
+    consulta = recurso.modelo.objects.select_related(*relaciones).only(*solo).order_by('-id')
+
+    if 'estado' in parametros:
+        validos = {clave for clave, _ in getattr(recurso.modelo, 'ESTADOS', [])}
+        estados = parametros['estado'].split(',')
+        if not validos or not set(estados) <= validos:
+            raise ErrorConsulta(f'estado debe ser uno de: {", ".join(sorted(validos)) or "(sin estados)"}')
+        consulta = consulta.filter(estado__in=estados)
+    if 'despues' in parametros:
+        consulta = consulta.filter(id__lt=_entero(parametros['despues'], 'despues', 1))
+
+    # Una fila de más para saber si hay otra página sin un COUNT
+    filas = list(consulta[:limite + 1])
+    pagina = [_serializar(objeto, recurso, campos) for objeto in filas[:limite]]
+    return pagina, (filas[limite - 1].id if len(filas) > limite else None)
+
+
+def listar(request, nombre):
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    if request.session.get('usuario_rol') not in ROLES_CON_ACCESO:
+        return JsonResponse({'error': 'No autorizado'}, status=403)
+    try:
+        pagina, cursor = consultar(RECURSOS[nombre], request.GET)
+    except ErrorConsulta as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    siguiente = None
+    if cursor is not None:
+        parametros = request.GET.copy()
+        parametros['despues'] = cursor
+        siguiente = f'{request.path}?{parametros.urlencode(safe=",")}'
+    response = JsonResponse({'resultados': pagina, 'siguiente': siguiente})
+    # Datos personales de adoptantes: nunca en cachés compartidas
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+# ------------------------
+# FICHAS MÉDICAS
+# ------------------------
+CAMPOS_FICHA = ['esterilizado', 'fecha_esterilizacion', 'ultima_vacunacion',
+                'ultimo_control', 'proximo_control', 'estado_salud', 'observaciones']
+
+
+def _datos_ficha(ficha):
+    datos = {campo: getattr(ficha, campo) for campo in CAMPOS_FICHA}
+    datos['vacunas_al_dia'] = ficha.vacunas_al_dia
+    for campo in ('fecha_esterilizacion', 'ultimo_control', 'proximo_control'):
+        datos[campo] = datos[campo] and datos[campo].isoformat()
+    return datos
+
+
+def _etag(id_animal, datos):
+    # Con el id: dos fichas iguales de animales distintos no comparten ETag
+    contenido = json.dumps([id_animal, datos], sort_keys=True).encode()
+    return f'"{hashlib.sha256(contenido).hexdigest()[:16]}"'
+
+
+def _fichas_de(ids):
+    # Si un animal tuviera más de una ficha se usa la primera, como en el catálogo
+    return (FichaMedica.objects.filter(id_animal_id__in=ids).only('id_animal_id', *CAMPOS_FICHA)
+            .annotate(vacunas_al_dia=vacunas.al_dia('id_animal')).order_by('id'))
+
+
+async def ficha(request, id_animal):
+    encontrada = await _fichas_de([id_animal]).afirst()
+    if encontrada is None:
+        return JsonResponse({'error': 'Ficha médica no encontrada'}, status=404)
+    datos = _datos_ficha(encontrada)
+    etag = _etag(id_animal, datos)
+    response = get_conditional_response(request, etag=etag) or JsonResponse(datos)
+    response['ETag'] = etag
+    # El navegador la guarda y revalida cada vez con If-None-Match (304)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _ids(texto):
+    try:
+        ids = list(dict.fromkeys(int(parte) for parte in texto.split(',') if parte))
+    except ValueError:
+        raise ErrorConsulta('ids debe ser una lista de números separados por coma')
+    if not ids:
+        raise ErrorConsulta('Falta ids')
+    if len(ids) > LIMITE_MAXIMO:
+        raise ErrorConsulta(f'Como máximo {LIMITE_MAXIMO} ids por request')
+    return ids
+
+
+async def fichas(request):
+    try:
+        ids = _ids(request.GET.get('ids', ''))
+    except ErrorConsulta as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    conocidas = set(parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')))
+
+    por_animal = {}
+    async for encontrada in _fichas_de(ids):
+        por_animal.setdefault(encontrada.id_animal_id, encontrada)
+    resultado = {}
+    for id_animal, encontrada in por_animal.items():
+        datos = _datos_ficha(encontrada)
+        etag = _etag(id_animal, datos)
+        resultado[str(id_animal)] = ({'etag': etag, 'sin_cambios': True} if etag in conocidas
+                                     else {'etag': etag, 'ficha': datos})
+    response = JsonResponse({'fichas': resultado,
+                             'no_encontradas': [id_animal for id_animal in ids if id_animal not in por_animal]})
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+async def historial_ficha(request, id_animal):
+    from mainApp import historial
+
+    try:
+        antes = _entero(request.GET['antes'], 'antes', 1) if 'antes' in request.GET else None
+    except ErrorConsulta as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    eventos, cursor = await sync_to_async(historial.linea_de_tiempo)(id_animal, antes)
+    siguiente = f'{request.path}?antes={cursor}' if cursor else None
+    return JsonResponse({'eventos': eventos, 'siguiente': siguiente})
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class MainappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'mainApp'
+
+    def ready(self):
+        from mainApp import signals
+        signals.conectar()
@@ -0,0 +1,286 @@
+"""
+Registro de auditoría de las acciones de moderación, de solo inserción.
+
+procesado_por y aprobado_por guardan solo al último moderador, y eliminar una
+adopción o un usuario no dejaba rastro. Ahora cada alta, cambio o baja de
+MODELOS hecha dentro de una acción de moderación agrega un EventoAuditoria:
+quién (actor_id y cuenta), qué (acción del formulario y operación), qué fila
+(modelo y objeto_id), cuándo y un diff compacto:
+
+- alta y baja: {campo: valor}, sin los campos vacíos
+- cambio: {campo: [antes, después]}, solo los que cambiaron
+
+Nunca se guardan contraseñas, version ni los campos auto_now.
+
+Qué se audita: las vistas marcadas con @auditada abren un contexto con el
+usuario de la sesión y la acción del POST. Fuera de ese contexto (comandos,
+seeders, migraciones) las señales no registran nada. Las escrituras que no
+emiten señales llaman a registrar_* a mano: transiciones.transicionar
+(update()) y eliminar_usuario (DELETE directo).
+
+Escritura: el evento se arma en el request y se entrega a Escritor al
+confirmarse la transacción (si se revierte, no se audita). Escritor los
+inserta desde un hilo en segundo plano con bulk_create, de a
+AUDIT_BATCH_SIZE o cada AUDIT_FLUSH_SECONDS, así que el POST no espera el
+INSERT. Si la cola está llena se escribe en el request antes que perderlo, y
+si el INSERT falla los eventos quedan en el log como JSON. Con
+AUDIT_ASYNC=False, o con SQLite en memoria (pruebas), se escribe en el
+momento.
+
+En PostgreSQL la tabla está particionada por mes sobre fecha (migración
+0023). particiones_auditoria crea las de los meses siguientes; las consultas
+que filtran por fecha solo leen las particiones de ese rango, y archivar un
+año es separar sus particiones en vez de un DELETE masivo. En otras bases es
+una tabla común con los mismos índices.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import queue
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import date
+from functools import wraps
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from mainApp.metrics import incrementar
+from mainApp.models import EventoAuditoria
+
+logger = logging.getLogger('mainApp.auditoria')
+
+MODELOS = ('Usuario', 'Animal', 'SolicitudAdopcion', 'Adopcion', 'Contrato',
+           'SolicitudVoluntariado', 'EntrevistaVoluntario')
+EXCLUIDOS = {'contraseña', 'version'}
+
+Contexto = namedtuple('Contexto', 'actor_id actor accion')
+_contexto = contextvars.ContextVar('auditoria', default=None)
+
+
+@contextmanager
+def contexto(request, accion):
+    """Las escrituras dentro del bloque se auditan a nombre del usuario de la sesión"""
+    token = _contexto.set(Contexto(request.session.get('usuario_id'),
+                                   (request.session.get('usuario_nombre') or '')[:70], accion[:50]))
+    try:
+        yield
+    finally:
+        _contexto.reset(token)
+
+
+def auditada(vista):
+    """Audita las escrituras de los POST de `vista` con la acción del formulario"""
+    @wraps(vista)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'POST':
+            return vista(request, *args, **kwargs)
+        with contexto(request, request.POST.get('accion', '')):
+            return vista(request, *args, **kwargs)
+    return wrapper
+
+
+# ------------------------
+# DIFF
+# ------------------------
+def _valor(valor):
+    if valor is None or isinstance(valor, (bool, int, float, str)):
+        return valor
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    # Decimal, archivos (su nombre)
+    return str(valor)
+
+
+def campos(modelo):
+    return [campo for campo in modelo._meta.concrete_fields
+            if campo.name not in EXCLUIDOS and not getattr(campo, 'auto_now', False)]
+
+
+def _fila(instancia):
+    return {campo.attname: _valor(getattr(instancia, campo.attname)) for campo in campos(type(instancia))}
+
+
+def _registrar(operacion, instancia, cambios):
+    actual = _contexto.get()
+    if actual is None or not cambios:
+        return
+    evento = EventoAuditoria(fecha=timezone.now(), accion=actual.accion, operacion=operacion,
+                             modelo=type(instancia).__name__, objeto_id=instancia.pk,
+                             actor_id=actual.actor_id, actor=actual.actor, cambios=cambios)
+    transaction.on_commit(lambda: guardar(evento))
+
+
+def registrar_alta(instancia):
+    _registrar('alta', instancia, {campo: valor for campo, valor in _fila(instancia).items() if valor not in (None, '')})
+
+
+def registrar_cambio(instancia, antes):
+    """`antes`: {attname: valor anterior} de los campos que pudieron cambiar"""
+    cambios = {}
+    for campo, anterior in antes.items():
+        anterior, nuevo = _valor(anterior), _valor(getattr(instancia, campo))
+        if anterior != nuevo:
+            cambios[campo] = [anterior, nuevo]
+    _registrar('cambio', instancia, cambios)
+
+
+def registrar_baja(instancia):
+    _registrar('baja', instancia, {campo: valor for campo, valor in _fila(instancia).items() if valor not in (None, '')})
+
+
+# ------------------------
+# SEÑALES (mainApp.signals)
+# ------------------------
+def antes_de_guardar(sender, instance, raw=False, using=None, update_fields=None, **kwargs):
+    # Solo dentro de una acción de moderación: fuera no vale el SELECT extra
+    if raw or _contexto.get() is None or instance._state.adding:
+        return
+    nombres = [campo.attname for campo in campos(sender)
+               if update_fields is None or campo.name in update_fields]
+    instance._auditoria_antes = sender._base_manager.using(using).filter(pk=instance.pk).values(*nombres).first()
+
+
+def guardado(sender, instance, created, raw=False, **kwargs):
+    if raw or _contexto.get() is None:
+        return
+    if created:
+        registrar_alta(instance)
+        return
+    antes = instance.__dict__.pop('_auditoria_antes', None)
+    if antes is not None:
+        registrar_cambio(instance, antes)
+
+
+def borrado(sender, instance, **kwargs):
+    registrar_baja(instance)
+
+
+# ------------------------
+# ESCRITURA POR LOTES
+# ------------------------
+def _como_dict(evento):
+    return {campo.attname: getattr(evento, campo.attname) for campo in EventoAuditoria._meta.concrete_fields}
+
+
+class Escritor:
+    """Inserta los eventos por lotes desde un hilo en segundo plano para no sumar latencia al request"""
+
+    def __init__(self):
+        self.cola = queue.Queue(maxsize=10000)
+        self.hilo = None
+        self.lock = threading.Lock()
+
+    def encolar(self, evento):
+        with self.lock:
+            if self.hilo is None or not self.hilo.is_alive():
+                self.hilo = threading.Thread(target=self._bucle, name='escritor-auditoria', daemon=True)
+                self.hilo.start()
+        try:
+            self.cola.put_nowait(evento)
+        except queue.Full:
+            # Antes un INSERT dentro del request que perder el registro
+            self.escribir([evento])
+
+    def _bucle(self):
+        while True:
+            lote = [self.cola.get()]
+            limite = time.monotonic() + settings.AUDIT_FLUSH_SECONDS
+            while len(lote) < settings.AUDIT_BATCH_SIZE:
+                restante = limite - time.monotonic()
+                try:
+                    lote.append(self.cola.get(timeout=restante) if restante > 0 else self.cola.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                # Como al empezar y terminar un request: respeta CONN_MAX_AGE y el pool
+                close_old_connections()
+                self.escribir(lote)
+            finally:
+                close_old_connections()
+                for _ in lote:
+                    self.cola.task_done()
+
+    def escribir(self, eventos):
+        try:
+            EventoAuditoria.objects.bulk_create(eventos)
+        except Exception:
+            incrementar('rescatando_audit_events_total', len(eventos), resultado='fallido')
+            logger.exception('No se pudieron guardar %d eventos de auditoría: %s', len(eventos),
+                             json.dumps([_como_dict(e) for e in eventos], cls=DjangoJSONEncoder, ensure_ascii=False))
+        else:
+            incrementar('rescatando_audit_events_total', len(eventos), resultado='escrito')
+
+    def vaciar(self):
+        """Espera a que se escriban los eventos pendientes (pruebas y apagado)"""
+        if self.hilo is not None and self.hilo.is_alive():
+            self.cola.join()
+
+
+escritor = Escritor()
+atexit.register(escritor.vaciar)
+
+
+def _sincronico():
+    # SQLite en memoria no admite un segundo hilo escribiendo
+    en_memoria = getattr(connection, 'is_in_memory_db', lambda: False)()
+    return not settings.AUDIT_ASYNC or en_memoria
+
+
+def guardar(evento):
+    if _sincronico():
+        escritor.escribir([evento])
+    else:
+        escritor.encolar(evento)
+
+
+# ------------------------
+# PARTICIONES (PostgreSQL)
+# ------------------------
+def _meses(desde, cantidad):
+    """(primer día, primer día del mes siguiente) de `cantidad` meses desde el de `desde`"""
+    anio, mes = desde.year, desde.month
+    for _ in range(cantidad):
+        inicio = date(anio, mes, 1)
+        anio, mes = (anio + 1, 1) if mes == 12 else (anio, mes + 1)
+        yield inicio, date(anio, mes, 1)
+
+
+def crear_particiones(meses, desde=None):
+    """
+    Crea las particiones mensuales que falten desde el mes de `desde` (hoy).
+    Si la partición DEFAULT ya tiene filas de ese mes (el comando no corrió a
+    tiempo), las mueve a la partición nueva. Devuelve los nombres creados.
+    """
+    if connection.vendor != 'postgresql':
+        return []
+    tabla = EventoAuditoria._meta.db_table
+    por_defecto = connection.ops.quote_name(f'{tabla}_default')
+    creadas = []
+    for inicio, fin in _meses(desde or timezone.now().date(), meses):
+        nombre = f'{tabla}_{inicio:%Y_%m}'
+        rango = (f"FROM ('{inicio.isoformat()} 00:00:00+00') TO ('{fin.isoformat()} 00:00:00+00')")
+        donde = f"fecha >= '{inicio.isoformat()} 00:00:00+00' AND fecha < '{fin.isoformat()} 00:00:00+00'"
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute('SELECT to_regclass(%s)', [connection.ops.quote_name(nombre)])
+            if cursor.fetchone()[0] is not None:
+                continue
+            cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {por_defecto} WHERE {donde})')
+            atrasadas = cursor.fetchone()[0]
+            if atrasadas:
+                cursor.execute(f'ALTER TABLE {connection.ops.quote_name(tabla)} DETACH PARTITION {por_defecto}')
+            cursor.execute(f'CREATE TABLE {connection.ops.quote_name(nombre)} '
+                           f'PARTITION OF {connection.ops.quote_name(tabla)} FOR VALUES {rango}')
+            if atrasadas:
+                cursor.execute(f'INSERT INTO {connection.ops.quote_name(tabla)} '
+                               f'SELECT * FROM {por_defecto} WHERE {donde}')
+                cursor.execute(f'DELETE FROM {por_defecto} WHERE {donde}')
+                cursor.execute(f'ALTER TABLE {connection.ops.quote_name(tabla)} '
+                               f'ATTACH PARTITION {por_defecto} DEFAULT')
+        creadas.append(nombre)
+    return creadas
@@ -0,0 +1,27 @@
+"""
+Backends de base de datos de Django con medición del tiempo de conexión.
+
+Cada subpaquete (postgresql, mysql, sqlite3) es el backend de Django con
+ConexionMedida. settings.py los usa en lugar de los originales, así que
+/metrics muestra cuánto tarda cada request en obtener su conexión: abrir una
+conexión nueva (origen='nueva') o esperar una del pool de psycopg
+(origen='pool'). Con conexiones persistentes no hay observación: la conexión
+ya estaba abierta.
+"""
+import time
+
+from mainApp.metrics import incrementar, observar
+
+
+class ConexionMedida:
+    def get_new_connection(self, conn_params):
+        origen = 'pool' if getattr(self, 'pool', None) else 'nueva'
+        inicio = time.perf_counter()
+        try:
+            return super().get_new_connection(conn_params)
+        except Exception:
+            # Con pool, casi siempre un PoolTimeout: no hubo conexión libre a tiempo
+            incrementar('rescatando_db_connection_errors_total', alias=self.alias, origen=origen)
+            raise
+        finally:
+            observar('rescatando_db_connection_seconds', time.perf_counter() - inicio, alias=self.alias, origen=origen)
@@ -0,0 +1,7 @@
+from django.db.backends.postgresql import base
+
+from mainApp.backends import ConexionMedida
+
+
+class DatabaseWrapper(ConexionMedida, base.DatabaseWrapper):
+    pass
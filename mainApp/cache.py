@@ -0,0 +1,162 @@
+"""
+Helpers de caché con protección contra estampidas.
+
+obtener_o_calcular guarda junto al valor su vencimiento y lo que tardó en
+calcularse. Así se evitan dos problemas cuando una clave popular vence:
+
+- Recálculo anticipado (XFetch): antes de vencer, cada lectura tiene una
+  probabilidad creciente de recalcular el valor, mayor mientras más caro es.
+  Solo el proceso que consigue el lock recalcula; el resto sigue sirviendo el
+  valor actual.
+- Lock: si la clave no existe, solo un proceso la calcula (cache.add es
+  atómico en todos los backends) y los demás esperan hasta ESPERA_MAXIMA
+  segundos a que aparezca antes de calcularla por su cuenta.
+
+Coherencia entre workers: cada worker (y cada instancia) puede tener su
+propia caché locmem. Las claves pueden llevar la generación de un namespace
+(tabla GeneracionCache), que se incrementa en la misma transacción que las
+escrituras (mainApp.signals). Al cambiar la generación cambian las claves y
+las copias viejas de todos los workers dejan de usarse sin un servidor de
+caché compartido. Las generaciones se leen con una sola consulta por request
+(GeneracionCacheMiddleware).
+
+La configuración del backend está en settings.CACHES (CACHE_BACKEND).
+"""
+import contextvars
+import math
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.cache import cache as cache_default
+from django.db import transaction
+from django.db.models import F
+
+from mainApp.metrics import incrementar
+
+BETA = 1.0
+LOCK_TIMEOUT = 30
+ESPERA_MAXIMA = 2.0
+INTERVALO_ESPERA = 0.05
+
+# Modelos cuyas escrituras invalidan cada namespace (ver mainApp.signals)
+MODELOS_POR_NAMESPACE = {
+    'catalogo': ('Animal', 'FichaMedica', 'HogarTemporal', 'Vacunacion'),
+    'dashboard': ('Adoptante', 'SolicitudAdopcion', 'Adopcion', 'EntrevistaAdopcion', 'Contrato',
+                  'SolicitudVoluntariado', 'EntrevistaVoluntario'),
+    'donaciones': ('Donacion',),
+}
+
+# Generaciones leídas en el request actual; None fuera de un request
+_generaciones = contextvars.ContextVar('generaciones', default=None)
+
+
+def generacion(namespace):
+    """Versión actual del namespace; dentro de un request se consulta una sola vez"""
+    from mainApp.models import GeneracionCache
+
+    memo = _generaciones.get()
+    if memo is not None and namespace in memo:
+        return memo[namespace]
+    actuales = dict(GeneracionCache.objects.values_list('namespace', 'version'))
+    if memo is not None:
+        memo.update(actuales)
+        memo.setdefault(namespace, 0)
+    return actuales.get(namespace, 0)
+
+
+def incrementar_generacion(*namespaces):
+    """
+    Invalida los namespaces en todos los workers. Dentro de una transacción el
+    incremento se confirma (o se descarta) junto con la escritura.
+    """
+    from mainApp.models import GeneracionCache
+
+    with transaction.atomic():
+        for namespace in namespaces:
+            if not GeneracionCache.objects.filter(namespace=namespace).update(version=F('version') + 1):
+                GeneracionCache.objects.get_or_create(namespace=namespace, defaults={'version': 1})
+    memo = _generaciones.get()
+    if memo is not None:
+        for namespace in namespaces:
+            memo.pop(namespace, None)
+
+
+def _calcular_y_guardar(cache, clave, calcular, timeout):
+    inicio = time.monotonic()
+    try:
+        valor = calcular()
+        delta = time.monotonic() - inicio
+        cache.set(clave, (valor, time.time() + timeout, delta), timeout)
+        return valor
+    finally:
+        cache.delete(f'{clave}:lock')
+
+
+def obtener_o_calcular(clave, calcular, timeout=None, cache=None, namespace=None):
+    """
+    Devuelve el valor cacheado en clave o lo calcula con calcular() una sola
+    vez. Con namespace, la clave incluye su generación actual.
+    """
+    cache = cache or cache_default
+    if namespace:
+        clave = f'{clave}:g{generacion(namespace)}'
+    if timeout is None:
+        timeout = cache.default_timeout
+
+    entrada = cache.get(clave)
+    if entrada is not None:
+        valor, expira, delta = entrada
+        # -log(u) con u en (0, 1]: casi siempre pequeño, a veces grande
+        if time.time() - delta * BETA * math.log(1 - random.random()) < expira:
+            incrementar('rescatando_cache_total', resultado='hit')
+            return valor
+        if not cache.add(f'{clave}:lock', 1, LOCK_TIMEOUT):
+            incrementar('rescatando_cache_total', resultado='hit')
+            return valor
+        incrementar('rescatando_cache_total', resultado='anticipado')
+        return _calcular_y_guardar(cache, clave, calcular, timeout)
+
+    if cache.add(f'{clave}:lock', 1, LOCK_TIMEOUT):
+        incrementar('rescatando_cache_total', resultado='miss')
+        return _calcular_y_guardar(cache, clave, calcular, timeout)
+
+    # Otro proceso lo está calculando
+    incrementar('rescatando_cache_total', resultado='espera')
+    limite = time.monotonic() + ESPERA_MAXIMA
+    while time.monotonic() < limite:
+        time.sleep(INTERVALO_ESPERA)
+        entrada = cache.get(clave)
+        if entrada is not None:
+            return entrada[0]
+    return calcular()
+
+
+class GeneracionCacheMiddleware:
+    """Limita la lectura de generaciones a una consulta por request"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _generaciones.set({})
+        try:
+            return self.get_response(request)
+        finally:
+            _generaciones.reset(token)
+
+    async def __acall__(self, request):
+        # Las consultas async corren en otro hilo pero heredan una copia del
+        # contexto, que apunta al mismo diccionario
+        token = _generaciones.set({})
+        try:
+            return await self.get_response(request)
+        finally:
+            _generaciones.reset(token)
@@ -0,0 +1,178 @@
+"""
+Compresión de respuestas dinámicas con Brotli o gzip.
+
+WhiteNoise ya sirve los estáticos comprimidos; este middleware comprime el
+HTML y el JSON que generan las vistas:
+
+- Brotli si el cliente lo acepta y el paquete `brotli` está instalado, si no
+  gzip (con el relleno aleatorio de Django contra BREACH). Se respetan los
+  q-values de Accept-Encoding.
+- Solo tipos de texto y respuestas de al menos COMPRESSION_MIN_BYTES; por
+  debajo de un paquete TCP la compresión no ahorra nada.
+- `Vary: Accept-Encoding` en toda respuesta que podría comprimirse, aunque
+  este cliente no lo pida, para que los proxies no mezclen variantes.
+- Las respuestas en streaming se comprimen por partes y cada parte se envía
+  completa (flush), así que un stream de eventos no queda retenido.
+- No se tocan respuestas parciales (206), ya codificadas o con
+  Cache-Control: no-transform.
+
+Los tokens CSRF de Django cambian su máscara en cada respuesta, así que la
+compresión no los expone a ataques tipo BREACH.
+
+Registra el tiempo de compresión y los bytes antes y después en /metrics.
+"""
+import re
+import time
+import zlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+from mainApp.metrics import incrementar, observar
+
+try:
+    import brotli
+except ImportError:  # Opcional: sin brotli se usa solo gzip
+    brotli = None
+
+TIPOS_COMPRIMIBLES = re.compile(r'^(text/|application/(json|javascript|xml|xhtml\+xml)|image/svg\+xml)')
+# Máximo de bytes aleatorios en el encabezado gzip (igual que GZipMiddleware)
+RELLENO_MAXIMO = 100
+
+
+def calidades(accept_encoding):
+    """Accept-Encoding -> {codificación: q}; '*' vale para las no nombradas"""
+    calidades = {}
+    for parte in accept_encoding.split(','):
+        nombre, _, parametros = parte.strip().partition(';')
+        calidad = 1.0
+        parametro = parametros.strip()
+        if parametro.startswith('q='):
+            try:
+                calidad = float(parametro[2:])
+            except ValueError:
+                calidad = 0.0
+        calidades[nombre.strip().lower()] = calidad
+    return calidades
+
+
+def acepta(accept_encoding, codificacion):
+    por_codificacion = calidades(accept_encoding)
+    return por_codificacion.get(codificacion, por_codificacion.get('*', 0.0)) > 0
+
+
+def elegir_codificacion(accept_encoding):
+    """'br', 'gzip' o None según Accept-Encoding y lo que hay disponible"""
+    por_codificacion = calidades(accept_encoding)
+    comodin = por_codificacion.get('*', 0.0)
+    disponibles = ['br', 'gzip'] if brotli else ['gzip']
+    candidatas = [(por_codificacion.get(c, comodin), -i, c) for i, c in enumerate(disponibles)]
+    calidad, _, codificacion = max(candidatas)
+    return codificacion if calidad > 0 else None
+
+
+# Cada compresor es (comprimir, vaciar, terminar)
+def _compresor_gzip():
+    compresor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+    return (compresor.compress, lambda: compresor.flush(zlib.Z_SYNC_FLUSH),
+            lambda: compresor.flush(zlib.Z_FINISH))
+
+
+def _compresor_brotli():
+    compresor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+    return compresor.process, compresor.flush, compresor.finish
+
+
+COMPRESORES = {'gzip': _compresor_gzip, 'br': _compresor_brotli}
+
+
+def comprimir_stream(partes, codificacion):
+    comprimir, vaciar, terminar = COMPRESORES[codificacion]()
+    for parte in partes:
+        datos = comprimir(parte) + vaciar()
+        if datos:
+            yield datos
+    yield terminar()
+
+
+async def acomprimir_stream(partes, codificacion):
+    comprimir, vaciar, terminar = COMPRESORES[codificacion]()
+    async for parte in partes:
+        datos = comprimir(parte) + vaciar()
+        if datos:
+            yield datos
+    yield terminar()
+
+
+def comprimir(contenido, codificacion):
+    if codificacion == 'br':
+        return brotli.compress(contenido, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    return compress_string(contenido, max_random_bytes=RELLENO_MAXIMO)
+
+
+class CompresionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.COMPRESSION_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.procesar(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.procesar(request, await self.get_response(request))
+
+    def procesar(self, request, response):
+        if not self.comprimible(response):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        codificacion = elegir_codificacion(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if codificacion is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = acomprimir_stream(response.streaming_content, codificacion)
+            else:
+                response.streaming_content = comprimir_stream(response.streaming_content, codificacion)
+            # El tamaño comprimido no se conoce hasta terminar el stream
+            del response.headers['Content-Length']
+        else:
+            inicio = time.perf_counter()
+            comprimido = comprimir(response.content, codificacion)
+            observar('rescatando_compression_seconds', time.perf_counter() - inicio, codificacion=codificacion)
+            incrementar('rescatando_compression_bytes_total', len(response.content), codificacion=codificacion,
+                        etapa='entrada')
+            incrementar('rescatando_compression_bytes_total', len(comprimido), codificacion=codificacion,
+                        etapa='salida')
+            if len(comprimido) >= len(response.content):
+                return response
+            response.content = comprimido
+            response.headers['Content-Length'] = str(len(comprimido))
+
+        # El cuerpo cambió: un ETag fuerte pasa a ser débil (RFC 9110, 8.8.1)
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = codificacion
+        return response
+
+    @staticmethod
+    def comprimible(response):
+        if response.status_code == 206 or response.has_header('Content-Encoding'):
+            return False
+        if 'no-transform' in response.get('Cache-Control', ''):
+            return False
+        if not TIPOS_COMPRIMIBLES.match(response.get('Content-Type', '')):
+            return False
+        return response.streaming or len(response.content) >= settings.COMPRESSION_MIN_BYTES
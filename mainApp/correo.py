@@ -0,0 +1,57 @@
+"""
+Backend de correo instrumentado.
+
+Envuelve el backend real (EMAIL_BACKEND_DESTINO), registra la latencia y
+los fallos de cada envío y abre un span por envío cuando hay una traza
+activa. Las vistas siguen usando send_mail sin cambios.
+
+Las vistas async usan enviar_correo, que ejecuta send_mail en el pool de
+hilos sin bloquear el event loop mientras espera al servidor SMTP.
+"""
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.mail import get_connection, send_mail
+from django.core.mail.backends.base import BaseEmailBackend
+
+from mainApp import metrics
+from mainApp.tracing import span
+
+
+class EmailBackend(BaseEmailBackend):
+    def __init__(self, fail_silently=False, **kwargs):
+        super().__init__(fail_silently=fail_silently)
+        self.destino = get_connection(settings.EMAIL_BACKEND_DESTINO, fail_silently=fail_silently, **kwargs)
+
+    def open(self):
+        return self.destino.open()
+
+    def close(self):
+        return self.destino.close()
+
+    def send_messages(self, email_messages):
+        if not email_messages:
+            return 0
+        inicio = time.perf_counter()
+        try:
+            with span('send_mail', 'smtp', mensajes=len(email_messages)):
+                enviados = self.destino.send_messages(email_messages)
+        except Exception:
+            metrics.incrementar('rescatando_email_failures_total', len(email_messages))
+            raise
+        finally:
+            metrics.observar('rescatando_email_send_duration_seconds', time.perf_counter() - inicio)
+        # Con fail_silently el backend real devuelve 0 en vez de lanzar la excepción
+        if enviados < len(email_messages):
+            metrics.incrementar('rescatando_email_failures_total', len(email_messages) - (enviados or 0))
+        return enviados
+
+
+async def enviar_correo(asunto, mensaje, destinatarios):
+    """send_mail para vistas async: la espera de red no bloquea el event loop"""
+    # thread_sensitive=False: el envío no usa la base de datos y así varios
+    # correos pueden esperar al SMTP en paralelo
+    return await sync_to_async(send_mail, thread_sensitive=False)(
+        asunto, mensaje, settings.DEFAULT_FROM_EMAIL, destinatarios, fail_silently=False,
+    )
@@ -0,0 +1,34 @@
+"""
+WhiteNoise con soporte async.
+
+WhiteNoiseMiddleware (6.x) solo es síncrono: bajo ASGI Django tendría que
+adaptar toda la cadena y las vistas async volverían a ocupar un hilo por
+request. Esta subclase atiende los archivos estáticos igual que WhiteNoise y
+deja pasar el resto de los requests sin salir del event loop.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from whitenoise.middleware import WhiteNoiseMiddleware as _WhiteNoiseMiddleware
+
+
+class WhiteNoiseMiddleware(_WhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
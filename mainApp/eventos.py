@@ -0,0 +1,133 @@
+"""
+Avisos en vivo para el dashboard de solicitudes.
+
+Cada solicitud de adopción o de voluntariado nueva, cada cambio de estado y
+cada donación nueva agrega una fila a EventoCambio (mainApp.signals). El id
+de esa tabla es el cursor: el dashboard guarda el último que vio y pide solo
+los posteriores, una consulta `WHERE id > n` sobre la clave primaria.
+
+GET /api/eventos/?despues=<id>:
+
+- Bajo ASGI y con `Accept: text/event-stream` responde Server-Sent Events.
+  Revisa la tabla cada EVENTS_POLL_SECONDS sin ocupar un hilo, y cierra el
+  stream después de EVENTS_STREAM_SECONDS. EventSource se reconecta solo y
+  manda Last-Event-ID para seguir desde ahí.
+- Bajo WSGI (o sin ese Accept) responde en el momento con los eventos que
+  haya, aunque sea ninguno, y `reintentar`: los segundos que el navegador
+  espera antes de volver a preguntar (EVENTS_CLIENT_POLL_SECONDS). Esperar
+  en el servidor, sea un stream o un long-poll, retendría un worker sync por
+  cada pestaña abierta.
+
+Los eventos se escriben con transaction.on_commit: no se avisa de cambios que
+se revierten, y el id se asigna recién al confirmar. Así un cliente no puede
+leer el id 11 mientras el 10 sigue dentro de una transacción larga y
+saltárselo.
+"""
+import asyncio
+import json
+import time
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+
+from mainApp.metrics import incrementar
+
+ROLES_CON_ACCESO = ('admin', 'voluntario')
+MAXIMO_POR_CONSULTA = 100
+CAMPOS = ('id', 'modelo', 'objeto_id', 'tipo', 'estado', 'fecha')
+
+
+def registrar(instancia, created):
+    """
+    post_save de los modelos de EventoCambio.MODELOS. Los que no tienen
+    estado (Donacion) solo avisan de las altas.
+    """
+    from mainApp.models import EventoCambio
+
+    con_estado = any(campo.name == 'estado' for campo in instancia._meta.concrete_fields)
+    estado = instancia.estado if con_estado else ''
+    if created:
+        tipo = 'creada'
+    elif con_estado and estado != getattr(instancia, '_estado_cargado', None):
+        tipo = 'estado'
+    else:
+        return
+    instancia._estado_cargado = estado
+    evento = EventoCambio(modelo=instancia._meta.model_name, objeto_id=instancia.pk, tipo=tipo, estado=estado)
+    transaction.on_commit(evento.save)
+
+
+def ultimo_id():
+    from mainApp.models import EventoCambio
+
+    return EventoCambio.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def _consulta(despues):
+    from mainApp.models import EventoCambio
+
+    return EventoCambio.objects.filter(id__gt=despues).order_by('id').values(*CAMPOS)[:MAXIMO_POR_CONSULTA]
+
+
+def _cursor(request):
+    valor = request.META.get('HTTP_LAST_EVENT_ID') or request.GET.get('despues', '')
+    try:
+        return max(int(valor), 0)
+    except ValueError:
+        return None
+
+
+def _sse(evento):
+    return f'id: {evento["id"]}\nevent: {evento["modelo"]}\ndata: {json.dumps(evento, cls=DjangoJSONEncoder)}\n\n'
+
+
+async def _stream(despues):
+    # retry: cuánto espera EventSource antes de reconectarse
+    yield f'retry: {settings.EVENTS_POLL_SECONDS * 1000}\n\n'
+    fin = time.monotonic() + settings.EVENTS_STREAM_SECONDS
+    while time.monotonic() < fin:
+        eventos = [evento async for evento in _consulta(despues)]
+        for evento in eventos:
+            yield _sse(evento)
+        if eventos:
+            despues = eventos[-1]['id']
+            incrementar('rescatando_events_sent_total', len(eventos), modo='sse')
+        else:
+            # Comentario: mantiene viva la conexión a través de proxies
+            yield ': sin cambios\n\n'
+        await asyncio.sleep(settings.EVENTS_POLL_SECONDS)
+
+
+async def eventos(request):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    if await request.session.aget('usuario_rol') not in ROLES_CON_ACCESO:
+        return JsonResponse({'error': 'No autorizado'}, status=403)
+    despues = _cursor(request)
+    if despues is None:
+        return JsonResponse({'error': 'despues debe ser un número entero'}, status=400)
+
+    if isinstance(request, ASGIRequest) and 'text/event-stream' in request.META.get('HTTP_ACCEPT', ''):
+        response = StreamingHttpResponse(_stream(despues), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # nginx no debe acumular el stream antes de enviarlo
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    lista = [evento async for evento in _consulta(despues)]
+    if lista:
+        incrementar('rescatando_events_sent_total', len(lista), modo='poll')
+    response = JsonResponse({'eventos': lista, 'cursor': lista[-1]['id'] if lista else despues,
+                             'reintentar': settings.EVENTS_CLIENT_POLL_SECONDS})
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def limpiar_eventos(antes_de):
+    from mainApp.models import EventoCambio
+
+    borrados, _ = EventoCambio.objects.filter(fecha__lt=antes_de).delete()
+    return borrados
@@ -34,7 +34,7 @@ class AnimalForm(forms.ModelForm):
 class FichaMedicaForm(forms.ModelForm):
     class Meta:
         model = FichaMedica
-        fields = ['id_animal', 'esterilizado', 'fecha_esterilizacion', 'vacunas_al_dia', 
+        fields = ['id_animal', 'esterilizado', 'fecha_esterilizacion',
                   'ultima_vacunacion', 'ultimo_control', 'proximo_control', 'estado_salud', 'observaciones']
         widgets = {
             'fecha_esterilizacion': forms.DateInput(attrs={'type': 'date'}),
@@ -0,0 +1,119 @@
+"""
+Historial médico de cada animal, de solo inserción.
+
+FichaMedica sigue siendo el estado actual: el catálogo y gestionar_animales
+la leen en una fila, igual que antes. Pero ya no se edita directamente.
+registrar_cambios compara los valores nuevos con la ficha, agrega un
+EventoMedico por cada grupo que cambió (vacunación, esterilización, control,
+observación) y actualiza la ficha, todo en la misma transacción. Los eventos
+no se modifican ni se borran (EventoMedico.save/delete lo impiden).
+
+Instantáneas: cada INSTANTANEA_CADA eventos se guarda en InstantaneaMedica el
+estado completo de la ficha hasta ese evento. Para reconstruir el estado
+(estado_en) se parte de la última instantánea anterior y se aplican a lo sumo
+INSTANTANEA_CADA eventos, aunque el animal tenga cientos. La línea de tiempo
+se lee por páginas desde el más reciente con el índice (id_animal, -id).
+Los eventos viejos nunca se compactan borrándolos: el historial es el punto.
+"""
+from django.db import transaction
+from django.db.models import Max
+
+from mainApp.models import EventoMedico, FichaMedica, InstantaneaMedica
+
+INSTANTANEA_CADA = 50
+LIMITE_POR_PAGINA = 50
+
+# Campo de la ficha -> tipo de evento que lo registra
+TIPO_POR_CAMPO = {
+    'esterilizado': 'esterilizacion',
+    'fecha_esterilizacion': 'esterilizacion',
+    'ultima_vacunacion': 'vacunacion',
+    'ultimo_control': 'control',
+    'proximo_control': 'control',
+    'estado_salud': 'control',
+    'observaciones': 'observacion',
+}
+CAMPOS = list(TIPO_POR_CAMPO)
+
+
+def _serializable(valor):
+    return valor.isoformat() if hasattr(valor, 'isoformat') else valor
+
+
+def estado_de(ficha):
+    return {campo: _serializable(getattr(ficha, campo)) for campo in CAMPOS}
+
+
+def abrir(ficha, usuario_id=None):
+    """Primer evento de una ficha nueva, con su estado completo"""
+    return EventoMedico.objects.create(id_animal_id=ficha.id_animal_id, tipo='apertura', datos=estado_de(ficha),
+                                       registrado_por_id=usuario_id)
+
+
+@transaction.atomic
+def registrar_cambios(ficha, valores, usuario_id=None, nota=''):
+    """
+    Aplica `valores` (campo -> valor, como llegan del formulario) a la ficha
+    y registra un evento por cada tipo que cambió. Devuelve los eventos.
+    """
+    ficha = FichaMedica.objects.select_for_update().get(pk=ficha.pk)
+    cambios = {}
+    for campo, valor in valores.items():
+        valor = FichaMedica._meta.get_field(campo).to_python(valor)
+        if valor != getattr(ficha, campo):
+            setattr(ficha, campo, valor)
+            cambios.setdefault(TIPO_POR_CAMPO[campo], {})[campo] = _serializable(valor)
+    if not cambios:
+        return []
+
+    eventos = EventoMedico.objects.bulk_create([
+        EventoMedico(id_animal_id=ficha.id_animal_id, tipo=tipo, datos=datos, nota=nota, registrado_por_id=usuario_id)
+        for tipo, datos in cambios.items()
+    ])
+    ficha.save(update_fields=[campo for datos in cambios.values() for campo in datos])
+    _instantanea_si_corresponde(ficha.id_animal_id)
+    return eventos
+
+
+def _instantanea_si_corresponde(id_animal):
+    ultima = InstantaneaMedica.objects.filter(id_animal_id=id_animal).order_by('-hasta_evento').first()
+    desde = ultima.hasta_evento if ultima else 0
+    if EventoMedico.objects.filter(id_animal_id=id_animal, id__gt=desde).count() >= INSTANTANEA_CADA:
+        crear_instantanea(id_animal)
+
+
+def crear_instantanea(id_animal):
+    hasta = EventoMedico.objects.filter(id_animal_id=id_animal).aggregate(ultimo=Max('id'))['ultimo']
+    if hasta is None:
+        return None
+    estado, total = estado_en(id_animal, hasta)
+    return InstantaneaMedica.objects.create(id_animal_id=id_animal, hasta_evento=hasta, estado=estado, eventos=total)
+
+
+def estado_en(id_animal, hasta_evento=None):
+    """
+    (estado de la ficha después de `hasta_evento` o del último evento,
+    eventos aplicados en total). Parte de la última instantánea anterior.
+    """
+    instantaneas = InstantaneaMedica.objects.filter(id_animal_id=id_animal).order_by('-hasta_evento')
+    eventos = EventoMedico.objects.filter(id_animal_id=id_animal).order_by('id')
+    if hasta_evento is not None:
+        instantaneas = instantaneas.filter(hasta_evento__lte=hasta_evento)
+        eventos = eventos.filter(id__lte=hasta_evento)
+    base = instantaneas.first()
+    estado, total = (dict(base.estado), base.eventos) if base else ({}, 0)
+    if base:
+        eventos = eventos.filter(id__gt=base.hasta_evento)
+    for datos in eventos.values_list('datos', flat=True):
+        estado.update(datos)
+        total += 1
+    return estado, total
+
+
+def linea_de_tiempo(id_animal, antes=None, limite=LIMITE_POR_PAGINA):
+    """(eventos del más reciente al más antiguo, cursor de la página siguiente o None)"""
+    eventos = EventoMedico.objects.filter(id_animal_id=id_animal).order_by('-id')
+    if antes is not None:
+        eventos = eventos.filter(id__lt=antes)
+    filas = list(eventos.values('id', 'tipo', 'fecha', 'datos', 'nota', 'registrado_por__nombre')[:limite + 1])
+    return filas[:limite], (filas[limite - 1]['id'] if len(filas) > limite else None)
@@ -0,0 +1,144 @@
+"""
+Instrumentación de consultas SQL por request.
+
+Registra cuántas consultas ejecuta cada request, el tiempo total en SQL, las
+consultas repetidas (misma huella) y las más lentas. Se activa con
+QUERY_INSTRUMENTATION=True y publica los datos en la cabecera Server-Timing y
+en el log 'mainApp.rendimiento'. Los helpers de pruebas de mainApp.testing
+usan el mismo registro para exigir presupuestos de consultas por vista.
+"""
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('mainApp.rendimiento')
+
+_ESPACIOS = re.compile(r'\s+')
+_LISTA_IN = re.compile(r'IN \((?:%s, )*%s\)')
+_LITERALES = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+def huella_sql(sql):
+    """Normaliza una consulta para agrupar las que solo difieren en parámetros"""
+    sql = _ESPACIOS.sub(' ', sql.strip())
+    sql = _LITERALES.sub('%s', sql)
+    return _LISTA_IN.sub('IN (...)', sql)
+
+
+class RegistroConsultas:
+    """Wrapper de ejecución que anota cada consulta y su duración"""
+
+    def __init__(self):
+        self.consultas = []
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas.append((sql, time.perf_counter() - inicio))
+
+    @property
+    def total(self):
+        return len(self.consultas)
+
+    @property
+    def tiempo_total_ms(self):
+        return sum(duracion for _, duracion in self.consultas) * 1000
+
+    def repetidas(self):
+        """Huellas ejecutadas más de una vez, de más a menos frecuente"""
+        conteo = Counter(huella_sql(sql) for sql, _ in self.consultas)
+        return [(huella, n) for huella, n in conteo.most_common() if n > 1]
+
+    def mas_lentas(self, cantidad=5):
+        ordenadas = sorted(self.consultas, key=lambda c: c[1], reverse=True)
+        return [(sql, duracion * 1000) for sql, duracion in ordenadas[:cantidad]]
+
+    def resumen(self):
+        return {
+            'consultas': self.total,
+            'sql_ms': round(self.tiempo_total_ms, 2),
+            'repetidas': [{'sql': huella, 'veces': n} for huella, n in self.repetidas()[:10]],
+            'mas_lentas': [{'sql': sql[:500], 'ms': round(ms, 2)} for sql, ms in self.mas_lentas()],
+        }
+
+
+@contextmanager
+def registrar_consultas(registro=None):
+    """Registra las consultas de todas las conexiones mientras dure el bloque"""
+    registro = registro or RegistroConsultas()
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(registro))
+        yield registro
+
+
+def presupuesto_consultas(maximo):
+    """
+    Declara el máximo de consultas que puede ejecutar una vista.
+    Debe ir por encima de requiere_permiso para que el atributo quede en la
+    función que registra urls.py.
+    """
+    def decorador(vista):
+        vista.presupuesto_consultas = maximo
+        return vista
+    return decorador
+
+
+def agregar_server_timing(response, metrica):
+    """Agrega una métrica a la cabecera Server-Timing sin pisar las existentes"""
+    if response.has_header('Server-Timing'):
+        response['Server-Timing'] = f"{response['Server-Timing']}, {metrica}"
+    else:
+        response['Server-Timing'] = metrica
+
+
+class QueryInstrumentationMiddleware:
+    """Mide las consultas SQL de cada request (solo si QUERY_INSTRUMENTATION está activo)"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.umbral_ms = getattr(settings, 'SLOW_REQUEST_MS', 500)
+
+    def __call__(self, request):
+        inicio = time.perf_counter()
+        with registrar_consultas() as registro:
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - inicio) * 1000
+
+        agregar_server_timing(
+            response,
+            f'db;dur={registro.tiempo_total_ms:.1f};desc="{registro.total} consultas"',
+        )
+
+        vista = getattr(request, '_vista_instrumentada', None)
+        presupuesto = getattr(vista, 'presupuesto_consultas', None)
+        excede = presupuesto is not None and registro.total > presupuesto
+
+        if total_ms >= self.umbral_ms or excede:
+            datos = {
+                'evento': 'request_lento' if not excede else 'presupuesto_excedido',
+                'metodo': request.method,
+                'ruta': request.path,
+                'vista': getattr(vista, '__name__', None),
+                'status': response.status_code,
+                'total_ms': round(total_ms, 2),
+                'presupuesto': presupuesto,
+                **registro.resumen(),
+            }
+            logger.warning(json.dumps(datos, ensure_ascii=False))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._vista_instrumentada = view_func
+        return None
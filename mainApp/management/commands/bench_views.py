@@ -0,0 +1,153 @@
+"""
+Mide el tiempo de las vistas principales con el cliente de pruebas a distintos
+volúmenes de datos y guarda un reporte JSON comparable entre commits.
+
+Uso:
+    python manage.py bench_views --sizes 10,100,1000 --output bench_views.json
+    python manage.py bench_views --sizes 100 --comparar bench_base.json
+
+Corre sobre una base de datos de pruebas que se crea y se destruye al final,
+nunca sobre la base configurada.
+"""
+
+import datetime
+import json
+import platform
+import statistics
+import subprocess
+import time
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from mainApp.instrumentation import registrar_consultas
+from mainApp.models import Animal, Usuario
+from mainApp.seeding import sembrar
+from mainApp.testing import iniciar_sesion
+
+# (nombre, url, rol de la sesión)
+VISTAS = [
+    ('index', lambda: reverse('index'), None),
+    ('ayudar', lambda: reverse('ayudar'), None),
+    ('ver_comprobantes', lambda: reverse('ver_comprobantes'), None),
+    ('login', lambda: reverse('login'), None),
+    ('perfil', lambda: reverse('perfil'), 'adoptante'),
+    ('mis_adopciones', lambda: reverse('mis_adopciones'), 'adoptante'),
+    ('gestionar_animales', lambda: reverse('gestionar_animales'), 'admin'),
+    ('obtener_ficha_medica', lambda: reverse('obtener_ficha_medica', args=[Animal.objects.values_list('id', flat=True).first()]), 'admin'),
+    ('ver_solicitudes', lambda: reverse('ver_solicitudes'), 'admin'),
+    ('gestionar_usuarios', lambda: reverse('gestionar_usuarios'), 'admin'),
+]
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, round(p / 100 * (len(ordenados) - 1)))
+    return ordenados[indice]
+
+
+def _commit_actual():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Benchmark de las vistas principales a distintos volúmenes de datos (reporte JSON).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,100,500',
+                            help='Cantidades de animales separadas por coma (solicitudes = 2x, donaciones = 1x)')
+        parser.add_argument('--repeticiones', type=int, default=5, help='Requests medidos por vista')
+        parser.add_argument('--output', default='bench_views.json', help='Archivo del reporte JSON')
+        parser.add_argument('--comparar', help='Reporte anterior para mostrar la diferencia')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        try:
+            tamanos = [int(t) for t in options['sizes'].split(',') if t.strip()]
+        except ValueError:
+            raise CommandError('--sizes debe ser una lista de enteros separada por comas')
+
+        reporte = {
+            'commit': _commit_actual(),
+            'fecha': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'base_datos': connection.vendor,
+            'repeticiones': options['repeticiones'],
+            'resultados': {},
+        }
+
+        setup_test_environment(debug=False)
+        nombre_original = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            for tamano in tamanos:
+                call_command('flush', interactive=False, verbosity=0)
+                resumen = sembrar(animales=tamano, solicitudes=tamano * 2, donaciones=tamano, semilla=options['seed'])
+                self.stdout.write(f'Tamaño {tamano}: {resumen["solicitudes"]} solicitudes, {resumen["donaciones"]} donaciones')
+                reporte['resultados'][str(tamano)] = self.medir(resumen, options['repeticiones'])
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+            teardown_test_environment()
+
+        with open(options['output'], 'w', encoding='utf-8') as archivo:
+            json.dump(reporte, archivo, indent=2, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(f"Reporte guardado en {options['output']}"))
+
+        if options['comparar']:
+            with open(options['comparar'], encoding='utf-8') as archivo:
+                self.comparar(json.load(archivo), reporte)
+
+    def medir(self, resumen, repeticiones):
+        cuentas = {'admin': resumen['admin'], 'adoptante': resumen['adoptante']}
+        resultados = {}
+        for nombre, url, rol in VISTAS:
+            client = Client()
+            if rol:
+                iniciar_sesion(client, Usuario.objects.get(cuenta=cuentas[rol]))
+            ruta = url()
+            client.get(ruta)  # Calentamiento (plantillas compiladas, conexiones abiertas)
+
+            tiempos, consultas = [], 0
+            for _ in range(repeticiones):
+                with registrar_consultas() as registro:
+                    inicio = time.perf_counter()
+                    response = client.get(ruta)
+                    tiempos.append((time.perf_counter() - inicio) * 1000)
+                consultas = registro.total
+
+            resultados[nombre] = {
+                'status': response.status_code,
+                'mediana_ms': round(statistics.median(tiempos), 2),
+                'p95_ms': round(_percentil(tiempos, 95), 2),
+                'min_ms': round(min(tiempos), 2),
+                'consultas': consultas,
+                'bytes': len(response.content),
+            }
+            self.stdout.write(f"  {nombre:<22} {resultados[nombre]['mediana_ms']:>9.2f} ms  "
+                              f"{consultas:>5} consultas  {resultados[nombre]['bytes']:>9} bytes")
+        return resultados
+
+    def comparar(self, base, nuevo):
+        self.stdout.write(f"\nComparación {base.get('commit')} -> {nuevo.get('commit')} (mediana ms)")
+        for tamano, vistas in nuevo['resultados'].items():
+            anteriores = base.get('resultados', {}).get(tamano)
+            if not anteriores:
+                continue
+            for nombre, datos in vistas.items():
+                antes = anteriores.get(nombre)
+                if not antes:
+                    continue
+                cambio = (datos['mediana_ms'] - antes['mediana_ms']) / antes['mediana_ms'] * 100 if antes['mediana_ms'] else 0
+                linea = (f"  [{tamano}] {nombre:<22} {antes['mediana_ms']:>9.2f} -> {datos['mediana_ms']:>9.2f} "
+                         f"({cambio:+.1f}%)  consultas {antes['consultas']} -> {datos['consultas']}")
+                self.stdout.write(self.style.WARNING(linea) if cambio > 20 else linea)
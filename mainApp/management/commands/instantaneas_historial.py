@@ -0,0 +1,48 @@
+"""
+Crea las instantáneas del historial médico que falten (animales con
+INSTANTANEA_CADA eventos o más desde la última) y, con --verificar, compara
+el estado reconstruido desde el historial con cada FichaMedica.
+
+registrar_cambios ya crea las instantáneas al escribir; este comando cubre
+los eventos cargados en bloque (migraciones, seed_bench).
+
+Uso:
+    python manage.py instantaneas_historial
+    python manage.py instantaneas_historial --verificar
+"""
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from mainApp import historial
+from mainApp.models import EventoMedico, FichaMedica, InstantaneaMedica
+
+
+class Command(BaseCommand):
+    help = 'Crea las instantáneas del historial médico que falten y verifica las fichas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verificar', action='store_true',
+                            help='Comparar el estado del historial con cada ficha médica')
+
+    def handle(self, *args, **options):
+        # Eventos posteriores a la última instantánea de cada animal
+        ultimas = dict(InstantaneaMedica.objects.values('id_animal').annotate(hasta=Max('hasta_evento'))
+                       .values_list('id_animal', 'hasta'))
+        nuevos = Counter(id_animal for id_animal, id_evento
+                         in EventoMedico.objects.order_by().values_list('id_animal', 'id').iterator()
+                         if id_evento > ultimas.get(id_animal, 0))
+        atrasados = [id_animal for id_animal, total in nuevos.items() if total >= historial.INSTANTANEA_CADA]
+        for id_animal in atrasados:
+            historial.crear_instantanea(id_animal)
+        self.stdout.write(self.style.SUCCESS(f'Instantáneas creadas: {len(atrasados)}'))
+
+        if options['verificar']:
+            distintas = 0
+            for ficha in FichaMedica.objects.order_by('id').iterator():
+                estado, _ = historial.estado_en(ficha.id_animal_id)
+                if estado != historial.estado_de(ficha):
+                    distintas += 1
+                    self.stdout.write(self.style.WARNING(f'La ficha de {ficha.id_animal_id} no coincide con su historial'))
+            self.stdout.write(self.style.SUCCESS(f'Fichas distintas de su historial: {distintas}'))
@@ -0,0 +1,28 @@
+"""
+Borra los eventos del dashboard más antiguos que EVENTS_TTL_DAYS. Un cliente
+con un cursor más viejo solo deja de ver esos avisos; la página siempre se
+puede recargar.
+
+Uso:
+    python manage.py limpiar_eventos
+    python manage.py limpiar_eventos --dias 2
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from mainApp.eventos import limpiar_eventos
+
+
+class Command(BaseCommand):
+    help = 'Borra los eventos viejos de los avisos en vivo del dashboard.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=settings.EVENTS_TTL_DAYS,
+                            help='Días que se conservan los eventos')
+
+    def handle(self, *args, **options):
+        borrados = limpiar_eventos(timezone.now() - timedelta(days=options['dias']))
+        self.stdout.write(self.style.SUCCESS(f'Eventos borrados: {borrados}'))
@@ -0,0 +1,27 @@
+"""
+Borra las subidas por partes sin actividad: los archivos a medio subir y los
+terminados que ningún formulario llegó a usar.
+
+Uso:
+    python manage.py limpiar_subidas
+    python manage.py limpiar_subidas --horas 6
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from mainApp.subidas import limpiar_subidas
+
+
+class Command(BaseCommand):
+    help = 'Borra las subidas por partes abandonadas y sus archivos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horas', type=int, default=settings.UPLOAD_PARTS_TTL_HOURS,
+                            help='Horas sin actividad para considerar abandonada una subida')
+
+    def handle(self, *args, **options):
+        borradas = limpiar_subidas(timezone.now() - timedelta(hours=options['horas']))
+        self.stdout.write(self.style.SUCCESS(f'Subidas abandonadas borradas: {borradas}'))
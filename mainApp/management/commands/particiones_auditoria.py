@@ -0,0 +1,29 @@
+"""
+Crea por adelantado las particiones mensuales de la auditoría (PostgreSQL).
+Correrlo una vez por mes; si no corre, las filas van a la partición DEFAULT y
+la próxima ejecución las mueve a su mes. En otras bases no hace nada.
+
+Uso:
+    python manage.py particiones_auditoria
+    python manage.py particiones_auditoria --meses 6
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from mainApp.auditoria import crear_particiones
+
+
+class Command(BaseCommand):
+    help = 'Crea las particiones mensuales de la tabla de auditoría.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses', type=int, default=settings.AUDIT_PARTITIONS_AHEAD,
+                            help='Meses a cubrir desde el actual')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write(f'{connection.vendor}: la auditoría es una tabla sin particiones, no hay nada que crear')
+            return
+        creadas = crear_particiones(options['meses'])
+        self.stdout.write(self.style.SUCCESS(f'Particiones creadas: {", ".join(creadas) or "ninguna"}'))
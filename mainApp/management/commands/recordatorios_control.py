@@ -0,0 +1,34 @@
+"""
+Envía a cada voluntario un resumen de los controles veterinarios próximos de
+los animales de su hogar temporal. Pensado para un cron diario; los avisos
+ya enviados no se repiten.
+
+Uso:
+    python manage.py recordatorios_control
+    python manage.py recordatorios_control --dias 3 --simular
+"""
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from mainApp.recordatorios import enviar_recordatorios
+
+
+class Command(BaseCommand):
+    help = 'Envía los recordatorios de controles veterinarios próximos, un correo por voluntario.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=settings.CHECKUP_REMINDER_DAYS,
+                            help='Avisar los controles de hoy a hoy + dias')
+        parser.add_argument('--hoy', type=date.fromisoformat, help='Fecha de referencia (AAAA-MM-DD)')
+        parser.add_argument('--simular', action='store_true', help='Solo contar, sin enviar ni registrar')
+
+    def handle(self, *args, **options):
+        hoy = options['hoy'] or timezone.localdate()
+        correos, fichas, sin_email = enviar_recordatorios(hoy, options['dias'], simular=options['simular'])
+        verbo = 'Se enviarían' if options['simular'] else 'Enviados'
+        self.stdout.write(self.style.SUCCESS(f'{verbo} {correos} correos con {fichas} controles'))
+        if sin_email:
+            self.stdout.write(self.style.WARNING(f'{sin_email} controles sin voluntario con email'))
@@ -0,0 +1,35 @@
+"""
+Crea datos sintéticos enlazados a escala de producción para benchmarks.
+
+Uso:
+    python manage.py seed_bench --animals 500 --solicitudes 2000 --donaciones 1000
+"""
+
+from django.core.management.base import BaseCommand
+
+from mainApp.seeding import CONTRASENA_BENCH, sembrar
+
+
+class Command(BaseCommand):
+    help = 'Crea datos sintéticos (usuarios, animales, solicitudes, adopciones, donaciones) con bulk_create.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--animals', type=int, default=100, help='Cantidad de animales (cada uno con ficha médica)')
+        parser.add_argument('--solicitudes', type=int, default=200, help='Cantidad de solicitudes de adopción')
+        parser.add_argument('--donaciones', type=int, default=100, help='Cantidad de donaciones')
+        parser.add_argument('--seed', type=int, default=None, help='Semilla para obtener datos reproducibles')
+
+    def handle(self, *args, **options):
+        resumen = sembrar(
+            animales=options['animals'],
+            solicitudes=options['solicitudes'],
+            donaciones=options['donaciones'],
+            semilla=options['seed'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Datos creados: {resumen['usuarios']} usuarios, {resumen['animales']} animales, "
+            f"{resumen['solicitudes']} solicitudes, {resumen['adopciones']} adopciones, "
+            f"{resumen['donaciones']} donaciones."
+        ))
+        self.stdout.write(f"Cuenta admin: {resumen['admin']} / {CONTRASENA_BENCH}")
+        self.stdout.write(f"Cuenta adoptante: {resumen['adoptante']} / {CONTRASENA_BENCH}")
@@ -0,0 +1,292 @@
+"""
+Archivos subidos (MEDIA_ROOT) en producción.
+
+- AlmacenamientoMedios agrega al nombre de cada archivo subido los primeros
+  12 caracteres del SHA-256 de su contenido (animales/rocky.3f2a9c1b7d4e.jpg).
+  Un nombre así nunca cambia de contenido, por lo que se sirve con
+  `Cache-Control: immutable` por un año. Los archivos sin hash (los
+  anteriores y los fijos de las plantillas) se revalidan cada MEDIA_MAX_AGE.
+- servir() responde ETag/Last-Modified, 304 con If-None-Match o
+  If-Modified-Since, y rangos de bytes (206/416, If-Range), para retomar
+  descargas y para los visores de PDF.
+- Los archivos de texto (SVG, por ejemplo) se guardan además precomprimidos
+  (.br y .gz al lado del original) y se envía esa variante a quien la acepte,
+  sin comprimir en cada request.
+- Las carpetas de MEDIA_PRIVATE_DIRS (carnets/ y contratos/) solo las ven los
+  admin/voluntarios y el adoptante dueño del archivo; al resto se les
+  responde 404 para no revelar qué archivos existen.
+- MediosMiddleware atiende las carpetas públicas antes de SessionMiddleware,
+  como WhiteNoise con los estáticos: con SESSION_SAVE_EVERY_REQUEST cada foto
+  de un usuario logueado costaría un SELECT y un UPDATE de la sesión. Solo
+  las privadas llegan a la vista servir_medio, que necesita la sesión.
+- MEDIA_SENDFILE='x-accel' (nginx) o 'x-sendfile' (Apache) delega el envío al
+  servidor web después del control de acceso. Sin eso, las respuestas
+  completas usan wsgi.file_wrapper y gunicorn envía el archivo con
+  sendfile(2) sin pasar por Python.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import zlib
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage
+from django.db.models import Q
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotFound, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+
+from mainApp.compresion import TIPOS_COMPRIMIBLES, acepta, brotli
+
+LARGO_HASH = 12
+# nombre.<hash>.ext, con el sufijo que agrega Django si el nombre ya existía
+_CON_HASH = re.compile(rf'\.[0-9a-f]{{{LARGO_HASH}}}(_[A-Za-z0-9]{{7}})?(\.[^./]+)?$')
+_RANGO = re.compile(r'^bytes=(\d*)-(\d*)$')
+TAMANO_BLOQUE = 64 * 1024
+UN_ANO = 365 * 24 * 3600
+# Extensión de cada variante precomprimida, en orden de preferencia
+VARIANTES = {'br': '.br', 'gzip': '.gz'}
+
+
+def _comprimible(nombre):
+    tipo, codificacion = mimetypes.guess_type(nombre)
+    return bool(tipo and not codificacion and TIPOS_COMPRIMIBLES.match(tipo))
+
+
+class AlmacenamientoMedios(FileSystemStorage):
+    """FileSystemStorage que agrega el hash del contenido al nombre y precomprime el texto"""
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        for bloque in content.chunks():
+            digest.update(bloque)
+        content.seek(0)
+        raiz, extension = os.path.splitext(name)
+        nombre = super()._save(f'{raiz}.{digest.hexdigest()[:LARGO_HASH]}{extension}', content)
+        if _comprimible(nombre) and content.size >= settings.COMPRESSION_MIN_BYTES:
+            self._precomprimir(nombre)
+        return nombre
+
+    def _precomprimir(self, nombre):
+        with self.open(nombre) as archivo:
+            datos = archivo.read()
+        # Se comprime una sola vez: vale la pena el nivel máximo
+        variantes = {'gzip': zlib.compress(datos, 9, wbits=31)}
+        if brotli:
+            variantes['br'] = brotli.compress(datos, quality=11)
+        for codificacion, comprimido in variantes.items():
+            if len(comprimido) < len(datos):
+                destino = self.path(nombre + VARIANTES[codificacion])
+                with open(destino, 'wb') as archivo:
+                    archivo.write(comprimido)
+
+    def delete(self, name):
+        for extension in VARIANTES.values():
+            super().delete(name + extension)
+        super().delete(name)
+
+
+def tiene_hash(ruta):
+    return _CON_HASH.search(ruta) is not None
+
+
+def _es_de_adoptante(campo_usuario, *campos):
+    def verificar(ruta, usuario_id):
+        from mainApp.models import Adoptante, Contrato
+
+        modelo = Contrato if campo_usuario.startswith('id_adoptante') else Adoptante
+        coincide = Q()
+        for campo in campos:
+            coincide |= Q(**{campo: ruta})
+        return modelo.objects.filter(coincide, **{campo_usuario: usuario_id}).exists()
+    return verificar
+
+
+# Carpeta privada -> cómo saber si el archivo es del usuario de la sesión
+DUENOS = {
+    'carnets/': _es_de_adoptante('id_usuario_id', 'foto_carnet_frontal', 'foto_carnet_trasera'),
+    'contratos/': _es_de_adoptante('id_adoptante__id_usuario_id', 'archivo_pdf'),
+}
+ROLES_CON_ACCESO = ('admin', 'voluntario')
+
+
+def es_privado(ruta):
+    return ruta.startswith(tuple(settings.MEDIA_PRIVATE_DIRS))
+
+
+def puede_ver(request, ruta):
+    if not es_privado(ruta):
+        return True
+    if request.session.get('usuario_rol') in ROLES_CON_ACCESO:
+        return True
+    usuario_id = request.session.get('usuario_id')
+    carpeta = next((c for c in DUENOS if ruta.startswith(c)), None)
+    return bool(usuario_id and carpeta and DUENOS[carpeta](ruta, usuario_id))
+
+
+def _cache_control(ruta):
+    if es_privado(ruta):
+        # Solo el navegador del usuario; siempre se revalida con el ETag
+        return 'private, no-cache'
+    if tiene_hash(ruta):
+        return f'public, max-age={UN_ANO}, immutable'
+    return f'public, max-age={settings.MEDIA_MAX_AGE}'
+
+
+def _rango(request, tamano, etag, modificado):
+    """(inicio, fin) del rango pedido, None para el archivo completo o 'invalido'"""
+    cabecera = request.META.get('HTTP_RANGE')
+    if not cabecera or request.method != 'GET':
+        return None
+    si_rango = request.META.get('HTTP_IF_RANGE')
+    if si_rango and si_rango != etag and parse_http_date_safe(si_rango) != int(modificado):
+        return None
+    coincidencia = _RANGO.match(cabecera.strip())
+    if not coincidencia:
+        # Varios rangos o unidades desconocidas: se responde el archivo completo
+        return None
+    inicio, fin = coincidencia.groups()
+    if not inicio:
+        if not fin or int(fin) == 0:
+            return 'invalido'
+        return max(0, tamano - int(fin)), tamano - 1
+    inicio = int(inicio)
+    fin = min(int(fin), tamano - 1) if fin else tamano - 1
+    if inicio >= tamano or inicio > fin:
+        return 'invalido'
+    return inicio, fin
+
+
+def _leer(ruta, inicio, largo):
+    with open(ruta, 'rb') as archivo:
+        archivo.seek(inicio)
+        while largo > 0:
+            bloque = archivo.read(min(TAMANO_BLOQUE, largo))
+            if not bloque:
+                break
+            largo -= len(bloque)
+            yield bloque
+
+
+def _variante(request, absoluta):
+    """(codificación, ruta) de la variante precomprimida aceptable, si existe"""
+    aceptadas = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    for codificacion, extension in VARIANTES.items():
+        candidata = absoluta + extension
+        if acepta(aceptadas, codificacion) and os.path.isfile(candidata):
+            return codificacion, candidata
+    return None
+
+
+def normalizar(ruta):
+    """Ruta relativa a MEDIA_ROOT sin '..' (animales/../carnets/x -> carnets/x)"""
+    try:
+        absoluta = safe_join(settings.MEDIA_ROOT, ruta)
+    except SuspiciousFileOperation:
+        raise Http404
+    return os.path.relpath(absoluta, os.path.abspath(settings.MEDIA_ROOT)).replace(os.sep, '/')
+
+
+def servir(request, ruta):
+    # Las carpetas privadas se deciden sobre la ruta ya resuelta
+    ruta = normalizar(ruta)
+    absoluta = safe_join(settings.MEDIA_ROOT, ruta)
+    if not os.path.isfile(absoluta) or not puede_ver(request, ruta):
+        raise Http404
+
+    estado = os.stat(absoluta)
+    etag = f'"{estado.st_mtime_ns:x}-{estado.st_size:x}"'
+    cabeceras = {
+        'ETag': etag,
+        'Last-Modified': http_date(estado.st_mtime),
+        'Cache-Control': _cache_control(ruta),
+        'Accept-Ranges': 'bytes',
+    }
+
+    tipo, codificacion = mimetypes.guess_type(absoluta)
+    tipo = tipo or 'application/octet-stream'
+    rango = _rango(request, estado.st_size, etag, estado.st_mtime)
+
+    # Con sendfile las variantes las resuelve el servidor web (gzip_static de nginx)
+    variante = None
+    if rango is None and not settings.MEDIA_SENDFILE and _comprimible(absoluta):
+        variante = _variante(request, absoluta)
+    if variante:
+        codificacion, absoluta = variante
+        # Otra representación del mismo archivo: otro ETag
+        etag = cabeceras['ETag'] = f'{etag[:-1]}-{codificacion}"'
+
+    condicional = get_conditional_response(request, etag=etag, last_modified=int(estado.st_mtime))
+    if condicional is not None:
+        for cabecera, valor in cabeceras.items():
+            condicional[cabecera] = valor
+        return condicional
+
+    if settings.MEDIA_SENDFILE and rango is None:
+        # El servidor web envía el archivo (y resuelve sus propios rangos)
+        response = HttpResponse(content_type=tipo)
+        if settings.MEDIA_SENDFILE == 'x-accel':
+            response['X-Accel-Redirect'] = settings.MEDIA_SENDFILE_PREFIX + ruta
+        else:
+            response['X-Sendfile'] = absoluta
+    elif rango == 'invalido':
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{estado.st_size}'
+    elif rango:
+        inicio, fin = rango
+        response = StreamingHttpResponse(_leer(absoluta, inicio, fin - inicio + 1), status=206, content_type=tipo)
+        response['Content-Range'] = f'bytes {inicio}-{fin}/{estado.st_size}'
+        response['Content-Length'] = str(fin - inicio + 1)
+    elif request.method == 'HEAD':
+        response = HttpResponse(content_type=tipo)
+        response['Content-Length'] = str(os.path.getsize(absoluta))
+    else:
+        response = FileResponse(open(absoluta, 'rb'), content_type=tipo)
+    if codificacion:
+        # Variante precomprimida o un .svgz: el navegador debe descomprimirlo
+        response['Content-Encoding'] = codificacion
+    if _comprimible(ruta):
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+    for cabecera, valor in cabeceras.items():
+        response[cabecera] = valor
+    return response
+
+
+class MediosMiddleware:
+    """Sirve las carpetas públicas de MEDIA_ROOT sin pasar por la sesión ni la base"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self._publico(request)
+        return response if response is not None else self.get_response(request)
+
+    async def __acall__(self, request):
+        # Como WhiteNoise: stat y open no justifican salir del event loop
+        response = self._publico(request)
+        return response if response is not None else await self.get_response(request)
+
+    def _publico(self, request):
+        if not request.path_info.startswith(settings.MEDIA_URL):
+            return None
+        try:
+            ruta = normalizar(request.path_info[len(settings.MEDIA_URL):])
+            if es_privado(ruta):
+                return None
+            return servir(request, ruta)
+        except Http404:
+            # Sin la vista de 404: su plantilla usaría la sesión
+            return HttpResponseNotFound()
@@ -0,0 +1,105 @@
+"""
+Medición de memoria por request con tracemalloc.
+
+Con MEMORY_PROFILING=True cada request registra su pico de memoria asignada y
+los sitios (archivo:línea) que más memoria dejaron asignada. Los datos van a
+la cabecera Server-Timing y al log 'mainApp.rendimiento'. tracemalloc es
+global al proceso, así que las mediciones solo son confiables con workers
+sync (un request a la vez por proceso).
+
+Las vistas declaran su máximo con @presupuesto_memoria(kb) y las pruebas lo
+verifican con PresupuestoMemoriaMixin (mainApp.testing).
+"""
+import json
+import logging
+import tracemalloc
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from mainApp.instrumentation import agregar_server_timing
+
+logger = logging.getLogger('mainApp.rendimiento')
+
+
+class MedicionMemoria:
+    def __init__(self):
+        self.pico_bytes = 0
+        self.sitios = []
+
+    @property
+    def pico_kb(self):
+        return self.pico_bytes / 1024
+
+    def resumen(self):
+        return {
+            'pico_kb': round(self.pico_kb, 1),
+            'sitios': [{'sitio': sitio, 'kb': round(kb, 1)} for sitio, kb in self.sitios],
+        }
+
+
+@contextmanager
+def medir_memoria(sitios=10, frames=1):
+    """Mide el pico de memoria del bloque y los sitios con más memoria nueva asignada"""
+    medicion = MedicionMemoria()
+    iniciado_aqui = not tracemalloc.is_tracing()
+    if iniciado_aqui:
+        tracemalloc.start(frames)
+    base = tracemalloc.take_snapshot() if sitios else None
+    actual_inicial, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    try:
+        yield medicion
+    finally:
+        _, pico = tracemalloc.get_traced_memory()
+        medicion.pico_bytes = max(0, pico - actual_inicial)
+        if sitios:
+            filtros = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+            diferencias = tracemalloc.take_snapshot().filter_traces(filtros).compare_to(base.filter_traces(filtros), 'lineno')
+            medicion.sitios = [
+                (f'{d.traceback[0].filename}:{d.traceback[0].lineno}', d.size_diff / 1024)
+                for d in diferencias[:sitios] if d.size_diff > 0
+            ]
+        if iniciado_aqui:
+            tracemalloc.stop()
+
+
+def presupuesto_memoria(maximo_kb):
+    """
+    Declara el pico de memoria máximo (KB) de una vista, medido con los datos
+    de mainApp.testing.TAMANO_PRESUPUESTO_MEMORIA. Igual que
+    @presupuesto_consultas, debe ir por encima de requiere_permiso.
+    """
+    def decorador(vista):
+        vista.presupuesto_memoria = maximo_kb
+        return vista
+    return decorador
+
+
+class MemoryProfilingMiddleware:
+    """Registra el pico de memoria y los principales sitios de asignación por request"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'MEMORY_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.umbral_kb = getattr(settings, 'MEMORY_LOG_THRESHOLD_KB', 10240)
+
+    def __call__(self, request):
+        with medir_memoria(frames=settings.MEMORY_PROFILING_FRAMES) as medicion:
+            response = self.get_response(request)
+        agregar_server_timing(response, f'mem;desc="pico {medicion.pico_kb:.0f} KB"')
+
+        vista = request.resolver_match.url_name if request.resolver_match else None
+        datos = {
+            'evento': 'memoria_request',
+            'metodo': request.method,
+            'ruta': request.path,
+            'vista': vista,
+            'status': response.status_code,
+            **medicion.resumen(),
+        }
+        nivel = logging.WARNING if medicion.pico_kb >= self.umbral_kb else logging.INFO
+        logger.log(nivel, json.dumps(datos, ensure_ascii=False))
+        return response
@@ -0,0 +1,281 @@
+"""
+Registro de métricas en proceso con exportación en formato de texto Prometheus.
+
+Cada proceso acumula contadores e histogramas en memoria. Con METRICS_DIR
+configurado, cada worker de gunicorn vuelca su estado a METRICS_DIR/<pid>.json
+(como máximo cada METRICS_FLUSH_SECONDS) y /metrics suma los archivos de todos
+los workers. Cuando un worker termina (max_requests, por ejemplo), el maestro
+suma su archivo a METRICS_DIR/terminados.json y lo borra (archivar_proceso,
+desde child_exit en gunicorn.conf.py). Así los contadores no retroceden, el
+directorio no crece con cada reciclado y un worker nuevo que reutiliza el PID
+no pisa los datos del anterior.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin gunicorn no hay workers que archivar
+    fcntl = None
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from mainApp.instrumentation import registrar_consultas
+
+# Estado sumado de los workers que ya terminaron
+ARCHIVO_TERMINADOS = 'terminados.json'
+
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_CONEXION = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+BUCKETS_BYTES = (16384, 65536, 262144, 1048576, 2097152, 5242880, 10485760)
+
+# nombre: (tipo, ayuda, buckets)
+METRICAS = {
+    'rescatando_http_request_duration_seconds': ('histogram', 'Latencia de los requests por vista', BUCKETS_LATENCIA),
+    'rescatando_http_responses_total': ('counter', 'Respuestas por vista y código de estado', None),
+    'rescatando_db_query_duration_seconds': ('histogram', 'Tiempo total en SQL por request', BUCKETS_LATENCIA),
+    'rescatando_db_queries_total': ('counter', 'Consultas SQL ejecutadas', None),
+    'rescatando_db_connection_seconds': ('histogram', 'Tiempo en abrir una conexión o esperarla del pool',
+                                         BUCKETS_CONEXION),
+    'rescatando_db_connection_errors_total': ('counter', 'Conexiones fallidas (con pool: timeouts de espera)', None),
+    'rescatando_email_send_duration_seconds': ('histogram', 'Latencia de envío de correos', BUCKETS_LATENCIA),
+    'rescatando_email_failures_total': ('counter', 'Correos que no se pudieron enviar', None),
+    'rescatando_contrato_pdf_duration_seconds': ('histogram', 'Duración de generar_contrato_pdf', BUCKETS_LATENCIA),
+    'rescatando_upload_size_bytes': ('histogram', 'Tamaño de los archivos subidos', BUCKETS_BYTES),
+    'rescatando_upload_rejected_total': ('counter', 'Archivos descartados al subir, por motivo', None),
+    'rescatando_compression_seconds': ('histogram', 'Tiempo de comprimir una respuesta', BUCKETS_CONEXION),
+    'rescatando_compression_bytes_total': ('counter', 'Bytes antes (entrada) y después (salida) de comprimir', None),
+    'rescatando_cache_total': ('counter', 'Lecturas de caché por resultado (hit, miss, anticipado, espera)', None),
+    'rescatando_events_sent_total': ('counter', 'Eventos del dashboard enviados, por modo (sse, poll)', None),
+    'rescatando_audit_events_total': ('counter', 'Eventos de auditoría por resultado (escrito, fallido)', None),
+}
+
+
+class Registro:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.contadores = {}
+        self.histogramas = {}
+        self._ultimo_volcado = 0
+
+    @staticmethod
+    def _clave(nombre, labels):
+        return (nombre, tuple(sorted((k, str(v)) for k, v in labels.items())))
+
+    def incrementar(self, nombre, valor=1, **labels):
+        clave = self._clave(nombre, labels)
+        with self._lock:
+            self.contadores[clave] = self.contadores.get(clave, 0) + valor
+
+    def observar(self, nombre, valor, **labels):
+        buckets = METRICAS[nombre][2]
+        clave = self._clave(nombre, labels)
+        with self._lock:
+            histograma = self.histogramas.get(clave)
+            if histograma is None:
+                histograma = self.histogramas[clave] = {'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            for i, limite in enumerate(buckets):
+                if valor <= limite:
+                    histograma['buckets'][i] += 1
+            histograma['sum'] += valor
+            histograma['count'] += 1
+
+    def estado(self):
+        with self._lock:
+            return _como_estado(self.contadores, self.histogramas)
+
+    def volcar(self, forzar=False):
+        """Escribe el estado de este proceso en METRICS_DIR (escritura atómica)"""
+        directorio = getattr(settings, 'METRICS_DIR', None)
+        ahora = time.monotonic()
+        if not directorio or (not forzar and ahora - self._ultimo_volcado < settings.METRICS_FLUSH_SECONDS):
+            return
+        self._ultimo_volcado = ahora
+        os.makedirs(directorio, exist_ok=True)
+        ruta = os.path.join(directorio, f'{os.getpid()}.json')
+        with open(f'{ruta}.tmp', 'w') as archivo:
+            json.dump(self.estado(), archivo)
+        os.replace(f'{ruta}.tmp', ruta)
+
+
+registro = Registro()
+
+
+def incrementar(nombre, valor=1, **labels):
+    registro.incrementar(nombre, valor, **labels)
+
+
+def observar(nombre, valor, **labels):
+    registro.observar(nombre, valor, **labels)
+
+
+@contextmanager
+def cronometro(nombre, **labels):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registro.observar(nombre, time.perf_counter() - inicio, **labels)
+
+
+def cronometrar(nombre, **labels):
+    """Decorador que registra la duración de cada llamada en un histograma"""
+    def decorador(funcion):
+        @wraps(funcion)
+        def wrapper(*args, **kwargs):
+            with cronometro(nombre, **labels):
+                return funcion(*args, **kwargs)
+        return wrapper
+    return decorador
+
+
+def _como_estado(contadores, histogramas):
+    return {
+        'contadores': [[n, dict(l), v] for (n, l), v in contadores.items()],
+        'histogramas': [[n, dict(l), dict(h, buckets=list(h['buckets']))] for (n, l), h in histogramas.items()],
+    }
+
+
+def _sumar(estados):
+    """(contadores, histogramas) con la suma de varios estados"""
+    contadores, histogramas = {}, {}
+    for estado in estados:
+        for nombre, labels, valor in estado['contadores']:
+            clave = Registro._clave(nombre, labels)
+            contadores[clave] = contadores.get(clave, 0) + valor
+        for nombre, labels, datos in estado['histogramas']:
+            clave = Registro._clave(nombre, labels)
+            total = histogramas.setdefault(clave, {'buckets': [0] * len(datos['buckets']), 'sum': 0.0, 'count': 0})
+            total['buckets'] = [a + b for a, b in zip(total['buckets'], datos['buckets'])]
+            total['sum'] += datos['sum']
+            total['count'] += datos['count']
+    return contadores, histogramas
+
+
+@contextmanager
+def _bloqueo(directorio, exclusivo):
+    """Que /metrics no lea entre la suma a terminados.json y el borrado del archivo del worker"""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(directorio, '.lock'), 'a') as archivo:
+        fcntl.flock(archivo, fcntl.LOCK_EX if exclusivo else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(archivo, fcntl.LOCK_UN)
+
+
+def _leer(ruta):
+    try:
+        with open(ruta) as archivo:
+            return json.load(archivo)
+    except (OSError, ValueError):
+        return None
+
+
+def archivar_proceso(directorio, pid):
+    """
+    Suma el volcado del worker `pid`, que ya terminó, a terminados.json y lo
+    borra. Corre en el maestro de gunicorn (child_exit), sin depender de los
+    settings de Django.
+    """
+    ruta = os.path.join(directorio, f'{pid}.json')
+    estado = _leer(ruta)
+    if estado is None:
+        return
+    terminados = os.path.join(directorio, ARCHIVO_TERMINADOS)
+    with _bloqueo(directorio, exclusivo=True):
+        anterior = _leer(terminados)
+        suma = _como_estado(*_sumar([anterior, estado] if anterior else [estado]))
+        with open(f'{terminados}.tmp', 'w') as archivo:
+            json.dump(suma, archivo)
+        os.replace(f'{terminados}.tmp', terminados)
+        os.remove(ruta)
+
+
+def _estados_procesos():
+    directorio = getattr(settings, 'METRICS_DIR', None)
+    if not directorio:
+        return [registro.estado()]
+    registro.volcar(forzar=True)
+    estados = []
+    with _bloqueo(directorio, exclusivo=False):
+        for nombre in os.listdir(directorio):
+            if nombre.endswith('.json'):
+                estado = _leer(os.path.join(directorio, nombre))
+                if estado is not None:
+                    estados.append(estado)
+    return estados
+
+
+def _formatear_labels(labels):
+    if not labels:
+        return ''
+    partes = []
+    for k, v in sorted(labels.items()):
+        v = str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        partes.append(f'{k}="{v}"')
+    return '{' + ','.join(partes) + '}'
+
+
+def exportar():
+    """Suma el estado de todos los procesos y lo devuelve en formato de texto Prometheus"""
+    contadores, histogramas = _sumar(_estados_procesos())
+
+    lineas = []
+    for nombre, (tipo, ayuda, buckets) in METRICAS.items():
+        lineas.append(f'# HELP {nombre} {ayuda}')
+        lineas.append(f'# TYPE {nombre} {tipo}')
+        if tipo == 'counter':
+            for (n, labels), valor in sorted(contadores.items()):
+                if n == nombre:
+                    lineas.append(f'{nombre}{_formatear_labels(dict(labels))} {valor}')
+        else:
+            for (n, labels), datos in sorted(histogramas.items()):
+                if n != nombre:
+                    continue
+                labels = dict(labels)
+                for limite, cantidad in zip(buckets, datos['buckets']):
+                    lineas.append(f'{nombre}_bucket{_formatear_labels({**labels, "le": limite})} {cantidad}')
+                lineas.append(f'{nombre}_bucket{_formatear_labels({**labels, "le": "+Inf"})} {datos["count"]}')
+                lineas.append(f'{nombre}_sum{_formatear_labels(labels)} {datos["sum"]}')
+                lineas.append(f'{nombre}_count{_formatear_labels(labels)} {datos["count"]}')
+    return '\n'.join(lineas) + '\n'
+
+
+class MetricsMiddleware:
+    """Registra latencia, códigos de estado, tiempo SQL y tamaño de subidas por vista"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        inicio = time.perf_counter()
+        with registrar_consultas() as sql:
+            response = self.get_response(request)
+        duracion = time.perf_counter() - inicio
+
+        # Los 404 sin ruta se agrupan para no crear una serie por URL
+        vista = request.resolver_match.url_name if request.resolver_match else 'sin_ruta'
+        observar('rescatando_http_request_duration_seconds', duracion, vista=vista, metodo=request.method)
+        incrementar('rescatando_http_responses_total', vista=vista, status=response.status_code)
+        observar('rescatando_db_query_duration_seconds', sql.tiempo_total_ms / 1000, vista=vista)
+        if sql.total:
+            incrementar('rescatando_db_queries_total', sql.total, vista=vista)
+
+        # Solo si la vista ya leyó los archivos; no se fuerza el parseo del body
+        if hasattr(request, '_files'):
+            for _, archivos in request._files.lists():
+                for archivo in archivos:
+                    observar('rescatando_upload_size_bytes', archivo.size, vista=vista)
+
+        registro.volcar()
+        return response
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:17
+
+import django.db.models.deletion
+import mainApp.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainApp', '0011_rename_fecha_solicitud_adopcion_fecha_adopcion_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerfilRendimiento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('metodo', models.CharField(max_length=10)),
+                ('ruta', models.CharField(max_length=255)),
+                ('vista', models.CharField(blank=True, max_length=100)),
+                ('status', models.IntegerField()),
+                ('duracion_ms', models.FloatField()),
+                ('archivo', models.FileField(storage=mainApp.models.almacenamiento_perfiles, upload_to='')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='mainApp.usuario')),
+            ],
+            options={
+                'ordering': ['-fecha'],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainApp', '0012_perfilrendimiento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='adoptante',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='animal',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:40
+
+from django.db import migrations, models
+
+
+def crear_generaciones(apps, schema_editor):
+    GeneracionCache = apps.get_model('mainApp', 'GeneracionCache')
+    for namespace in ('catalogo', 'dashboard', 'donaciones'):
+        GeneracionCache.objects.get_or_create(namespace=namespace)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainApp', '0013_animal_actualizado_adoptante_actualizado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeneracionCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('namespace', models.CharField(choices=[('catalogo', 'Catálogo de animales'), ('dashboard', 'Solicitudes y adopciones'), ('donaciones', 'Donaciones')], max_length=30, unique=True)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(crear_generaciones, migrations.RunPython.noop),
+    ]
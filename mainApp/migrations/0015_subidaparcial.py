@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:59
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainApp', '0014_generacioncache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubidaParcial',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('sesion', models.CharField(db_index=True, max_length=40)),
+                ('campo', models.CharField(choices=[('foto_carnet_frontal', 'Foto carnet frontal'), ('foto_carnet_trasera', 'Foto carnet trasera'), ('comprobante', 'Comprobante de donación')], max_length=30)),
+                ('nombre', models.CharField(max_length=255)),
+                ('tamano', models.PositiveBigIntegerField()),
+                ('sha256', models.CharField(max_length=64)),
+                ('recibidos', models.PositiveBigIntegerField(default=0)),
+                ('archivo', models.CharField(blank=True, max_length=255)),
+                ('creada', models.DateTimeField(auto_now_add=True)),
+                ('actualizada', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainApp', '0015_subidaparcial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='adopcion',
+            index=models.Index(fields=['estado', '-id'], name='adopcion_estado_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitudadopcion',
+            index=models.Index(fields=['estado', '-id'], name='solicitudadop_estado_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitudvoluntariado',
+            index=models.Index(fields=['estado', '-id'], name='solicitudvol_estado_id_idx'),
+        ),
+    ]
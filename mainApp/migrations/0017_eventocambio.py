@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainApp', '0016_indices_estado_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoCambio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=30)),
+                ('objeto_id', models.PositiveBigIntegerField()),
+                ('tipo', models.CharField(choices=[('creada', 'Creada'), ('estado', 'Cambio de estado')], max_length=10)),
+                ('estado', models.CharField(blank=True, max_length=30)),
+                ('fecha', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainApp', '0017_eventocambio'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='fichamedica',
+            name='proximo_control',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='RecordatorioControl',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_control', models.DateField()),
+                ('destinatario', models.EmailField(max_length=254)),
+                ('enviado', models.DateTimeField(auto_now_add=True)),
+                ('ficha', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recordatorios', to='mainApp.fichamedica')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('ficha', 'fecha_control'), name='recordatorio_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:15
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+CAMPOS = ['esterilizado', 'fecha_esterilizacion', 'vacunas_al_dia', 'ultima_vacunacion',
+          'ultimo_control', 'proximo_control', 'estado_salud', 'observaciones']
+
+
+def abrir_historiales(apps, schema_editor):
+    """Un evento de apertura por ficha existente, con su estado actual"""
+    FichaMedica = apps.get_model('mainApp', 'FichaMedica')
+    EventoMedico = apps.get_model('mainApp', 'EventoMedico')
+    lote = []
+    for ficha in FichaMedica.objects.order_by('id').iterator(chunk_size=1000):
+        datos = {campo: getattr(ficha, campo) for campo in CAMPOS}
+        datos = {campo: valor.isoformat() if hasattr(valor, 'isoformat') else valor for campo, valor in datos.items()}
+        lote.append(EventoMedico(id_animal_id=ficha.id_animal_id, tipo='apertura', datos=datos))
+        if len(lote) == 1000:
+            EventoMedico.objects.bulk_create(lote)
+            lote = []
+    EventoMedico.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainApp', '0018_recordatoriocontrol'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoMedico',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('apertura', 'Apertura de ficha'), ('vacunacion', 'Vacunación'), ('esterilizacion', 'Esterilización'), ('control', 'Control veterinario'), ('observacion', 'Observación')], max_length=20)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('datos', models.JSONField(default=dict)),
+                ('nota', models.TextField(blank=True, default='')),
+                ('id_animal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='eventos_medicos', to='mainApp.animal')),
+                ('registrado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='mainApp.usuario')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['id_animal', '-id'], name='eventomedico_animal_id_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='InstantaneaMedica',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hasta_evento', models.PositiveBigIntegerField()),
+                ('estado', models.JSONField()),
+                ('eventos', models.PositiveIntegerField()),
+                ('creada', models.DateTimeField(auto_now_add=True)),
+                ('id_animal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='instantaneas_medicas', to='mainApp.animal')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['id_animal', '-hasta_evento'], name='instantanea_animal_idx')],
+            },
+        ),
+        migrations.RunPython(abrir_historiales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:20
+
+import re
+import unicodedata
+from datetime import date, timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Copia de lo necesario al momento de la migración, no de mainApp.vacunas
+VIGENCIA_DIAS = 365
+NOMBRES = [
+    (re.compile(r'antirrabica|rabia'), 'antirrabica'),
+    (re.compile(r'octuple'), 'octuple'),
+    (re.compile(r'sextuple'), 'sextuple'),
+    (re.compile(r'triple'), 'triple_felina'),
+    (re.compile(r'leucemia'), 'leucemia_felina'),
+]
+FECHA = re.compile(r'(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})|(\d{4})-(\d{2})-(\d{2})')
+
+
+def interpretar(texto):
+    """
+    [(vacuna, fecha)] de un texto libre como 'Antirrábica 01/05/2025' o
+    '20/09/2024 (Triple Felina)'; [] si no trae una fecha y una vacuna conocida
+    """
+    normalizado = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode().lower()
+    encontrada = FECHA.search(normalizado)
+    if not encontrada:
+        return []
+    dia, mes, anio, anio_iso, mes_iso, dia_iso = encontrada.groups()
+    try:
+        fecha = date(int(anio), int(mes), int(dia)) if anio else date(int(anio_iso), int(mes_iso), int(dia_iso))
+    except ValueError:
+        return []
+    return [(vacuna, fecha) for patron, vacuna in NOMBRES if patron.search(normalizado)]
+
+
+def importar_vacunas(apps, schema_editor):
+    """Una Vacunacion por vacuna reconocida en ultima_vacunacion; el texto queda en la ficha"""
+    FichaMedica = apps.get_model('mainApp', 'FichaMedica')
+    Vacunacion = apps.get_model('mainApp', 'Vacunacion')
+    lote = []
+    fichas = FichaMedica.objects.exclude(ultima_vacunacion='').order_by('id')
+    for id_animal, texto in fichas.values_list('id_animal_id', 'ultima_vacunacion').iterator(chunk_size=1000):
+        for vacuna, fecha in interpretar(texto):
+            lote.append(Vacunacion(id_animal_id=id_animal, vacuna=vacuna, fecha_aplicacion=fecha,
+                                   proxima_dosis=fecha + timedelta(days=VIGENCIA_DIAS)))
+        if len(lote) >= 1000:
+            Vacunacion.objects.bulk_create(lote, ignore_conflicts=True)
+            lote = []
+    Vacunacion.objects.bulk_create(lote, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainApp', '0019_historial_medico'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Vacunacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vacuna', models.CharField(choices=[('antirrabica', 'Antirrábica'), ('octuple', 'Óctuple'), ('sextuple', 'Séxtuple'), ('triple_felina', 'Triple felina'), ('leucemia_felina', 'Leucemia felina')], max_length=20)),
+                ('fecha_aplicacion', models.DateField()),
+                ('proxima_dosis', models.DateField()),
+                ('id_animal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vacunaciones', to='mainApp.animal')),
+                ('registrado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='mainApp.usuario')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['vacuna', 'proxima_dosis'], name='vacunacion_vacuna_proxima_idx'), models.Index(fields=['id_animal', 'vacuna', '-fecha_aplicacion'], name='vacunacion_animal_idx')],
+                'constraints': [models.UniqueConstraint(fields=('id_animal', 'vacuna', 'fecha_aplicacion'), name='vacunacion_unica')],
+            },
+        ),
+        migrations.RunPython(importar_vacunas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainApp', '0020_vacunacion'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='fichamedica',
+            name='vacunas_al_dia',
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainApp', '0021_remove_fichamedica_vacunas_al_dia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='adopcion',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='solicitudadopcion',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:29
+
+from datetime import date
+
+import django.utils.timezone
+from django.db import migrations, models
+
+TABLA = 'mainApp_eventoauditoria'
+# Particiones creadas por la migración: el mes actual y los siguientes.
+# Las posteriores las crea `python manage.py particiones_auditoria`.
+MESES_INICIALES = 3
+
+
+def _meses(desde, cantidad):
+    anio, mes = desde.year, desde.month
+    for _ in range(cantidad):
+        inicio = date(anio, mes, 1)
+        anio, mes = (anio + 1, 1) if mes == 12 else (anio, mes + 1)
+        yield inicio, date(anio, mes, 1)
+
+
+def crear_tabla(apps, schema_editor):
+    """
+    PostgreSQL: tabla particionada por mes sobre fecha. La clave primaria debe
+    incluir la columna de partición, así que es (id, fecha); id sigue siendo
+    único porque sale de una sola identidad. Una partición DEFAULT recibe las
+    filas de meses sin partición para que la auditoría nunca falle.
+    Otras bases: la tabla común que describe el modelo.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.create_model(apps.get_model('mainApp', 'EventoAuditoria'))
+        return
+    schema_editor.execute(f'''
+        CREATE TABLE "{TABLA}" (
+            "id" bigint GENERATED BY DEFAULT AS IDENTITY,
+            "fecha" timestamp with time zone NOT NULL,
+            "accion" varchar(50) NOT NULL,
+            "operacion" varchar(10) NOT NULL,
+            "modelo" varchar(30) NOT NULL,
+            "objeto_id" bigint NOT NULL CHECK ("objeto_id" >= 0),
+            "actor_id" bigint NULL CHECK ("actor_id" >= 0),
+            "actor" varchar(70) NOT NULL,
+            "cambios" jsonb NOT NULL,
+            PRIMARY KEY ("id", "fecha")
+        ) PARTITION BY RANGE ("fecha")
+    ''')
+    schema_editor.execute(f'CREATE TABLE "{TABLA}_default" PARTITION OF "{TABLA}" DEFAULT')
+    for inicio, fin in _meses(date.today(), MESES_INICIALES):
+        schema_editor.execute(
+            f'CREATE TABLE "{TABLA}_{inicio:%Y_%m}" PARTITION OF "{TABLA}" '
+            f"FOR VALUES FROM ('{inicio.isoformat()} 00:00:00+00') TO ('{fin.isoformat()} 00:00:00+00')"
+        )
+    # Creados sobre la tabla padre, PostgreSQL los replica en cada partición
+    schema_editor.execute(f'CREATE INDEX "auditoria_objeto_idx" ON "{TABLA}" ("modelo", "objeto_id", "fecha")')
+    schema_editor.execute(f'CREATE INDEX "auditoria_actor_idx" ON "{TABLA}" ("actor_id", "fecha")')
+
+
+def borrar_tabla(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.delete_model(apps.get_model('mainApp', 'EventoAuditoria'))
+        return
+    # Borra también las particiones
+    schema_editor.execute(f'DROP TABLE "{TABLA}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainApp', '0022_version_estados'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='EventoAuditoria',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                        ('accion', models.CharField(blank=True, max_length=50)),
+                        ('operacion', models.CharField(choices=[('alta', 'Alta'), ('cambio', 'Cambio'), ('baja', 'Baja')], max_length=10)),
+                        ('modelo', models.CharField(max_length=30)),
+                        ('objeto_id', models.PositiveBigIntegerField()),
+                        ('actor_id', models.PositiveBigIntegerField(blank=True, null=True)),
+                        ('actor', models.CharField(blank=True, max_length=70)),
+                        ('cambios', models.JSONField(default=dict)),
+                    ],
+                    options={
+                        'indexes': [models.Index(fields=['modelo', 'objeto_id', 'fecha'], name='auditoria_objeto_idx'), models.Index(fields=['actor_id', 'fecha'], name='auditoria_actor_idx')],
+                    },
+                ),
+            ],
+        ),
+        # Después del estado, para que crear_tabla vea el modelo
+        migrations.RunPython(crear_tabla, borrar_tabla),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainApp', '0023_eventoauditoria'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='adopcion',
+            name='estado',
+            field=models.CharField(choices=[('en_proceso', 'En Proceso'), ('contrato_generado', 'Contrato Generado'), ('completada', 'Adopción Completada'), ('cancelada', 'Adopción Cancelada')], default='en_proceso', max_length=30),
+        ),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from datetime import datetime, timedelta
 from django.utils import timezone
 import secrets
+import uuid
 
 # ------------------------
 # USUARIO
@@ -77,7 +78,17 @@ class Voluntario(models.Model):
 # ------------------------
 # SOLICITUD DE VOLUNTARIADO
 # ------------------------
-class SolicitudVoluntariado(models.Model):
+class ConEstadoCargado:
+    """Recuerda el estado leído de la base para avisar solo cuando cambia (mainApp.eventos)"""
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._estado_cargado = instancia.__dict__.get('estado')
+        return instancia
+
+
+class SolicitudVoluntariado(ConEstadoCargado, models.Model):
     EQUIPOS = [
         ('veterinaria', 'Veterinaria'),
         ('peluqueria', 'Peluquería'),
@@ -114,6 +125,10 @@ class SolicitudVoluntariado(models.Model):
     observaciones_admin = models.TextField(blank=True, default='')
     usuario_solicitante = models.ForeignKey(Usuario, null=True, blank=True, on_delete=models.SET_NULL, related_name='solicitudes_voluntariado')
     procesado_por = models.ForeignKey(Usuario, null=True, blank=True, on_delete=models.SET_NULL, related_name='solicitudes_voluntariado_procesadas')
+
+    class Meta:
+        # Filtro por estado + paginación por id de la API de moderación (mainApp.api)
+        indexes = [models.Index(fields=['estado', '-id'], name='solicitudvol_estado_id_idx')]
     
     def __str__(self):
         return f"Solicitud de {self.nombre_completo} - {self.get_equipo_display()}"
@@ -146,6 +161,8 @@ class Animal(models.Model):
     foto = models.ImageField(upload_to="animales/")
     disponible = models.BooleanField(default=True)
     id_hogar = models.ForeignKey(HogarTemporal, on_delete=models.CASCADE)
+    # Marca de modificación para las claves de caché de fragmentos
+    actualizado = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.nombre
@@ -165,11 +182,13 @@ class FichaMedica(models.Model):
     # Vacunación y Esterilización
     esterilizado = models.BooleanField(default=False)
     fecha_esterilizacion = models.DateField(null=True, blank=True)
-    vacunas_al_dia = models.BooleanField(default=True)
+    # Resumen de la última dosis registrada; las vacunas están en Vacunacion y
+    # "vacunas al día" se calcula en la consulta (mainApp.vacunas)
     ultima_vacunacion = models.CharField(max_length=255, blank=True, default='')
     # Control Veterinario
     ultimo_control = models.DateField(null=True, blank=True)
-    proximo_control = models.DateField(null=True, blank=True)
+    # Índice: recordatorios_control busca por rango de fechas (mainApp.recordatorios)
+    proximo_control = models.DateField(null=True, blank=True, db_index=True)
     estado_salud = models.CharField(max_length=100, default='Bueno')
     # Observaciones
     observaciones = models.TextField(blank=True, default='')
@@ -224,6 +243,9 @@ class Adoptante(models.Model):
     acepta_enviar_fotos = models.BooleanField(default=True)
     acepta_tenencia_indoor = models.BooleanField(default=True)
 
+    # Marca de modificación para las claves de caché de fragmentos
+    actualizado = models.DateTimeField(auto_now=True)
+
     def __str__(self):
         return f"Adoptante: {self.nombre}"
 
@@ -231,7 +253,7 @@ class Adoptante(models.Model):
 # ------------------------
 # SOLICITUD DE ADOPCIÓN
 # ------------------------
-class SolicitudAdopcion(models.Model):
+class SolicitudAdopcion(ConEstadoCargado, models.Model):
     ESTADOS = [
         ('pendiente', 'Solicitud Pendiente'),
         ('entrevista_agendada', 'Entrevista Agendada'),
@@ -253,6 +275,12 @@ class SolicitudAdopcion(models.Model):
     
     # Usuario que procesa (admin o voluntario)
     procesado_por = models.ForeignKey(Usuario, null=True, blank=True, on_delete=models.SET_NULL, related_name='solicitudes_adopcion_procesadas')
+    # Se incrementa en cada cambio de estado (mainApp.transiciones)
+    version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # Filtro por estado + paginación por id de la API de moderación (mainApp.api)
+        indexes = [models.Index(fields=['estado', '-id'], name='solicitudadop_estado_id_idx')]
 
     def __str__(self):
         return f"Solicitud de {self.id_animal.nombre} - {self.id_adoptante.nombre}"
@@ -266,6 +294,8 @@ class Adopcion(models.Model):
         ('en_proceso', 'En Proceso'),
         ('contrato_generado', 'Contrato Generado'),
         ('completada', 'Adopción Completada'),
+        # La entrevista de seguimiento la rechazó (mainApp.transiciones)
+        ('cancelada', 'Adopción Cancelada'),
     ]
     
     id_animal = models.ForeignKey(Animal, on_delete=models.CASCADE)
@@ -280,6 +310,12 @@ class Adopcion(models.Model):
     
     # Usuario que aprobó
     aprobado_por = models.ForeignKey(Usuario, null=True, blank=True, on_delete=models.SET_NULL, related_name='adopciones_aprobadas')
+    # Se incrementa en cada cambio de estado (mainApp.transiciones)
+    version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # Filtro por estado + paginación por id de la API de moderación (mainApp.api)
+        indexes = [models.Index(fields=['estado', '-id'], name='adopcion_estado_id_idx')]
 
     def __str__(self):
         return f"Adopción de {self.id_animal.nombre} por {self.id_adoptante.nombre}"
@@ -369,3 +405,240 @@ class PasswordResetToken(models.Model):
     
     def __str__(self):
         return f"Token para {self.usuario.cuenta}"
+
+
+# ------------------------
+# PERFIL DE RENDIMIENTO (cProfile de un request puntual)
+# ------------------------
+def almacenamiento_perfiles():
+    # Los perfiles se guardan fuera de MEDIA_ROOT y solo se descargan desde el admin
+    from django.conf import settings
+    from django.core.files.storage import FileSystemStorage
+    return FileSystemStorage(location=settings.PROFILING_DIR)
+
+
+class PerfilRendimiento(models.Model):
+    fecha = models.DateTimeField(auto_now_add=True)
+    usuario = models.ForeignKey(Usuario, null=True, blank=True, on_delete=models.SET_NULL)
+    metodo = models.CharField(max_length=10)
+    ruta = models.CharField(max_length=255)
+    vista = models.CharField(max_length=100, blank=True)
+    status = models.IntegerField()
+    duracion_ms = models.FloatField()
+    archivo = models.FileField(storage=almacenamiento_perfiles, upload_to='')
+
+    class Meta:
+        ordering = ['-fecha']
+
+    def __str__(self):
+        return f"{self.metodo} {self.ruta} ({self.duracion_ms:.0f} ms)"
+
+
+# ------------------------
+# GENERACIÓN DE CACHÉ (coherencia entre workers)
+# ------------------------
+class GeneracionCache(models.Model):
+    NAMESPACES = [
+        ('catalogo', 'Catálogo de animales'),
+        ('dashboard', 'Solicitudes y adopciones'),
+        ('donaciones', 'Donaciones'),
+    ]
+
+    namespace = models.CharField(max_length=30, choices=NAMESPACES, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.namespace} v{self.version}"
+
+
+# ------------------------
+# HISTORIAL MÉDICO (solo inserción, ver mainApp.historial)
+# ------------------------
+class EventoMedico(models.Model):
+    TIPOS = [
+        ('apertura', 'Apertura de ficha'),
+        ('vacunacion', 'Vacunación'),
+        ('esterilizacion', 'Esterilización'),
+        ('control', 'Control veterinario'),
+        ('observacion', 'Observación'),
+    ]
+
+    id_animal = models.ForeignKey(Animal, on_delete=models.CASCADE, related_name='eventos_medicos')
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    fecha = models.DateTimeField(default=timezone.now)
+    # Campos de la ficha que cambiaron, con su valor nuevo
+    datos = models.JSONField(default=dict)
+    nota = models.TextField(blank=True, default='')
+    registrado_por = models.ForeignKey(Usuario, null=True, blank=True, on_delete=models.SET_NULL)
+
+    class Meta:
+        # Línea de tiempo de un animal, del más reciente al más antiguo
+        indexes = [models.Index(fields=['id_animal', '-id'], name='eventomedico_animal_id_idx')]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('El historial médico es de solo inserción')
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError('El historial médico es de solo inserción')
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} de {self.id_animal_id} ({self.fecha:%d/%m/%Y})"
+
+
+class InstantaneaMedica(models.Model):
+    id_animal = models.ForeignKey(Animal, on_delete=models.CASCADE, related_name='instantaneas_medicas')
+    # Último EventoMedico incluido en `estado`
+    hasta_evento = models.PositiveBigIntegerField()
+    estado = models.JSONField()
+    eventos = models.PositiveIntegerField()
+    creada = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['id_animal', '-hasta_evento'], name='instantanea_animal_idx')]
+
+    def __str__(self):
+        return f"Instantánea de {self.id_animal_id} hasta {self.hasta_evento}"
+
+
+# ------------------------
+# VACUNAS (ver mainApp.vacunas)
+# ------------------------
+class Vacunacion(models.Model):
+    VACUNAS = [
+        ('antirrabica', 'Antirrábica'),
+        ('octuple', 'Óctuple'),
+        ('sextuple', 'Séxtuple'),
+        ('triple_felina', 'Triple felina'),
+        ('leucemia_felina', 'Leucemia felina'),
+    ]
+
+    id_animal = models.ForeignKey(Animal, on_delete=models.CASCADE, related_name='vacunaciones')
+    vacuna = models.CharField(max_length=20, choices=VACUNAS)
+    fecha_aplicacion = models.DateField()
+    proxima_dosis = models.DateField()
+    registrado_por = models.ForeignKey(Usuario, null=True, blank=True, on_delete=models.SET_NULL)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['id_animal', 'vacuna', 'fecha_aplicacion'],
+                                               name='vacunacion_unica')]
+        indexes = [
+            # "Qué animales necesitan refuerzo antirrábico este mes"
+            models.Index(fields=['vacuna', 'proxima_dosis'], name='vacunacion_vacuna_proxima_idx'),
+            # Última dosis de cada vacuna de un animal (vacunas al día)
+            models.Index(fields=['id_animal', 'vacuna', '-fecha_aplicacion'], name='vacunacion_animal_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_vacuna_display()} {self.fecha_aplicacion:%d/%m/%Y}"
+
+
+# ------------------------
+# RECORDATORIOS DE CONTROL VETERINARIO (ver mainApp.recordatorios)
+# ------------------------
+class RecordatorioControl(models.Model):
+    ficha = models.ForeignKey(FichaMedica, on_delete=models.CASCADE, related_name='recordatorios')
+    fecha_control = models.DateField()
+    destinatario = models.EmailField()
+    enviado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # Un aviso por ficha y fecha de control: volver a ejecutar no repite
+        constraints = [models.UniqueConstraint(fields=['ficha', 'fecha_control'], name='recordatorio_unico')]
+
+    def __str__(self):
+        return f"Recordatorio {self.ficha_id} para {self.fecha_control}"
+
+
+# ------------------------
+# EVENTOS DEL DASHBOARD (cursor de cambios, ver mainApp.eventos)
+# ------------------------
+class EventoCambio(models.Model):
+    # Modelos que generan eventos (mainApp.signals)
+    MODELOS = ('SolicitudAdopcion', 'SolicitudVoluntariado', 'Donacion')
+    TIPOS = [
+        ('creada', 'Creada'),
+        ('estado', 'Cambio de estado'),
+    ]
+
+    modelo = models.CharField(max_length=30)
+    objeto_id = models.PositiveBigIntegerField()
+    tipo = models.CharField(max_length=10, choices=TIPOS)
+    estado = models.CharField(max_length=30, blank=True)
+    fecha = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.modelo} {self.objeto_id} {self.tipo}"
+
+
+# ------------------------
+# AUDITORÍA DE MODERACIÓN (solo inserción, ver mainApp.auditoria)
+# ------------------------
+class EventoAuditoria(models.Model):
+    OPERACIONES = [
+        ('alta', 'Alta'),
+        ('cambio', 'Cambio'),
+        ('baja', 'Baja'),
+    ]
+
+    # En PostgreSQL la tabla está particionada por mes sobre esta columna
+    fecha = models.DateTimeField(default=timezone.now)
+    # Acción del formulario (aprobar_adopcion, eliminar_usuario, ...)
+    accion = models.CharField(max_length=50, blank=True)
+    operacion = models.CharField(max_length=10, choices=OPERACIONES)
+    modelo = models.CharField(max_length=30)
+    objeto_id = models.PositiveBigIntegerField()
+    # Sin ForeignKey: el registro sobrevive a que se borre el usuario
+    actor_id = models.PositiveBigIntegerField(null=True, blank=True)
+    actor = models.CharField(max_length=70, blank=True)
+    # alta/baja: {campo: valor}; cambio: {campo: [antes, después]}
+    cambios = models.JSONField(default=dict)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['modelo', 'objeto_id', 'fecha'], name='auditoria_objeto_idx'),
+            models.Index(fields=['actor_id', 'fecha'], name='auditoria_actor_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('La auditoría es de solo inserción')
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError('La auditoría es de solo inserción')
+
+    def __str__(self):
+        return f"{self.actor or 'sistema'}: {self.accion} {self.modelo} {self.objeto_id} ({self.fecha:%d/%m/%Y %H:%M})"
+
+
+# ------------------------
+# SUBIDA POR PARTES (reanudable, ver mainApp.subidas)
+# ------------------------
+class SubidaParcial(models.Model):
+    CAMPOS = [
+        ('foto_carnet_frontal', 'Foto carnet frontal'),
+        ('foto_carnet_trasera', 'Foto carnet trasera'),
+        ('comprobante', 'Comprobante de donación'),
+    ]
+
+    # El id es la credencial para retomar la subida: no debe ser adivinable
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    sesion = models.CharField(max_length=40, db_index=True)
+    campo = models.CharField(max_length=30, choices=CAMPOS)
+    nombre = models.CharField(max_length=255)
+    tamano = models.PositiveBigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    recibidos = models.PositiveBigIntegerField(default=0)
+    # Nombre en el almacenamiento de medios una vez completa
+    archivo = models.CharField(max_length=255, blank=True)
+    creada = models.DateTimeField(auto_now_add=True)
+    actualizada = models.DateTimeField(auto_now=True)
+
+    @property
+    def completa(self):
+        return bool(self.archivo)
+
+    def __str__(self):
+        return f"{self.nombre} ({self.recibidos}/{self.tamano})"
@@ -0,0 +1,88 @@
+"""
+Perfilado bajo demanda de requests puntuales.
+
+Un admin obtiene un token firmado en /perfilar/?url=<ruta> y el request a esa
+ruta con ?_perfilar=<token> (o la cabecera X-Perfilar) se ejecuta bajo
+cProfile. El .prof queda en PROFILING_DIR y se lista/descarga desde el admin
+de Django (PerfilRendimiento). Abrirlo con snakeviz o convertirlo con
+flameprof para ver el flamegraph.
+
+Con PROFILING_ENABLED=False el middleware se descarta al iniciar y no agrega
+ningún costo a los requests.
+"""
+import cProfile
+import os
+import time
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files import File
+
+SALT = 'mainApp.profiling'
+PARAMETRO = '_perfilar'
+CABECERA = 'HTTP_X_PERFILAR'
+
+
+def generar_token(usuario_id):
+    return signing.dumps(usuario_id, salt=SALT)
+
+
+def token_valido(token, usuario_id):
+    """El token debe estar firmado, no expirado y pertenecer a la sesión actual"""
+    try:
+        return signing.loads(token, salt=SALT, max_age=settings.PROFILING_TOKEN_MAX_AGE) == usuario_id
+    except signing.BadSignature:
+        return False
+
+
+class ProfilerMiddleware:
+    """Ejecuta bajo cProfile los requests de admins que traen un token válido"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+
+    def __call__(self, request):
+        token = request.GET.get(PARAMETRO) or request.META.get(CABECERA)
+        usuario_id = request.session.get('usuario_id') if token else None
+        if not token or request.session.get('usuario_rol') != 'admin' or not token_valido(token, usuario_id):
+            return self.get_response(request)
+
+        perfil = cProfile.Profile()
+        inicio = time.perf_counter()
+        perfil.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            perfil.disable()
+        duracion_ms = (time.perf_counter() - inicio) * 1000
+
+        registro = self.guardar(perfil, request, response, usuario_id, duracion_ms)
+        response['X-Perfil-Id'] = str(registro.id)
+        return response
+
+    def guardar(self, perfil, request, response, usuario_id, duracion_ms):
+        from mainApp.models import PerfilRendimiento
+
+        vista = request.resolver_match.url_name if request.resolver_match else ''
+        nombre = f"{time.strftime('%Y%m%d-%H%M%S')}_{vista or 'request'}_{uuid.uuid4().hex[:8]}.prof"
+        ruta_temporal = os.path.join(settings.PROFILING_DIR, f'.{nombre}.tmp')
+        perfil.dump_stats(ruta_temporal)
+        try:
+            registro = PerfilRendimiento(
+                usuario_id=usuario_id,
+                metodo=request.method,
+                ruta=request.path[:255],
+                vista=vista or '',
+                status=response.status_code,
+                duracion_ms=duracion_ms,
+            )
+            with open(ruta_temporal, 'rb') as archivo:
+                registro.archivo.save(nombre, File(archivo), save=True)
+        finally:
+            os.remove(ruta_temporal)
+        return registro
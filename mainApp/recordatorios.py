@@ -0,0 +1,88 @@
+"""
+Recordatorios de controles veterinarios (FichaMedica.proximo_control).
+
+enviar_recordatorios busca, con una consulta por rango sobre el índice de
+proximo_control, las fichas de animales disponibles cuyo control cae entre
+hoy y hoy + dias. Las agrupa por el voluntario a cargo del hogar temporal y
+envía un solo correo por voluntario con todos sus animales, usando una única
+conexión SMTP para todo el lote.
+
+Cada aviso queda en RecordatorioControl (ficha + fecha del control). Volver a
+ejecutar el comando no repite los avisos ya enviados; si el control se
+reprograma para otra fecha, esa fecha se avisa de nuevo.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Exists, OuterRef
+
+from mainApp.models import FichaMedica, RecordatorioControl
+
+# Voluntario responsable de cada ficha
+RUTA_VOLUNTARIO = 'id_animal__id_hogar__id_voluntario__id_usuario'
+
+
+def pendientes(hoy, dias):
+    """Fichas con control entre hoy y hoy + dias que aún no se avisaron"""
+    avisado = RecordatorioControl.objects.filter(ficha=OuterRef('pk'), fecha_control=OuterRef('proximo_control'))
+    return (FichaMedica.objects
+            .filter(proximo_control__range=(hoy, hoy + timedelta(days=dias)), id_animal__disponible=True)
+            .filter(~Exists(avisado))
+            .select_related(RUTA_VOLUNTARIO)
+            .only('proximo_control', 'estado_salud', 'id_animal__nombre', 'id_animal__especie',
+                  'id_animal__id_hogar__direccion', f'{RUTA_VOLUNTARIO}__nombre', f'{RUTA_VOLUNTARIO}__email')
+            .order_by('proximo_control', 'id_animal__nombre'))
+
+
+def agrupar(fichas):
+    """{usuario: {hogar: [fichas]}}, sin los voluntarios que no tienen email"""
+    por_voluntario = defaultdict(lambda: defaultdict(list))
+    sin_email = []
+    for ficha in fichas:
+        hogar = ficha.id_animal.id_hogar
+        usuario = hogar.id_voluntario.id_usuario
+        if usuario.email:
+            por_voluntario[usuario][hogar].append(ficha)
+        else:
+            sin_email.append(ficha)
+    return por_voluntario, sin_email
+
+
+def _mensaje(usuario, por_hogar, hoy):
+    lineas = [f'Hola {usuario.nombre},', '', 'Estos animales tienen un control veterinario próximo:', '']
+    for hogar, fichas in por_hogar.items():
+        lineas.append(f'Hogar temporal: {hogar.direccion}')
+        for ficha in fichas:
+            cuando = 'hoy' if ficha.proximo_control == hoy else ficha.proximo_control.strftime('%d/%m/%Y')
+            lineas.append(f'  - {ficha.id_animal.nombre} ({ficha.id_animal.especie}): {cuando}. '
+                          f'Estado de salud: {ficha.estado_salud}')
+        lineas.append('')
+    lineas.append('Equipo RescatandoAndo')
+    total = sum(len(fichas) for fichas in por_hogar.values())
+    asunto = f'Controles veterinarios próximos ({total} animal{"es" if total > 1 else ""})'
+    return EmailMessage(asunto, '\n'.join(lineas), settings.DEFAULT_FROM_EMAIL, [usuario.email])
+
+
+def enviar_recordatorios(hoy, dias, simular=False):
+    """
+    Envía los resúmenes y registra lo enviado. Devuelve (correos, fichas
+    avisadas, fichas sin email). Con simular no envía ni registra nada.
+    """
+    por_voluntario, sin_email = agrupar(pendientes(hoy, dias))
+    avisadas = sum(len(fichas) for por_hogar in por_voluntario.values() for fichas in por_hogar.values())
+    if simular or not por_voluntario:
+        return len(por_voluntario), avisadas, len(sin_email)
+
+    with get_connection() as conexion:
+        for usuario, por_hogar in por_voluntario.items():
+            conexion.send_messages([_mensaje(usuario, por_hogar, hoy)])
+            # Se registra apenas sale cada correo: si el lote se corta a la
+            # mitad, la próxima ejecución sigue con los que faltan
+            RecordatorioControl.objects.bulk_create(
+                [RecordatorioControl(ficha=ficha, fecha_control=ficha.proximo_control, destinatario=usuario.email)
+                 for fichas in por_hogar.values() for ficha in fichas],
+                ignore_conflicts=True,
+            )
+    return len(por_voluntario), avisadas, len(sin_email)
@@ -0,0 +1,147 @@
+"""
+Lecturas en una réplica de la base de datos.
+
+Las vistas de solo lectura (catálogo, comprobantes, listados del dashboard)
+se marcan con @lectura_en_replica y sus consultas a modelos de mainApp van al
+alias 'replica'. El resto del sitio, las sesiones y la autenticación siempre
+usan la primaria. Los comandos de reportes pueden envolver su trabajo en
+`with leer_de_replica():`.
+
+Consistencia:
+- Solo GET y HEAD leen de la réplica; un POST que lee para luego escribir no
+  debe partir de datos atrasados.
+- Toda escritura va a la primaria y, desde ese momento, las lecturas del
+  mismo request también (ReplicaRouter.db_for_write).
+- ReplicaMiddleware recuerda en la sesión que hubo una escritura y durante
+  REPLICA_STICKY_SECONDS esa sesión lee de la primaria: quien acaba de
+  guardar algo lo ve aunque la réplica no lo tenga todavía.
+- Las generaciones de caché (mainApp.cache) se leen de la misma base que los
+  datos, así que un fragmento armado con datos atrasados queda bajo la
+  generación atrasada y no reemplaza al nuevo.
+
+Con REPLICA_ENABLED=False el router siempre responde 'default'.
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+
+ALIAS_REPLICA = 'replica'
+CLAVE_SESION = 'replica_primaria_hasta'
+METODOS_LECTURA = ('GET', 'HEAD')
+
+# Estado del request (o comando) actual; None fuera de uno. Es un diccionario
+# para que las consultas en hilos (sync_to_async) compartan el mismo estado.
+_estado = contextvars.ContextVar('replica', default=None)
+
+
+def _nuevo_estado(primaria=False):
+    return {'replica': False, 'primaria': primaria, 'escritura': False}
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        estado = _estado.get()
+        if (settings.REPLICA_ENABLED and estado and estado['replica'] and not estado['primaria']
+                and model._meta.app_label == 'mainApp'):
+            return ALIAS_REPLICA
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        estado = _estado.get()
+        if estado is not None:
+            estado['primaria'] = estado['escritura'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Las dos bases tienen los mismos datos
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, ALIAS_REPLICA}:
+            return True
+        return None
+
+
+@contextmanager
+def leer_de_replica():
+    """Lecturas a la réplica dentro del bloque (hasta la primera escritura)"""
+    estado = _estado.get()
+    if estado is None:
+        token = _estado.set(_nuevo_estado())
+        try:
+            with leer_de_replica():
+                yield
+        finally:
+            _estado.reset(token)
+        return
+    anterior = estado['replica']
+    estado['replica'] = True
+    try:
+        yield
+    finally:
+        estado['replica'] = anterior
+
+
+def lectura_en_replica(vista):
+    """Decorador para vistas de solo lectura; solo aplica a GET y HEAD"""
+    if iscoroutinefunction(vista):
+        @wraps(vista)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in METODOS_LECTURA:
+                return await vista(request, *args, **kwargs)
+            with leer_de_replica():
+                return await vista(request, *args, **kwargs)
+        return wrapper
+
+    @wraps(vista)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in METODOS_LECTURA:
+            return vista(request, *args, **kwargs)
+        with leer_de_replica():
+            return vista(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaMiddleware:
+    """Lecturas pegadas a la primaria después de escribir, por request y por sesión"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REPLICA_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        estado = _nuevo_estado(primaria=time.time() < request.session.get(CLAVE_SESION, 0))
+        token = _estado.set(estado)
+        try:
+            response = self.get_response(request)
+        finally:
+            _estado.reset(token)
+        self._recordar_escritura(request, estado)
+        return response
+
+    async def __acall__(self, request):
+        estado = _nuevo_estado(primaria=time.time() < await request.session.aget(CLAVE_SESION, 0))
+        token = _estado.set(estado)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _estado.reset(token)
+        self._recordar_escritura(request, estado)
+        return response
+
+    @staticmethod
+    def _recordar_escritura(request, estado):
+        # SessionMiddleware guarda la sesión después, al procesar la respuesta
+        if estado['escritura']:
+            request.session[CLAVE_SESION] = time.time() + settings.REPLICA_STICKY_SECONDS
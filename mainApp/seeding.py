@@ -0,0 +1,182 @@
+"""
+Generación de datos sintéticos enlazados para benchmarks y pruebas de carga.
+
+Todas las filas se crean con bulk_create. Las cuentas generadas llevan el
+prefijo 'bench_' más un token por ejecución, para no chocar con datos reales
+ni con ejecuciones anteriores.
+"""
+import datetime
+import random
+import secrets
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+
+from mainApp.cache import MODELOS_POR_NAMESPACE, incrementar_generacion
+from mainApp.historial import estado_de
+from mainApp.models import (Usuario, Voluntario, HogarTemporal, Animal, FichaMedica, Adoptante,
+                            SolicitudAdopcion, Adopcion, Donacion, SolicitudVoluntariado, EventoMedico,
+                            Vacunacion)
+from mainApp.vacunas import proxima_dosis, resumen
+
+# Contraseña de todas las cuentas sintéticas (útil para los scripts de carga)
+CONTRASENA_BENCH = 'bench12345'
+
+NOMBRES = ['Camila', 'Matías', 'Valentina', 'Benjamín', 'Josefa', 'Vicente', 'Antonia', 'Martín',
+           'Catalina', 'Agustín', 'Fernanda', 'Tomás', 'Javiera', 'Joaquín', 'Isidora', 'Cristóbal']
+APELLIDOS = ['González', 'Muñoz', 'Rojas', 'Díaz', 'Pérez', 'Soto', 'Contreras', 'Silva',
+             'Martínez', 'Sepúlveda', 'Morales', 'Rodríguez', 'López', 'Fuentes', 'Araya']
+NOMBRES_ANIMALES = ['Rocky', 'Akira', 'Trufa', 'Luna', 'Max', 'Canela', 'Toby', 'Maya', 'Simba',
+                    'Nala', 'Coco', 'Frida', 'Bruno', 'Lola', 'Chispa', 'Manchas', 'Pelusa', 'Oso']
+ESPECIES = ['Perro', 'Perro', 'Perro', 'Gato', 'Gato', 'Conejo']
+COMUNAS = ['Santiago', 'Providencia', 'Ñuñoa', 'Maipú', 'La Florida', 'Puente Alto', 'Recoleta']
+VACUNAS = [clave for clave, _ in Vacunacion.VACUNAS]
+FOTOS = ['animales/Rocky.jpg', 'animales/akira.jpg', 'animales/trufa.jpg']
+
+# Peso relativo de cada estado de solicitud
+ESTADOS_SOLICITUD = [('pendiente', 5), ('entrevista_agendada', 2), ('entrevista_realizada', 1),
+                     ('aprobada', 2), ('rechazada', 2)]
+
+
+def _crear(modelo, objetos):
+    """
+    bulk_create que siempre devuelve objetos con pk.
+    MySQL no retorna los ids de un insert masivo, así que se releen los
+    últimos registros (la siembra corre dentro de una transacción).
+    """
+    creados = modelo.objects.bulk_create(objetos, batch_size=500)
+    if not creados or creados[0].pk is not None or connection.features.can_return_rows_from_bulk_insert:
+        return creados
+    return list(modelo.objects.order_by('-id')[:len(objetos)])[::-1]
+
+
+def _nombre(rng):
+    return f'{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)}'
+
+
+@transaction.atomic
+def sembrar(animales=100, solicitudes=200, donaciones=100, semilla=None):
+    """
+    Crea usuarios, voluntarios, hogares, animales con ficha médica, adoptantes,
+    solicitudes (con su adopción cuando están aprobadas), solicitudes de
+    voluntariado y donaciones. Devuelve un resumen con los conteos y las
+    cuentas sintéticas de admin y adoptante.
+    """
+    rng = random.Random(semilla)
+    token = secrets.token_hex(3)
+    hoy = datetime.date.today()
+    contrasena = make_password(CONTRASENA_BENCH)
+
+    cantidad_voluntarios = max(1, animales // 20)
+    cantidad_adoptantes = max(1, solicitudes // 2)
+
+    # Usuarios: un admin, voluntarios y adoptantes
+    usuarios = [Usuario(nombre='Admin Bench', cuenta=f'bench_{token}_admin', email=f'admin.{token}@bench.cl',
+                        contraseña=contrasena, rol='admin')]
+    for i in range(cantidad_voluntarios):
+        usuarios.append(Usuario(nombre=_nombre(rng), cuenta=f'bench_{token}_vol{i}',
+                                email=f'vol{i}.{token}@bench.cl', contraseña=contrasena, rol='voluntario'))
+    for i in range(cantidad_adoptantes):
+        usuarios.append(Usuario(nombre=_nombre(rng), cuenta=f'bench_{token}_user{i}',
+                                email=f'user{i}.{token}@bench.cl', contraseña=contrasena,
+                                telefono=f'+569{rng.randint(10000000, 99999999)}',
+                                direccion=f'Calle {rng.randint(1, 9999)}', rol='usuario'))
+    usuarios = _crear(Usuario, usuarios)
+    admin, usuarios_voluntarios = usuarios[0], usuarios[1:1 + cantidad_voluntarios]
+    usuarios_adoptantes = usuarios[1 + cantidad_voluntarios:]
+
+    voluntarios = _crear(Voluntario, [
+        Voluntario(id_usuario=u, tipo_voluntariado='hogar_temporal', fecha_ingreso=hoy - datetime.timedelta(days=rng.randint(0, 900)))
+        for u in usuarios_voluntarios
+    ])
+    hogares = _crear(HogarTemporal, [
+        HogarTemporal(id_voluntario=v, direccion=f'{rng.choice(COMUNAS)} {rng.randint(100, 9999)}',
+                      descripcion='Hogar temporal', capacidad_animales=rng.randint(5, 30), estado='activo')
+        for v in voluntarios
+    ])
+
+    lista_animales = _crear(Animal, [
+        Animal(nombre=rng.choice(NOMBRES_ANIMALES), especie=rng.choice(ESPECIES), edad=rng.randint(0, 14),
+               sexo=rng.choice(['Macho', 'Hembra']), estado_salud=rng.choice(['Saludable', 'En tratamiento', 'Bueno']),
+               descripcion='Rescatado y en busca de una familia responsable.', foto=rng.choice(FOTOS),
+               id_hogar=rng.choice(hogares))
+        for _ in range(animales)
+    ])
+    dosis = [(rng.choice(VACUNAS), hoy - datetime.timedelta(days=rng.randint(0, 400))) for _ in lista_animales]
+    vacunaciones = _crear(Vacunacion, [
+        Vacunacion(id_animal=a, vacuna=vacuna, fecha_aplicacion=fecha, proxima_dosis=proxima_dosis(vacuna, fecha))
+        for a, (vacuna, fecha) in zip(lista_animales, dosis)
+    ])
+    fichas = _crear(FichaMedica, [
+        FichaMedica(id_animal=a, esterilizado=rng.random() < 0.6, ultima_vacunacion=resumen(v),
+                    ultimo_control=hoy - datetime.timedelta(days=rng.randint(0, 180)),
+                    proximo_control=hoy + datetime.timedelta(days=rng.randint(-30, 120)),
+                    estado_salud='Bueno', observaciones='Sin observaciones')
+        for a, v in zip(lista_animales, vacunaciones)
+    ])
+    # bulk_create no emite post_save: la apertura del historial va a mano
+    _crear(EventoMedico, [EventoMedico(id_animal_id=f.id_animal_id, tipo='apertura', datos=estado_de(f)) for f in fichas])
+
+    adoptantes = _crear(Adoptante, [
+        Adoptante(id_usuario=u, nombre=u.nombre, email=u.email, telefono=u.telefono,
+                  rut=f'{rng.randint(5000000, 25000000)}-{rng.randint(0, 9)}', direccion=u.direccion,
+                  ciudad='Santiago', comuna=rng.choice(COMUNAS), edad=rng.randint(18, 70),
+                  por_que_adoptar='Queremos darle un hogar a un animal rescatado.',
+                  tiene_o_tuvo_mascotas=rng.random() < 0.7, alimento_mascotas='Alimento premium',
+                  miembros_familia=rng.randint(1, 6), tipo_vivienda=rng.choice(['Casa', 'Departamento']),
+                  que_pasa_si_mudanza='Se muda con nosotros.')
+        for u in usuarios_adoptantes
+    ])
+
+    estados = [e for e, _ in ESTADOS_SOLICITUD]
+    pesos = [p for _, p in ESTADOS_SOLICITUD]
+    lista_solicitudes = _crear(SolicitudAdopcion, [
+        SolicitudAdopcion(id_animal=rng.choice(lista_animales), id_adoptante=rng.choice(adoptantes),
+                          estado=rng.choices(estados, pesos)[0], procesado_por=admin)
+        for _ in range(solicitudes)
+    ])
+
+    # Una adopción por animal como máximo, a partir de las solicitudes aprobadas
+    adopciones, adoptados = [], set()
+    for s in lista_solicitudes:
+        if s.estado == 'aprobada' and s.id_animal_id not in adoptados:
+            adoptados.add(s.id_animal_id)
+            adopciones.append(Adopcion(id_animal_id=s.id_animal_id, id_adoptante_id=s.id_adoptante_id,
+                                       solicitud_origen=s, aprobado_por=admin,
+                                       estado=rng.choice(['en_proceso', 'contrato_generado', 'completada'])))
+    _crear(Adopcion, adopciones)
+    # update() no toca auto_now; la marca se actualiza a mano por la caché de fragmentos
+    Animal.objects.filter(id__in=adoptados).update(disponible=False, actualizado=timezone.now())
+
+    _crear(SolicitudVoluntariado, [
+        SolicitudVoluntariado(nombre_completo=u.nombre, email=u.email, telefono=u.telefono, direccion=u.direccion,
+                              instagram=f'@{u.cuenta}', equipo=rng.choice(SolicitudVoluntariado.EQUIPOS)[0],
+                              experiencia_previa='Ayudé en campañas de esterilización.',
+                              motivacion='Quiero aportar a la fundación.',
+                              estado=rng.choice(SolicitudVoluntariado.ESTADOS)[0], usuario_solicitante=u)
+        for u in usuarios_adoptantes[:max(1, solicitudes // 4)]
+    ])
+
+    _crear(Donacion, [
+        Donacion(id_usuario=u, nombre_donante=f'@{u.cuenta}' if u else _nombre(rng), email=u.email if u else '',
+                 monto=Decimal(rng.choice([2000, 5000, 10000, 20000, 50000])),
+                 fecha=hoy - datetime.timedelta(days=rng.randint(0, 365)),
+                 comprobante='comprobantes/comprobante.jpg', comentario='¡Fuerza!')
+        for u in (rng.choice(usuarios_adoptantes + [None]) for _ in range(donaciones))
+    ])
+
+    # bulk_create y update() no emiten señales
+    incrementar_generacion(*MODELOS_POR_NAMESPACE)
+
+    return {
+        'token': token,
+        'admin': admin.cuenta,
+        'adoptante': usuarios_adoptantes[0].cuenta,
+        'usuarios': len(usuarios),
+        'animales': len(lista_animales),
+        'solicitudes': len(lista_solicitudes),
+        'adopciones': len(adopciones),
+        'donaciones': donaciones,
+    }
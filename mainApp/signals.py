@@ -0,0 +1,58 @@
+"""
+Invalidación de caché entre workers: cada escritura en los modelos de
+MODELOS_POR_NAMESPACE incrementa la generación de su namespace. Las
+escrituras con update() o bulk_create() no emiten señales; quien las use debe
+llamar a incrementar_generacion a mano.
+
+Eventos del dashboard: las altas y los cambios de estado de
+EventoCambio.MODELOS se registran para los avisos en vivo (mainApp.eventos).
+Lo mismo vale para update(): esos cambios no generan eventos.
+
+Historial médico: cada FichaMedica nueva abre su historial con un evento de
+apertura (mainApp.historial). Los cambios posteriores pasan por
+historial.registrar_cambios, no por señales.
+
+Auditoría: las altas, cambios y bajas de auditoria.MODELOS dentro de una
+vista @auditada quedan en EventoAuditoria (mainApp.auditoria).
+"""
+from django.apps import apps
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from mainApp.cache import MODELOS_POR_NAMESPACE, incrementar_generacion
+from mainApp.eventos import registrar
+
+
+def conectar():
+    for namespace, modelos in MODELOS_POR_NAMESPACE.items():
+        def invalidar(sender, namespace=namespace, **kwargs):
+            incrementar_generacion(namespace)
+
+        for nombre in modelos:
+            modelo = apps.get_model('mainApp', nombre)
+            post_save.connect(invalidar, sender=modelo, weak=False, dispatch_uid=f'generacion_{nombre}_save')
+            post_delete.connect(invalidar, sender=modelo, weak=False, dispatch_uid=f'generacion_{nombre}_delete')
+
+    def registrar_evento(sender, instance, created, raw=False, **kwargs):
+        if not raw:
+            registrar(instance, created)
+
+    for nombre in apps.get_model('mainApp', 'EventoCambio').MODELOS:
+        post_save.connect(registrar_evento, sender=apps.get_model('mainApp', nombre), weak=False,
+                          dispatch_uid=f'evento_{nombre}')
+
+    def abrir_historial(sender, instance, created, raw=False, **kwargs):
+        if created and not raw:
+            from mainApp import historial
+
+            historial.abrir(instance)
+
+    post_save.connect(abrir_historial, sender=apps.get_model('mainApp', 'FichaMedica'), weak=False,
+                      dispatch_uid='historial_apertura')
+
+    from mainApp import auditoria
+
+    for nombre in auditoria.MODELOS:
+        modelo = apps.get_model('mainApp', nombre)
+        pre_save.connect(auditoria.antes_de_guardar, sender=modelo, dispatch_uid=f'auditoria_{nombre}_antes')
+        post_save.connect(auditoria.guardado, sender=modelo, dispatch_uid=f'auditoria_{nombre}_save')
+        post_delete.connect(auditoria.borrado, sender=modelo, dispatch_uid=f'auditoria_{nombre}_delete')
@@ -0,0 +1,501 @@
+"""
+Subida de imágenes sin cargar archivos completos en memoria.
+
+Con los handlers por defecto de Django un archivo de hasta
+FILE_UPLOAD_MAX_MEMORY_SIZE (5 MB) queda entero en RAM, y los formularios
+lo vuelven a copiar en un BytesIO para validarlo con Pillow. Con varias
+subidas simultáneas eso se nota en la memoria del worker.
+
+ImagenUploadHandler escribe cada parte directo a un archivo temporal y, a
+medida que llegan los bytes:
+- reconoce el formato por los primeros bytes (JPEG, PNG, GIF o WebP) y
+  descarta el archivo apenas se ve que no es una imagen;
+- descarta el archivo apenas supera UPLOAD_MAX_IMAGE_BYTES, sin leer el resto
+  a disco;
+- al terminar abre la imagen con Pillow, que solo lee la cabecera, y verifica
+  el formato y que no pase de UPLOAD_MAX_PIXELS (bombas de descompresión).
+Un request que declara más de UPLOAD_MAX_REQUEST_BYTES se corta sin leer el
+cuerpo.
+
+Los archivos descartados no llegan a request.FILES; el motivo queda en
+rechazos(request) para que la vista lo muestre. Las vistas lo activan con
+@subida_de_imagenes.
+
+Subidas por partes (reanudables), para conexiones móviles que se cortan a
+mitad de camino:
+- POST /api/subidas/ con {campo, nombre, tamano, sha256} crea la subida y
+  responde su id y el offset desde el que enviar. Si la misma sesión ya tenía
+  ese archivo a medias, responde esa subida (se retoma tras recargar).
+- PATCH /api/subidas/<id>/ con una parte del archivo como cuerpo, la cabecera
+  Upload-Offset (debe coincidir con lo ya recibido, si no 409 con el offset
+  correcto) y opcionalmente Upload-Checksum: sha256 <base64> de la parte. La
+  parte se escribe directo al archivo parcial, fuera de toda transacción y
+  con un flock exclusivo sobre ese archivo; si llega incompleta o no
+  coincide con su checksum se descarta y el offset no avanza. Recién con la
+  parte en disco un UPDATE condicional (WHERE recibidos = offset) avanza el
+  offset.
+- GET /api/subidas/<id>/ responde el offset actual para retomar.
+- Con la última parte se verifica el sha256 del archivo completo y la
+  cabecera de la imagen, y el archivo pasa al almacenamiento de medios.
+Los formularios referencian la subida terminada con el campo oculto
+subida_<campo> (archivo_del_formulario). Las subidas pertenecen a la sesión
+que las creó; `manage.py limpiar_subidas` borra las abandonadas.
+"""
+import base64
+import binascii
+import hashlib
+import json
+import os
+import re
+from contextlib import contextmanager
+from functools import wraps
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin flock, los PATCH concurrentes los frena el UPDATE condicional
+    fcntl = None
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopUpload
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image
+
+from mainApp.metrics import incrementar
+
+# Bytes necesarios para reconocer cualquiera de los formatos
+LARGO_FIRMA = 12
+FORMATOS = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'GIF': 'image/gif',
+    'WEBP': 'image/webp',
+}
+MENSAJES = {
+    'tipo': 'no es una imagen JPEG, PNG, GIF o WebP',
+    'tamano': 'supera el tamaño máximo permitido',
+    'dimensiones': 'tiene demasiados píxeles',
+    'imagen_invalida': 'está dañado o no es una imagen válida',
+    'request': 'hace que el envío supere el tamaño máximo permitido',
+}
+
+
+def formato_por_firma(cabecera):
+    if cabecera.startswith(b'\xff\xd8\xff'):
+        return 'JPEG'
+    if cabecera.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'PNG'
+    if cabecera[:6] in (b'GIF87a', b'GIF89a'):
+        return 'GIF'
+    if cabecera[:4] == b'RIFF' and cabecera[8:12] == b'WEBP':
+        return 'WEBP'
+    return None
+
+
+def verificar_imagen(archivo, formato):
+    """Motivo de rechazo o None; Pillow solo lee la cabecera, no decodifica"""
+    archivo.seek(0)
+    try:
+        with Image.open(archivo) as imagen:
+            if imagen.format != formato:
+                return 'imagen_invalida'
+            if imagen.width * imagen.height > settings.UPLOAD_MAX_PIXELS:
+                return 'dimensiones'
+    except Exception:
+        return 'imagen_invalida'
+    return None
+
+
+def rechazos(request):
+    """{campo: mensaje} de los archivos descartados en este request"""
+    # Los rechazos se conocen recién al procesar el cuerpo
+    request.FILES
+    return getattr(request, 'subidas_rechazadas', {})
+
+
+def formulario_valido(form, request):
+    """form.is_valid() que además informa cada archivo descartado en su campo"""
+    valido = form.is_valid()
+    for campo, mensaje in rechazos(request).items():
+        if campo in form.fields:
+            # En lugar de "Este campo es obligatorio"
+            form.errors.pop(campo, None)
+            form.add_error(campo, mensaje)
+        else:
+            form.add_error(None, mensaje)
+    return valido and not rechazos(request)
+
+
+class ImagenUploadHandler(FileUploadHandler):
+    chunk_size = 64 * 2 ** 10
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        if request is not None and not hasattr(request, 'subidas_rechazadas'):
+            request.subidas_rechazadas = {}
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.demasiado_grande = content_length > settings.UPLOAD_MAX_REQUEST_BYTES
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None,
+                 content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self._soltar()
+        if self.demasiado_grande:
+            self._rechazar('request')
+            # Se responde sin leer el resto del cuerpo
+            raise StopUpload(connection_reset=True)
+        if content_length and content_length > settings.UPLOAD_MAX_IMAGE_BYTES:
+            self._rechazar('tamano')
+            raise SkipFile
+        self.file = TemporaryUploadedFile(file_name, content_type, 0, charset, content_type_extra)
+        self.cabecera = b''
+        self.formato = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.UPLOAD_MAX_IMAGE_BYTES:
+            self._descartar('tamano')
+        if self.formato is None:
+            self.cabecera += raw_data[:LARGO_FIRMA - len(self.cabecera)]
+            if len(self.cabecera) >= LARGO_FIRMA:
+                self.formato = formato_por_firma(self.cabecera)
+                if self.formato is None:
+                    self._descartar('tipo')
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        archivo = getattr(self, 'file', None)
+        if archivo is None:
+            return None
+        self._soltar()
+        if self.formato is None:
+            # Archivos más cortos que la firma
+            self.formato = formato_por_firma(self.cabecera)
+        motivo = 'tipo' if self.formato is None else verificar_imagen(archivo, self.formato)
+        if motivo:
+            archivo.close()
+            self._rechazar(motivo)
+            return None
+        archivo.seek(0)
+        archivo.size = file_size
+        archivo.content_type = FORMATOS[self.formato]
+        return archivo
+
+    def upload_interrupted(self):
+        if hasattr(self, 'file'):
+            self.file.close()
+
+    def _soltar(self):
+        # MultiPartParser cierra (y borra) todo lo que quede en self.file si se
+        # descarta un archivo o se corta el request; un archivo ya entregado
+        # en request.FILES no debe quedar ahí
+        self.__dict__.pop('file', None)
+
+    def _descartar(self, motivo):
+        self._rechazar(motivo)
+        # MultiPartParser cierra self.file y salta el resto de la parte
+        raise SkipFile
+
+    def _rechazar(self, motivo):
+        if self.request is not None:
+            self.request.subidas_rechazadas[self.field_name] = f'El archivo {self.file_name} {MENSAJES[motivo]}'
+        incrementar('rescatando_upload_rejected_total', motivo=motivo)
+
+
+def subida_de_imagenes(vista):
+    """
+    Procesa los archivos del request con ImagenUploadHandler. Los handlers se
+    cambian antes de leer request.POST, así que la verificación CSRF se hace
+    dentro de la vista y no en el middleware. Debe ir por encima de
+    requiere_permiso, que no conserva los atributos de la vista.
+    """
+    protegida = csrf_protect(vista)
+
+    @wraps(vista)
+    @csrf_exempt
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers = [ImagenUploadHandler(request)]
+        return protegida(request, *args, **kwargs)
+    return wrapper
+
+
+# Campo del formulario -> carpeta en MEDIA_ROOT
+DESTINOS = {
+    'foto_carnet_frontal': 'carnets/',
+    'foto_carnet_trasera': 'carnets/',
+    'comprobante': 'comprobantes/',
+}
+MAXIMO_POR_SESION = 10
+TAMANO_LECTURA = 64 * 2 ** 10
+_SHA256 = re.compile(r'^[0-9a-f]{64}$')
+
+
+def _ruta_parcial(subida):
+    return os.path.join(settings.UPLOAD_PARTS_DIR, f'{subida.id}.part')
+
+
+def _respuesta(subida, status=200):
+    response = JsonResponse({
+        'id': str(subida.id),
+        'offset': subida.recibidos,
+        'tamano': subida.tamano,
+        'tamano_parte': settings.UPLOAD_CHUNK_BYTES,
+        'completa': subida.completa,
+    }, status=status)
+    response['Upload-Offset'] = str(subida.recibidos)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+def _error(mensaje, status, subida=None, motivo=None):
+    """Con offset el cliente puede reintentar desde ahí; sin offset, la subida no sigue"""
+    if motivo:
+        incrementar('rescatando_upload_rejected_total', motivo=motivo)
+    datos = {'error': mensaje}
+    if subida is not None:
+        datos['offset'] = subida.recibidos
+    return JsonResponse(datos, status=status)
+
+
+def _clave_sesion(request):
+    if not request.session.session_key:
+        # Donantes sin cuenta: la sesión se crea para poder retomar
+        request.session.modified = True
+        request.session.save()
+    return request.session.session_key
+
+
+def crear_subida(request):
+    from mainApp.models import SubidaParcial
+
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    try:
+        datos = json.loads(request.body)
+        campo, nombre = datos['campo'], os.path.basename(str(datos['nombre']))[:100]
+        tamano, sha256 = int(datos['tamano']), str(datos['sha256']).lower()
+    except (ValueError, KeyError, TypeError):
+        return _error('Datos de la subida inválidos', 400)
+    if campo not in DESTINOS or not _SHA256.match(sha256) or not nombre or tamano <= 0:
+        return _error('Datos de la subida inválidos', 400)
+    if tamano > settings.UPLOAD_MAX_IMAGE_BYTES:
+        return _error(f'El archivo {nombre} {MENSAJES["tamano"]}', 413, motivo='tamano')
+
+    sesion = _clave_sesion(request)
+    existente = SubidaParcial.objects.filter(sesion=sesion, campo=campo, sha256=sha256, tamano=tamano).first()
+    if existente:
+        return _respuesta(existente)
+    if SubidaParcial.objects.filter(sesion=sesion).count() >= MAXIMO_POR_SESION:
+        return _error('Demasiadas subidas pendientes', 429)
+    subida = SubidaParcial.objects.create(sesion=sesion, campo=campo, nombre=nombre, tamano=tamano, sha256=sha256)
+    response = _respuesta(subida, status=201)
+    response['Location'] = reverse('subida_parcial', args=[subida.id])
+    return response
+
+
+def subida_parcial(request, id_subida):
+    from mainApp.models import SubidaParcial
+
+    subida = SubidaParcial.objects.filter(id=id_subida, sesion=request.session.session_key or '').first()
+    if subida is None:
+        return _error('Subida no encontrada', 404)
+    if request.method in ('GET', 'HEAD'):
+        return _respuesta(subida)
+    if request.method == 'DELETE':
+        descartar_subida(subida)
+        return HttpResponse(status=204)
+    if request.method != 'PATCH':
+        return HttpResponseNotAllowed(['GET', 'HEAD', 'PATCH', 'DELETE'])
+    return _recibir_parte(request, subida)
+
+
+def _checksum_de_parte(request):
+    """Digest esperado de Upload-Checksum, None si no vino o False si es inválido"""
+    cabecera = request.headers.get('Upload-Checksum')
+    if not cabecera:
+        return None
+    algoritmo, _, valor = cabecera.partition(' ')
+    if algoritmo.lower() != 'sha256':
+        return False
+    try:
+        return base64.b64decode(valor, validate=True)
+    except binascii.Error:
+        return False
+
+
+@contextmanager
+def _parcial_bloqueado(ruta):
+    """
+    El archivo parcial abierto con un flock exclusivo, o None si otro PATCH de
+    la misma subida lo tiene. El bloqueo es del archivo, no de la fila: una
+    parte lenta no retiene una conexión ni un lock de la base.
+    """
+    descriptor = os.open(ruta, os.O_RDWR | os.O_CREAT, 0o600)
+    with os.fdopen(descriptor, 'r+b') as parcial:
+        if fcntl is not None:
+            try:
+                fcntl.flock(parcial, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield None
+                return
+            # _completar o descartar_subida pudieron borrarlo mientras se abría
+            if not os.path.exists(ruta) or os.stat(ruta).st_ino != os.fstat(descriptor).st_ino:
+                yield None
+                return
+        yield parcial
+
+
+def _recibir_parte(request, subida):
+    from mainApp.models import SubidaParcial
+
+    try:
+        offset = int(request.headers['Upload-Offset'])
+        largo = int(request.headers.get('Content-Length') or 0)
+    except (KeyError, ValueError):
+        return _error('Falta la cabecera Upload-Offset', 400)
+    if largo > settings.UPLOAD_CHUNK_BYTES:
+        return _error('La parte supera el tamaño máximo', 413)
+    esperado = _checksum_de_parte(request)
+    if esperado is False:
+        return _error('Upload-Checksum debe ser "sha256 <base64>"', 400)
+
+    if subida.completa or offset != subida.recibidos:
+        return _error('El offset no coincide con lo recibido', 409, subida)
+
+    os.makedirs(settings.UPLOAD_PARTS_DIR, exist_ok=True)
+    ruta = _ruta_parcial(subida)
+    with _parcial_bloqueado(ruta) as parcial:
+        # Con el archivo bloqueado, lo recibido ya no cambia hasta soltarlo
+        subida = SubidaParcial.objects.filter(id=subida.id).first()
+        if subida is None:
+            return _error('Subida no encontrada', 404)
+        if parcial is not None and subida.completa:
+            # Se completó mientras se abría: el parcial recién creado sobra
+            os.remove(ruta)
+        if parcial is None or subida.completa or offset != subida.recibidos:
+            return _error('El offset no coincide con lo recibido', 409, subida)
+        if offset + largo > subida.tamano:
+            return _error('La parte excede el tamaño declarado', 400, subida)
+
+        digest = hashlib.sha256()
+        recibidos = 0
+        # Lo que haya quedado de una parte fallida se sobrescribe
+        parcial.seek(offset)
+        parcial.truncate()
+        while recibidos < largo:
+            bloque = request.read(min(TAMANO_LECTURA, largo - recibidos))
+            if not bloque:
+                break
+            if offset == 0 and recibidos == 0 and len(bloque) >= min(LARGO_FIRMA, subida.tamano):
+                if formato_por_firma(bloque[:LARGO_FIRMA]) is None:
+                    descartar_subida(subida)
+                    return _error(f'El archivo {subida.nombre} {MENSAJES["tipo"]}', 415, motivo='tipo')
+            digest.update(bloque)
+            parcial.write(bloque)
+            recibidos += len(bloque)
+        if recibidos != largo or (esperado is not None and digest.digest() != esperado):
+            parcial.truncate(offset)
+            return _error('La parte llegó incompleta o dañada', 400, subida, motivo='checksum')
+        parcial.flush()
+
+        # La parte ya está en disco: el offset avanza solo si nadie lo movió
+        avanzada = (SubidaParcial.objects.filter(id=subida.id, recibidos=offset, archivo='')
+                    .update(recibidos=offset + largo, actualizada=timezone.now()))
+        if not avanzada:
+            subida = SubidaParcial.objects.filter(id=subida.id).first()
+            if subida is None:
+                return _error('Subida no encontrada', 404)
+            return _error('El offset no coincide con lo recibido', 409, subida)
+        subida.recibidos = offset + largo
+        if subida.recibidos == subida.tamano:
+            error = _completar(subida)
+            if error:
+                return error
+            subida.save(update_fields=['archivo', 'actualizada'])
+    return _respuesta(subida)
+
+
+def _completar(subida):
+    """Verifica el archivo completo y lo pasa al almacenamiento; devuelve la respuesta de error si falla"""
+    ruta = _ruta_parcial(subida)
+    digest = hashlib.sha256()
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(TAMANO_LECTURA), b''):
+            digest.update(bloque)
+        archivo.seek(0)
+        formato = formato_por_firma(archivo.read(LARGO_FIRMA))
+        motivo = 'tipo' if formato is None else verificar_imagen(archivo, formato)
+        integro = digest.hexdigest() == subida.sha256
+        if integro and not motivo:
+            archivo.seek(0)
+            nombre = default_storage.generate_filename(DESTINOS[subida.campo] + subida.nombre)
+            subida.archivo = default_storage.save(nombre, File(archivo))
+
+    if not integro:
+        # Alguna parte se corrompió sin checksum propio: se empieza de nuevo
+        os.remove(ruta)
+        subida.recibidos = 0
+        subida.save(update_fields=['recibidos', 'actualizada'])
+        return _error(f'El archivo {subida.nombre} no coincide con su sha256', 422, subida, motivo='checksum')
+    if motivo:
+        descartar_subida(subida)
+        return _error(f'El archivo {subida.nombre} {MENSAJES[motivo]}', 422, motivo=motivo)
+    os.remove(ruta)
+    return None
+
+
+def descartar_subida(subida):
+    """Borra la subida, su archivo parcial y, si nadie la usó, el archivo ya guardado"""
+    ruta = _ruta_parcial(subida)
+    if os.path.exists(ruta):
+        os.remove(ruta)
+    if subida.archivo:
+        default_storage.delete(subida.archivo)
+    subida.delete()
+
+
+def archivo_del_formulario(request, campo):
+    """
+    (archivo, subida) para un campo de archivo del formulario: el enviado en
+    el propio request o, si no hay, el nombre en el almacenamiento de la
+    subida por partes terminada que indica subida_<campo>. Después de guardar
+    el modelo, la vista llama a reclamar(subida).
+    """
+    from mainApp.models import SubidaParcial
+
+    if campo in request.FILES:
+        return request.FILES[campo], None
+    id_subida = request.POST.get(f'subida_{campo}')
+    if not id_subida or not request.session.session_key:
+        return None, None
+    try:
+        subida = (SubidaParcial.objects.filter(id=id_subida, sesion=request.session.session_key, campo=campo)
+                  .exclude(archivo='').first())
+    except ValidationError:
+        return None, None
+    return (subida.archivo, subida) if subida else (None, None)
+
+
+def reclamar(*subidas):
+    """El archivo ya pertenece a un modelo: limpiar_subidas no debe borrarlo"""
+    from mainApp.models import SubidaParcial
+
+    ids = [subida.id for subida in subidas if subida is not None]
+    if ids:
+        SubidaParcial.objects.filter(id__in=ids).delete()
+
+
+def limpiar_subidas(antes_de):
+    from mainApp.models import SubidaParcial
+
+    abandonadas = list(SubidaParcial.objects.filter(actualizada__lt=antes_de))
+    for subida in abandonadas:
+        descartar_subida(subida)
+    return len(abandonadas)
@@ -0,0 +1,56 @@
+"""
+{% cache_fila %}: caché de fragmentos por fila con protección contra estampidas.
+
+Uso:
+    {% load cache_filas %}
+    {% cache_fila 'tarjeta_animal' animal.id animal.actualizado %}
+        ...
+    {% endcache_fila %}
+
+Como {% cache %} de Django, pero la clave debe incluir la marca 'actualizado'
+de la fila: al guardar la fila cambia la clave y el fragmento viejo
+simplemente vence. El TTL es settings.CACHE_FRAGMENTOS_TIMEOUT. No cachear
+bloques con {% csrf_token %} ni datos de la sesión.
+
+Con generacion='<namespace>' la clave también incluye la generación del
+namespace (mainApp.cache), así que cualquier escritura en sus modelos
+invalida el fragmento en todos los workers:
+
+    {% cache_fila 'tarjeta_animal' animal.id animal.actualizado generacion='catalogo' %}
+"""
+from django import template
+from django.conf import settings
+from django.core.cache.utils import make_template_fragment_key
+
+from mainApp.cache import obtener_o_calcular
+
+register = template.Library()
+
+
+class CacheFilaNode(template.Node):
+    def __init__(self, nodelist, nombre, vary_on, namespace):
+        self.nodelist = nodelist
+        self.nombre = nombre
+        self.vary_on = vary_on
+        self.namespace = namespace
+
+    def render(self, context):
+        nombre = self.nombre.resolve(context)
+        clave = make_template_fragment_key(nombre, [v.resolve(context) for v in self.vary_on])
+        namespace = self.namespace.resolve(context) if self.namespace else None
+        return obtener_o_calcular(clave, lambda: self.nodelist.render(context),
+                                  timeout=settings.CACHE_FRAGMENTOS_TIMEOUT, namespace=namespace)
+
+
+@register.tag('cache_fila')
+def cache_fila(parser, token):
+    partes = token.split_contents()
+    namespace = None
+    if partes[-1].startswith('generacion='):
+        namespace = parser.compile_filter(partes.pop()[len('generacion='):])
+    if len(partes) < 3:
+        raise template.TemplateSyntaxError("'cache_fila' requiere un nombre y al menos un valor para la clave")
+    nodelist = parser.parse(('endcache_fila',))
+    parser.delete_first_token()
+    return CacheFilaNode(nodelist, parser.compile_filter(partes[1]), [parser.compile_filter(p) for p in partes[2:]],
+                         namespace)
@@ -0,0 +1,94 @@
+"""
+Helpers para las pruebas de rendimiento de mainApp.
+"""
+from django.urls import resolve, reverse
+
+from mainApp.instrumentation import registrar_consultas
+from mainApp.memoria import medir_memoria
+
+# Cantidad de animales (seeding.sembrar) con la que se miden los @presupuesto_memoria
+TAMANO_PRESUPUESTO_MEMORIA = 50
+
+
+def iniciar_sesion(client, usuario):
+    """Inicia sesión en el cliente de pruebas igual que login_view"""
+    session = client.session
+    session['usuario_id'] = usuario.id
+    session['usuario_nombre'] = usuario.cuenta
+    session['usuario_rol'] = usuario.rol
+    session['usuario_avatar'] = usuario.avatar
+    session.save()
+
+
+class PresupuestoConsultasMixin:
+    """
+    Mixin para TestCase que verifica el presupuesto de consultas declarado
+    con @presupuesto_consultas en cada vista.
+    """
+
+    def assertPresupuestoConsultas(self, nombre_url, *, args=None, kwargs=None, metodo='get', data=None):
+        url = reverse(nombre_url, args=args, kwargs=kwargs)
+        vista = resolve(url).func
+        presupuesto = getattr(vista, 'presupuesto_consultas', None)
+        if presupuesto is None:
+            self.fail(f'La vista {nombre_url} no declara @presupuesto_consultas')
+
+        with registrar_consultas() as registro:
+            response = getattr(self.client, metodo)(url, data)
+
+        if registro.total > presupuesto:
+            detalle = '\n'.join(f'  {n}x {huella}' for huella, n in registro.repetidas()[:10])
+            self.fail(
+                f'{nombre_url} ejecutó {registro.total} consultas '
+                f'(presupuesto: {presupuesto}).\nConsultas repetidas:\n{detalle or "  (ninguna)"}'
+            )
+        return response
+
+    def assertConsultasNoCrecen(self, nombre_url, agregar, *, args=None, kwargs=None, data=None):
+        """
+        Ejecuta la vista, llama a agregar() para sumar filas y la vuelve a
+        ejecutar. Los presupuestos se miden con pocas filas, donde un N+1
+        todavía entra; si la segunda ejecución hace más consultas, falla.
+        """
+        url = reverse(nombre_url, args=args, kwargs=kwargs)
+        with registrar_consultas() as antes:
+            self.client.get(url, data)
+        agregar()
+        with registrar_consultas() as despues:
+            response = self.client.get(url, data)
+
+        if despues.total > antes.total:
+            detalle = '\n'.join(f'  {n}x {huella}' for huella, n in despues.repetidas()[:10])
+            self.fail(
+                f'{nombre_url} pasó de {antes.total} a {despues.total} consultas al sumar filas.'
+                f'\nConsultas repetidas:\n{detalle or "  (ninguna)"}'
+            )
+        return response
+
+
+class PresupuestoMemoriaMixin:
+    """
+    Mixin para TestCase que verifica el pico de memoria declarado con
+    @presupuesto_memoria. Los GET se ejecutan una vez antes de medir para no
+    contar la compilación de plantillas ni los imports diferidos.
+    """
+
+    def assertPresupuestoMemoria(self, nombre_url, *, args=None, kwargs=None, metodo='get', data=None):
+        url = reverse(nombre_url, args=args, kwargs=kwargs)
+        vista = resolve(url).func
+        presupuesto = getattr(vista, 'presupuesto_memoria', None)
+        if presupuesto is None:
+            self.fail(f'La vista {nombre_url} no declara @presupuesto_memoria')
+
+        if metodo == 'get':
+            self.client.get(url, data)
+        with medir_memoria() as medicion:
+            response = getattr(self.client, metodo)(url, data)
+
+        if medicion.pico_kb > presupuesto:
+            detalle = '\n'.join(f'  {kb:9.1f} KB  {sitio}' for sitio, kb in medicion.sitios)
+            self.fail(
+                f'{nombre_url} llegó a un pico de {medicion.pico_kb:.0f} KB '
+                f'(presupuesto: {presupuesto} KB).\nPrincipales sitios de asignación:\n{detalle}'
+            )
+        return response
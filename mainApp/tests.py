@@ -1,3 +1,1591 @@
-from django.test import TestCase
+import base64
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import re
+import smtplib
+import tempfile
+import threading
+import zlib
+from datetime import date, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+import brotli
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.db import connections
+from asgiref.sync import sync_to_async
+from django.contrib.messages import get_messages
+from django.core.mail.backends import locmem
+from django.core.mail.backends.base import BaseEmailBackend
+from django.http import StreamingHttpResponse
+from django.test import (Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+                         skipUnlessDBFeature)
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.hashers import make_password
+
+from mainApp.models import (Usuario, Voluntario, HogarTemporal, Animal, FichaMedica, Adoptante,
+                            SolicitudAdopcion, Adopcion, Donacion, SolicitudVoluntariado, PerfilRendimiento,
+                            PasswordResetToken, SubidaParcial, EventoCambio, RecordatorioControl, EventoMedico,
+                            InstantaneaMedica, Vacunacion, EventoAuditoria, EntrevistaAdopcion)
+from mainApp.instrumentation import huella_sql, registrar_consultas
+from mainApp.cache import generacion, incrementar_generacion, obtener_o_calcular
+from mainApp.profiling import generar_token
+from mainApp import metrics
+from mainApp.tracing import exportador
+from mainApp.seeding import sembrar
+from mainApp.warmup import abrir_conexion, dimensionar, precalentar
+from mainApp.compresion import CompresionMiddleware, elegir_codificacion
+from mainApp.medios import AlmacenamientoMedios
+from mainApp.subidas import formato_por_firma
+from mainApp.replicas import ALIAS_REPLICA, CLAVE_SESION, ReplicaRouter, leer_de_replica
+from mainApp.testing import (PresupuestoConsultasMixin, PresupuestoMemoriaMixin, TAMANO_PRESUPUESTO_MEMORIA,
+                             iniciar_sesion)
+
+
+def crear_datos_base(cantidad=5):
+    """Crea un conjunto pequeño de datos relacionados para las pruebas de vistas"""
+    admin = Usuario.objects.create(nombre='Admin', cuenta='admin', email='admin@example.com',
+                                   contraseña=make_password('secreto123'), rol='admin')
+    voluntario = Voluntario.objects.create(id_usuario=admin, tipo_voluntariado='cuidado',
+                                           fecha_ingreso='2025-01-01')
+    hogar = HogarTemporal.objects.create(id_voluntario=voluntario, direccion='Refugio Central',
+                                         descripcion='Hogar principal', capacidad_animales=50, estado='activo')
+    agregar_filas(cantidad, hogar=hogar)
+    return admin
+
+
+def agregar_filas(cantidad, desde=0, hogar=None):
+    """Suma `cantidad` personas, cada una con su animal, solicitudes, adopción y donación"""
+    hogar = hogar or HogarTemporal.objects.get()
+    for i in range(desde, desde + cantidad):
+        usuario = Usuario.objects.create(nombre=f'Persona {i}', cuenta=f'persona{i}',
+                                         email=f'persona{i}@example.com', contraseña='x')
+        adoptante = Adoptante.objects.create(id_usuario=usuario, nombre=f'Persona {i}',
+                                             email=f'persona{i}@example.com')
+        animal = Animal.objects.create(nombre=f'Animal {i}', especie='Perro', edad=2, sexo='Macho',
+                                       estado_salud='Bueno', descripcion='Juguetón',
+                                       foto='animales/rocky.jpg', id_hogar=hogar)
+        FichaMedica.objects.create(id_animal=animal, proximo_control='2025-06-01')
+        for estado in ['pendiente', 'entrevista_agendada', 'aprobada', 'rechazada']:
+            SolicitudAdopcion.objects.create(id_animal=animal, id_adoptante=adoptante, estado=estado)
+        Adopcion.objects.create(id_animal=animal, id_adoptante=adoptante, estado='en_proceso')
+        SolicitudVoluntariado.objects.create(nombre_completo=f'Persona {i}', email=f'persona{i}@example.com',
+                                             telefono='123', direccion='Calle 1', instagram='@p',
+                                             equipo='rescatistas', experiencia_previa='-', motivacion='-')
+        Donacion.objects.create(id_usuario=usuario, nombre_donante=f'Persona {i}', monto=1000,
+                                fecha='2025-01-01', comprobante='comprobantes/c.jpg')
+
+
+class HuellaSqlTests(TestCase):
+    def test_agrupa_consultas_que_solo_difieren_en_parametros(self):
+        a = huella_sql('SELECT * FROM t WHERE id IN (%s, %s, %s) LIMIT 21')
+        b = huella_sql('SELECT *  FROM t\nWHERE id IN (%s) LIMIT 5')
+        self.assertEqual(a, b)
+
+    def test_registro_detecta_repetidas(self):
+        with registrar_consultas() as registro:
+            for i in range(3):
+                list(Animal.objects.filter(id=i))
+        self.assertEqual(registro.total, 3)
+        self.assertEqual(registro.repetidas()[0][1], 3)
+
+
+class PresupuestoConsultasTests(PresupuestoConsultasMixin, TestCase):
+    # Los presupuestos declarados en las vistas están medidos con crear_datos_base(5)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = crear_datos_base()
+
+    def setUp(self):
+        iniciar_sesion(self.client, self.admin)
+
+    def test_index(self):
+        self.assertPresupuestoConsultas('index')
+
+    def test_ayudar(self):
+        self.assertPresupuestoConsultas('ayudar')
+
+    def test_ver_comprobantes(self):
+        self.assertPresupuestoConsultas('ver_comprobantes')
+
+    def test_perfil(self):
+        self.assertPresupuestoConsultas('perfil')
+
+    def test_mis_adopciones(self):
+        self.assertPresupuestoConsultas('mis_adopciones')
+
+    def test_gestionar_animales(self):
+        self.assertPresupuestoConsultas('gestionar_animales')
+
+    def test_obtener_ficha_medica(self):
+        animal = Animal.objects.first()
+        self.assertPresupuestoConsultas('obtener_ficha_medica', args=[animal.id])
+
+    def test_obtener_fichas_medicas(self):
+        ids = ','.join(str(i) for i in Animal.objects.values_list('id', flat=True))
+        response = self.assertPresupuestoConsultas('obtener_fichas_medicas', data={'ids': ids})
+        self.assertEqual(len(response.json()['fichas']), 5)
+
+    def test_ver_solicitudes(self):
+        self.assertPresupuestoConsultas('ver_solicitudes')
+
+    def test_consultas_no_crecen_con_las_filas(self):
+        # Con crear_datos_base(5) un N+1 todavía entra en el presupuesto
+        desde = 5
+        for nombre in ['index', 'ver_solicitudes']:
+            with self.subTest(nombre):
+                self.assertConsultasNoCrecen(nombre, lambda: agregar_filas(15, desde))
+            desde += 15
+
+    def test_gestionar_usuarios(self):
+        self.assertPresupuestoConsultas('gestionar_usuarios')
+
+    def test_api_moderacion(self):
+        for nombre in ['api_solicitudes', 'api_adopciones', 'api_voluntariado', 'api_donaciones']:
+            response = self.assertPresupuestoConsultas(nombre)
+            self.assertEqual(response.status_code, 200)
+
+
+@override_settings(QUERY_INSTRUMENTATION=True, SLOW_REQUEST_MS=0)
+class QueryInstrumentationMiddlewareTests(TestCase):
+    def test_agrega_server_timing_y_registra_request_lento(self):
+        crear_datos_base(2)
+        with self.assertLogs('mainApp.rendimiento', level='WARNING') as logs:
+            response = self.client.get('/')
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('"vista": "index"', logs.output[0])
+
+
+class SeedBenchTests(TestCase):
+    def test_crea_filas_enlazadas(self):
+        call_command('seed_bench', animals=8, solicitudes=20, donaciones=5, seed=1, stdout=StringIO())
+        self.assertEqual(Animal.objects.count(), 8)
+        self.assertEqual(FichaMedica.objects.count(), 8)
+        self.assertEqual(SolicitudAdopcion.objects.count(), 20)
+        self.assertEqual(Donacion.objects.count(), 5)
+        for adopcion in Adopcion.objects.select_related('solicitud_origen', 'id_animal'):
+            self.assertEqual(adopcion.solicitud_origen.estado, 'aprobada')
+            self.assertFalse(adopcion.id_animal.disponible)
+
+
+class ProfilerMiddlewareTests(TestCase):
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+        self.admin = crear_datos_base(1)
+        iniciar_sesion(self.client, self.admin)
+
+    def test_perfila_request_con_token_de_admin(self):
+        with self.settings(PROFILING_ENABLED=True, PROFILING_DIR=self.directorio.name):
+            redireccion = self.client.get('/perfilar/', {'url': '/ver_comprobantes/'})
+            self.assertIn('_perfilar=', redireccion['Location'])
+            response = self.client.get(redireccion['Location'])
+        perfil = PerfilRendimiento.objects.get()
+        self.assertEqual(response['X-Perfil-Id'], str(perfil.id))
+        self.assertEqual(perfil.vista, 'ver_comprobantes')
+        self.assertTrue(os.path.exists(perfil.archivo.path))
+
+    def test_ignora_token_de_otro_usuario(self):
+        token = generar_token(self.admin.id + 1000)
+        with self.settings(PROFILING_ENABLED=True, PROFILING_DIR=self.directorio.name):
+            response = self.client.get('/ver_comprobantes/', {'_perfilar': token})
+        self.assertNotIn('X-Perfil-Id', response)
+        self.assertFalse(PerfilRendimiento.objects.exists())
+
+    def test_desactivado_por_defecto(self):
+        response = self.client.get('/ver_comprobantes/', {'_perfilar': generar_token(self.admin.id)})
+        self.assertNotIn('X-Perfil-Id', response)
+        self.assertEqual(self.client.get('/perfilar/').status_code, 404)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.directorio = directorio.name
+        ajustes = self.settings(METRICS_ENABLED=True, METRICS_TOKEN='secreto', METRICS_DIR=self.directorio)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def test_endpoint_requiere_autenticacion(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer otro')
+        self.assertEqual(response.status_code, 401)
+
+    def test_registra_requests_y_suma_otros_procesos(self):
+        self.client.get('/ayudar/')
+        # Estado volcado por otro worker de gunicorn
+        with open(os.path.join(self.directorio, '999999.json'), 'w') as archivo:
+            json.dump({'contadores': [['rescatando_http_responses_total', {'vista': 'ayudar', 'status': '200'}, 1000]],
+                       'histogramas': []}, archivo)
+
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(response.status_code, 200)
+        texto = response.content.decode()
+        linea = next(l for l in texto.splitlines() if l.startswith('rescatando_http_responses_total{status="200",vista="ayudar"}'))
+        self.assertGreater(float(linea.split()[-1]), 1000)
+        self.assertIn('rescatando_http_request_duration_seconds_bucket{le="+Inf",metodo="GET",vista="ayudar"}', texto)
+
+    def test_workers_terminados_se_archivan_sin_retroceder(self):
+        def volcar(valor):
+            with open(os.path.join(self.directorio, '999999.json'), 'w') as archivo:
+                json.dump({'contadores': [['rescatando_http_responses_total', {'vista': 'vieja', 'status': '200'}, valor]],
+                           'histogramas': []}, archivo)
+
+        def total():
+            texto = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secreto').content.decode()
+            linea = next(l for l in texto.splitlines()
+                         if l.startswith('rescatando_http_responses_total{status="200",vista="vieja"}'))
+            return float(linea.split()[-1])
+
+        volcar(1000)
+        metrics.archivar_proceso(self.directorio, 999999)
+        self.assertFalse(os.path.exists(os.path.join(self.directorio, '999999.json')))
+        self.assertEqual(total(), 1000)
+        # Un worker nuevo con el mismo PID suma, no pisa al anterior
+        volcar(5)
+        self.assertEqual(total(), 1005)
+        metrics.archivar_proceso(self.directorio, 999999)
+        self.assertEqual(total(), 1005)
+        self.assertFalse(os.path.exists(os.path.join(self.directorio, '999999.json')))
+
+    def test_backend_de_correo_registra_latencia(self):
+        clave = metrics.Registro._clave('rescatando_email_send_duration_seconds', {})
+        antes = metrics.registro.histogramas.get(clave, {}).get('count', 0)
+        with self.settings(EMAIL_BACKEND='mainApp.correo.EmailBackend',
+                           EMAIL_BACKEND_DESTINO='django.core.mail.backends.locmem.EmailBackend'):
+            mail.send_mail('Asunto', 'Mensaje', 'a@example.com', ['b@example.com'])
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(metrics.registro.histogramas[clave]['count'], antes + 1)
+
+    def test_conexion_nueva_registra_tiempo(self):
+        clave = metrics.Registro._clave('rescatando_db_connection_seconds', {'alias': 'default', 'origen': 'nueva'})
+        antes = metrics.registro.histogramas.get(clave, {}).get('count', 0)
+        conexion = connections.create_connection('default')
+        try:
+            conexion.ensure_connection()
+            conexion.ensure_connection()  # ya abierta: no se vuelve a medir
+        finally:
+            conexion.close()
+        self.assertEqual(metrics.registro.histogramas[clave]['count'], antes + 1)
+
+
+class TracingTests(TestCase):
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.ruta = os.path.join(directorio.name, 'trazas.jsonl')
+        ajustes = self.settings(TRACING_ENABLED=True, TRACING_SAMPLE_RATE=1.0,
+                                TRACING_EXPORTER='jsonl', TRACING_JSONL_PATH=self.ruta)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        crear_datos_base(2)
+
+    def leer_spans(self):
+        exportador.vaciar()
+        with open(self.ruta, encoding='utf-8') as archivo:
+            return [json.loads(linea) for linea in archivo]
+
+    def test_span_raiz_con_hijos_sql_y_plantilla(self):
+        response = self.client.get('/')
+        spans = self.leer_spans()
+        raiz = next(s for s in spans if s['tipo'] == 'http')
+        self.assertEqual(raiz['trace_id'], response['X-Trace-Id'])
+        self.assertEqual(raiz['atributos']['http.route'], 'index')
+        hijos = [s for s in spans if s['parent_id'] == raiz['span_id']]
+        self.assertIn('db', {s['tipo'] for s in hijos})
+        self.assertIn('render index.html', {s['nombre'] for s in hijos})
+
+    def test_respeta_traceparent_entrante(self):
+        trace_id = 'a' * 32
+        response = self.client.get('/ayudar/', HTTP_TRACEPARENT=f'00-{trace_id}-{"b" * 16}-01')
+        self.assertEqual(response['X-Trace-Id'], trace_id)
+        raiz = next(s for s in self.leer_spans() if s['tipo'] == 'http')
+        self.assertEqual(raiz['parent_id'], 'b' * 16)
+
+    def test_no_exporta_requests_no_muestreados(self):
+        response = self.client.get('/ayudar/', HTTP_TRACEPARENT=f'00-{"c" * 32}-{"d" * 16}-00')
+        self.assertEqual(response['X-Trace-Id'], 'c' * 32)
+        exportador.vaciar()
+        self.assertFalse(os.path.exists(self.ruta))
+
+
+def imagen_png(ancho=600, alto=600):
+    """PNG con ruido (no comprime) para probar subidas grandes"""
+    from PIL import Image
+    buffer = BytesIO()
+    Image.frombytes('RGB', (ancho, alto), os.urandom(ancho * alto * 3)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class PresupuestoMemoriaTests(PresupuestoMemoriaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        resumen = sembrar(animales=TAMANO_PRESUPUESTO_MEMORIA, solicitudes=TAMANO_PRESUPUESTO_MEMORIA * 2,
+                          donaciones=TAMANO_PRESUPUESTO_MEMORIA, semilla=1)
+        cls.admin = Usuario.objects.get(cuenta=resumen['admin'])
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        ajustes = self.settings(MEDIA_ROOT=media.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        iniciar_sesion(self.client, self.admin)
+
+    def test_index(self):
+        self.assertPresupuestoMemoria('index')
+
+    def test_ver_comprobantes(self):
+        self.assertPresupuestoMemoria('ver_comprobantes')
+
+    def test_gestionar_animales(self):
+        self.assertPresupuestoMemoria('gestionar_animales')
+
+    def test_ver_solicitudes(self):
+        self.assertPresupuestoMemoria('ver_solicitudes')
+
+    def test_realizar_donacion_con_comprobante(self):
+        comprobante = SimpleUploadedFile('comprobante.png', imagen_png(), content_type='image/png')
+        response = self.assertPresupuestoMemoria('realizar_donacion', metodo='post', data={
+            'monto': '5000', 'fecha': '2024-05-01', 'comprobante': comprobante,
+        })
+        self.assertEqual(response.status_code, 302)
+
+
+@override_settings(MEMORY_PROFILING=True, MEMORY_LOG_THRESHOLD_KB=0)
+class MemoryProfilingMiddlewareTests(TestCase):
+    def test_agrega_server_timing_y_registra_sitios(self):
+        crear_datos_base(2)
+        with self.assertLogs('mainApp.rendimiento', level='WARNING') as logs:
+            response = self.client.get('/')
+        self.assertIn('mem;desc="pico', response['Server-Timing'])
+        datos = json.loads(logs.output[-1].split(':', 2)[2])
+        self.assertEqual(datos['vista'], 'index')
+        self.assertTrue(datos['sitios'])
+
+
+class CacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_calcula_una_vez_y_reutiliza(self):
+        llamadas = []
+        calcular = lambda: llamadas.append(1) or 'valor'
+        self.assertEqual(obtener_o_calcular('clave', calcular, 60), 'valor')
+        self.assertEqual(obtener_o_calcular('clave', calcular, 60), 'valor')
+        self.assertEqual(len(llamadas), 1)
+
+    def test_con_lock_tomado_sirve_el_valor_actual_aunque_toque_recalcular(self):
+        # delta enorme: el recálculo anticipado se dispara siempre
+        cache.set('clave', ('viejo', 0, 10 ** 9), 60)
+        cache.add('clave:lock', 1, 60)
+        self.assertEqual(obtener_o_calcular('clave', lambda: 'nuevo', 60), 'viejo')
+        cache.delete('clave:lock')
+        self.assertEqual(obtener_o_calcular('clave', lambda: 'nuevo', 60), 'nuevo')
+
+    def test_fragmento_por_fila_cambia_al_guardar_la_fila(self):
+        admin = crear_datos_base(1)
+        iniciar_sesion(self.client, admin)
+        self.assertContains(self.client.get('/gestionar_animales/'), 'Animal 0')
+
+        animal = Animal.objects.get()
+        Animal.objects.filter(id=animal.id).update(nombre='Renombrado')
+        self.assertContains(self.client.get('/gestionar_animales/'), 'Animal 0')  # fragmento cacheado
+
+        animal.refresh_from_db()
+        animal.save()
+        self.assertContains(self.client.get('/gestionar_animales/'), 'Renombrado')
+
+    def test_escritura_en_otro_modelo_del_namespace_invalida_el_fragmento(self):
+        admin = crear_datos_base(1)
+        iniciar_sesion(self.client, admin)
+        self.client.get('/gestionar_animales/')
+
+        # Sin señal ni cambio de marca: el fragmento sigue vigente...
+        Animal.objects.update(nombre='Renombrado')
+        self.assertNotContains(self.client.get('/gestionar_animales/'), 'Renombrado')
+        # ...hasta que otra escritura del namespace 'catalogo' sube la generación
+        FichaMedica.objects.get().save()
+        self.assertContains(self.client.get('/gestionar_animales/'), 'Renombrado')
+
+    def test_generacion_sube_con_cada_escritura(self):
+        crear_datos_base(1)
+        antes = generacion('donaciones')
+        Donacion.objects.get().save()
+        self.assertEqual(generacion('donaciones'), antes + 1)
+        incrementar_generacion('donaciones', 'catalogo')
+        self.assertEqual(generacion('donaciones'), antes + 2)
+
+
+class BackendQueFalla(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise smtplib.SMTPException('servidor no disponible')
+
+
+class BackendQueCuentaConexiones(locmem.EmailBackend):
+    conexiones = 0
+
+    def open(self):
+        BackendQueCuentaConexiones.conexiones += 1
+        return True
+
+
+class VistasAsyncTests(TestCase):
+    def setUp(self):
+        self.admin = crear_datos_base(1)
+
+    async def test_recuperar_contrasena_envia_correo_sin_bloquear(self):
+        response = await self.async_client.post('/recuperar-contrasena/', {'email': 'persona0@example.com'})
+        self.assertRedirects(response, '/login/', fetch_redirect_response=False)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertTrue(await PasswordResetToken.objects.filter(usuario__email='persona0@example.com').aexists())
+
+    async def test_obtener_ficha_medica_async(self):
+        await sync_to_async(iniciar_sesion)(self.async_client, self.admin)
+        animal = await Animal.objects.afirst()
+        response = await self.async_client.get(f'/api/ficha/{animal.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('vacunas_al_dia', response.json())
+
+    async def test_permiso_en_vista_async_sin_sesion(self):
+        response = await self.async_client.get('/ver_solicitudes/')
+        self.assertRedirects(response, '/login/', fetch_redirect_response=False)
+
+    def test_ver_solicitudes_envia_correo_despues_de_guardar(self):
+        iniciar_sesion(self.client, self.admin)
+        solicitud = SolicitudVoluntariado.objects.get()
+        response = self.client.post('/ver_solicitudes/', {'accion': 'aprobar_voluntariado', 'id_solicitud': solicitud.id})
+        solicitud.refresh_from_db()
+        self.assertEqual(solicitud.estado, 'aprobada')
+        self.assertEqual(mail.outbox[0].to, ['persona0@example.com'])
+        self.assertIn('Correo enviado exitosamente', [str(m) for m in get_messages(response.wsgi_request)][0])
+
+    @override_settings(EMAIL_BACKEND='mainApp.tests.BackendQueFalla')
+    def test_ver_solicitudes_avisa_si_falla_el_correo(self):
+        iniciar_sesion(self.client, self.admin)
+        solicitud = SolicitudVoluntariado.objects.get()
+        response = self.client.post('/ver_solicitudes/', {'accion': 'rechazar_voluntariado', 'id_solicitud': solicitud.id,
+                                                          'observaciones_admin': 'Sin cupos'})
+        solicitud.refresh_from_db()
+        self.assertEqual(solicitud.estado, 'rechazada')
+        mensajes = [str(m) for m in get_messages(response.wsgi_request)]
+        self.assertEqual(mensajes, ['Solicitud rechazada pero hubo un error al enviar el correo: servidor no disponible'])
+
+
+class ArranqueTests(SimpleTestCase):
+    databases = {'default'}
+
+    def test_dimensionar_segun_cpus(self):
+        self.assertEqual(dimensionar(cpus=2, memoria_mb=8192), (5, 1))
+
+    def test_dimensionar_con_poca_memoria_usa_hilos(self):
+        # 512 MB alcanzan para 2 workers de 150 MB dejando margen
+        self.assertEqual(dimensionar(cpus=4, memoria_mb=512), (2, 4))
+
+    def test_dimensionar_sin_memoria_conocida(self):
+        self.assertEqual(dimensionar(cpus=1, memoria_mb=None), (3, 1))
+
+    def test_precalentar_compila_plantillas(self):
+        plantillas, tiempos = precalentar()
+        total = sum(len([n for n in archivos if n.endswith('.html')])
+                    for _, _, archivos in os.walk(os.path.join(settings.BASE_DIR, 'templates')))
+        self.assertEqual(plantillas, total)
+        self.assertIn('base_ms', tiempos)
+
+    def test_sin_pool_no_abre_conexion_en_hilos_que_no_atienden(self):
+        # Con gthread, post_worker_init corre en un hilo que nunca atiende requests
+        abiertas = {}
+
+        def hook(solo_pool):
+            try:
+                abrir_conexion(solo_pool=solo_pool)
+                abiertas[solo_pool] = connections['default'].connection is not None
+            finally:
+                connections.close_all()
+
+        for solo_pool in (True, False):
+            hilo = threading.Thread(target=hook, args=(solo_pool,))
+            hilo.start()
+            hilo.join()
+        self.assertEqual(abiertas, {True: False, False: True})
+
+
+@override_settings(REPLICA_ENABLED=True)
+class ReplicaTests(TransactionTestCase):
+    # La réplica es un espejo de la base de pruebas: necesita ver datos confirmados
+    databases = {'default', ALIAS_REPLICA}
+
+    def setUp(self):
+        self.admin = crear_datos_base(1)
+        iniciar_sesion(self.client, self.admin)
+
+    def consultas(self, url, metodo='get', **datos):
+        with CaptureQueriesContext(connections['default']) as primaria, \
+                CaptureQueriesContext(connections[ALIAS_REPLICA]) as replica:
+            response = getattr(self.client, metodo)(url, datos)
+        self.assertLess(response.status_code, 400)
+        return [c['sql'] for c in primaria], [c['sql'] for c in replica]
+
+    def test_vista_de_solo_lectura_lee_de_la_replica(self):
+        primaria, replica = self.consultas('/ver_comprobantes/')
+        self.assertTrue(any('mainApp_donacion' in sql for sql in replica))
+        self.assertFalse(any('mainApp_donacion' in sql for sql in primaria))
+
+    def test_despues_de_escribir_la_sesion_lee_de_la_primaria(self):
+        solicitud = SolicitudVoluntariado.objects.get()
+        _, replica = self.consultas('/ver_solicitudes/', 'post', accion='aprobar_voluntariado',
+                                    id_solicitud=solicitud.id)
+        self.assertEqual(replica, [])  # los POST nunca leen de la réplica
+
+        primaria, replica = self.consultas('/ver_solicitudes/')
+        self.assertEqual(replica, [])
+        self.assertTrue(any('mainApp_solicitudvoluntariado' in sql for sql in primaria))
+
+        # Pasado REPLICA_STICKY_SECONDS vuelve a leer de la réplica
+        sesion = self.client.session
+        sesion[CLAVE_SESION] = 0
+        sesion.save()
+        _, replica = self.consultas('/ver_solicitudes/')
+        self.assertNotEqual(replica, [])
+
+    def test_escritura_pega_el_resto_del_bloque_a_la_primaria(self):
+        router = ReplicaRouter()
+        with leer_de_replica():
+            self.assertEqual(router.db_for_read(Animal), ALIAS_REPLICA)
+            self.assertEqual(router.db_for_read(Session), 'default')
+            self.assertEqual(router.db_for_write(Animal), 'default')
+            self.assertEqual(router.db_for_read(Animal), 'default')
+        self.assertEqual(router.db_for_read(Animal), 'default')
+
+    def test_sin_replica_lee_de_la_primaria(self):
+        with self.settings(REPLICA_ENABLED=False), leer_de_replica():
+            self.assertEqual(ReplicaRouter().db_for_read(Animal), 'default')
+
+
+class CompresionTests(TestCase):
+    def setUp(self):
+        crear_datos_base(3)
+
+    def test_elegir_codificacion(self):
+        self.assertEqual(elegir_codificacion('gzip, deflate, br'), 'br')
+        self.assertEqual(elegir_codificacion('gzip, br;q=0'), 'gzip')
+        self.assertEqual(elegir_codificacion('br;q=0.5, gzip;q=0.8'), 'gzip')
+        self.assertEqual(elegir_codificacion('*'), 'br')
+        self.assertIsNone(elegir_codificacion('identity'))
+        self.assertIsNone(elegir_codificacion(''))
+
+    def test_html_en_brotli_y_gzip(self):
+        sin_comprimir = self.client.get('/')
+        self.assertFalse(sin_comprimir.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', sin_comprimir['Vary'])
+
+        response = self.client.get('/', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertLess(len(response.content), len(sin_comprimir.content) / 3)
+        self.assertIn(b'animal-card', brotli.decompress(response.content))
+
+        response = self.client.get('/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn(b'animal-card', gzip.decompress(response.content))
+
+    @override_settings(COMPRESSION_MIN_BYTES=10 ** 7)
+    def test_respuestas_chicas_no_se_comprimen(self):
+        response = self.client.get('/', HTTP_ACCEPT_ENCODING='br')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertFalse(response.has_header('Vary') and 'Accept-Encoding' in response['Vary'])
+
+    def test_formulario_con_csrf_sigue_funcionando(self):
+        client = Client(enforce_csrf_checks=True)
+        pagina = client.get('/login/', HTTP_ACCEPT_ENCODING='br')
+        self.assertEqual(pagina['Content-Encoding'], 'br')
+        token = re.search(rb'name="csrfmiddlewaretoken" value="([^"]+)"', brotli.decompress(pagina.content)).group(1)
+        response = client.post('/login/', {'csrfmiddlewaretoken': token.decode(), 'cuenta': 'admin',
+                                           'contraseña': 'secreto123'}, HTTP_ACCEPT_ENCODING='br')
+        self.assertRedirects(response, '/', fetch_redirect_response=False)
+
+    def test_streaming_se_envia_por_partes(self):
+        def vista(request):
+            return StreamingHttpResponse(iter([b'a' * 2000, b'b' * 2000]), content_type='text/event-stream')
+
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        response = CompresionMiddleware(vista)(request)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        descompresor = zlib.decompressobj(31)
+        partes = iter(response.streaming_content)
+        # Cada parte llega completa sin esperar al final del stream
+        self.assertEqual(descompresor.decompress(next(partes)), b'a' * 2000)
+        self.assertEqual(descompresor.decompress(b''.join(partes)), b'b' * 2000)
+
+
+class MediosTests(TestCase):
+    def setUp(self):
+        self.admin = crear_datos_base(1)
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(MEDIA_ROOT=directorio.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.almacenamiento = AlmacenamientoMedios(location=directorio.name)
+        self.foto = self.almacenamiento.save('animales/rocky.jpg', SimpleUploadedFile('rocky.jpg', b'0123456789' * 10))
+        self.adoptante = Adoptante.objects.get()
+        self.adoptante.foto_carnet_frontal = self.almacenamiento.save(
+            'carnets/frente.jpg', SimpleUploadedFile('frente.jpg', b'carnet'))
+        self.adoptante.save()
+
+    def test_nombre_con_hash_es_inmutable(self):
+        self.assertRegex(self.foto, r'^animales/rocky\.[0-9a-f]{12}\.jpg$')
+        response = self.client.get('/media/' + self.foto)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789' * 10)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_sin_hash_se_revalida_con_etag(self):
+        # Los archivos anteriores al hash (y los fijos de las plantillas) se revalidan
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, 'animales'), exist_ok=True)
+        with open(os.path.join(settings.MEDIA_ROOT, 'animales/logo.jpg'), 'wb') as archivo:
+            archivo.write(b'logo')
+        response = self.client.get('/media/animales/logo.jpg')
+        self.assertEqual(response['Cache-Control'], f'public, max-age={settings.MEDIA_MAX_AGE}')
+        no_modificado = self.client.get('/media/animales/logo.jpg', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(no_modificado.status_code, 304)
+        self.assertEqual(no_modificado['ETag'], response['ETag'])
+
+    def test_rangos(self):
+        url = '/media/' + self.foto
+        response = self.client.get(url, HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 0-9/100')
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+
+        response = self.client.get(url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(response['Content-Range'], 'bytes 95-99/100')
+        self.assertEqual(b''.join(response.streaming_content), b'56789')
+
+        response = self.client.get(url, HTTP_RANGE='bytes=200-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */100')
+
+        # If-Range con un ETag viejo: el archivo cambió, se envía completo
+        response = self.client.get(url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"viejo"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_carpetas_privadas(self):
+        url = '/media/' + self.adoptante.foto_carnet_frontal.name
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        otro = Usuario.objects.create(nombre='Otro', cuenta='otro', email='otro@example.com', contraseña='x')
+        iniciar_sesion(self.client, otro)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        iniciar_sesion(self.client, self.adoptante.id_usuario)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+        iniciar_sesion(self.client, self.admin)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_carpetas_publicas_sin_consultas(self):
+        iniciar_sesion(self.client, self.admin)
+        with self.assertNumQueries(0):
+            response = self.client.get('/media/' + self.foto)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.cookies)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/media/animales/no-existe.jpg').status_code, 404)
+
+    def test_rutas_con_puntos_no_saltan_el_control(self):
+        url = '/media/animales/%2e%2e/' + self.adoptante.foto_carnet_frontal.name
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_rutas_fuera_de_media(self):
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/animales/%2e%2e/%2e%2e/manage.py').status_code, 404)
+
+    @override_settings(MEDIA_SENDFILE='x-accel')
+    def test_x_accel_redirect(self):
+        iniciar_sesion(self.client, self.admin)
+        response = self.client.get('/media/' + self.adoptante.foto_carnet_frontal.name)
+        self.assertEqual(response['X-Accel-Redirect'], '/media-interno/' + self.adoptante.foto_carnet_frontal.name)
+        self.assertEqual(response.content, b'')
+
+    def test_variantes_precomprimidas(self):
+        svg = b'<svg xmlns="http://www.w3.org/2000/svg">' + b'<rect width="1" height="1"/>' * 100 + b'</svg>'
+        nombre = self.almacenamiento.save('animales/icono.svg', SimpleUploadedFile('icono.svg', svg))
+        url = '/media/' + nombre
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(brotli.decompress(b''.join(response.streaming_content)), svg)
+
+        gzip_response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(gzip.decompress(b''.join(gzip_response.streaming_content)), svg)
+        self.assertNotEqual(gzip_response['ETag'], response['ETag'])
+
+        identidad = self.client.get(url)
+        self.assertFalse(identidad.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(identidad.streaming_content), svg)
+
+        self.almacenamiento.delete(nombre)
+        self.assertFalse(os.path.exists(os.path.join(settings.MEDIA_ROOT, nombre + '.br')))
+
+
+class SubidasTests(TestCase):
+    def setUp(self):
+        self.admin = crear_datos_base(1)
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        ajustes = self.settings(MEDIA_ROOT=media.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def donar(self, contenido, nombre='comprobante.png', client=None):
+        comprobante = SimpleUploadedFile(nombre, contenido, content_type='image/png')
+        return (client or self.client).post('/donacion/', {'nombre_donante': 'Ana', 'monto': '5000',
+                                                           'fecha': '2024-05-01', 'comprobante': comprobante})
+
+    def test_formato_por_firma(self):
+        self.assertEqual(formato_por_firma(imagen_png(4, 4)[:12]), 'PNG')
+        self.assertEqual(formato_por_firma(b'\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01'), 'JPEG')
+        self.assertEqual(formato_por_firma(b'RIFF\x00\x00\x00\x00WEBP'), 'WEBP')
+        self.assertIsNone(formato_por_firma(b'%PDF-1.7\n%\xe2\xe3\xcf'))
+
+    def test_imagen_valida_se_guarda(self):
+        response = self.donar(imagen_png(50, 50))
+        self.assertEqual(response.status_code, 302)
+        donacion = Donacion.objects.latest('id')
+        self.assertTrue(donacion.comprobante.name.startswith('comprobantes/'))
+        with donacion.comprobante.open('rb') as archivo:
+            self.assertEqual(formato_por_firma(archivo.read(12)), 'PNG')
+
+    def test_rechaza_lo_que_no_es_imagen(self):
+        antes = Donacion.objects.count()
+        response = self.donar(b'<?php system($_GET["c"]); ?>' * 100, nombre='foto.png')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no es una imagen', str(response.context['form'].errors['comprobante']))
+        self.assertEqual(Donacion.objects.count(), antes)
+
+    def test_rechaza_cabecera_invalida(self):
+        # Firma PNG correcta pero sin una cabecera que Pillow pueda leer
+        response = self.donar(b'\x89PNG\r\n\x1a\n' + b'\x00' * 500)
+        self.assertIn('dañado', str(response.context['form'].errors['comprobante']))
+
+    @override_settings(UPLOAD_MAX_IMAGE_BYTES=10000)
+    def test_rechaza_archivos_grandes_sin_guardarlos(self):
+        response = self.donar(imagen_png(200, 200))
+        self.assertIn('tamaño máximo', str(response.context['form'].errors['comprobante']))
+        self.assertEqual(os.listdir(settings.MEDIA_ROOT), [])
+
+    @override_settings(UPLOAD_MAX_PIXELS=100)
+    def test_rechaza_demasiados_pixeles(self):
+        response = self.donar(imagen_png(20, 20))
+        self.assertIn('píxeles', str(response.context['form'].errors['comprobante']))
+
+    @override_settings(UPLOAD_MAX_REQUEST_BYTES=1000)
+    def test_request_demasiado_grande(self):
+        response = self.donar(imagen_png(50, 50))
+        self.assertIn('supere el tamaño', str(response.context['form'].errors['comprobante']))
+
+    def test_csrf_se_sigue_verificando(self):
+        response = self.donar(imagen_png(10, 10), client=Client(enforce_csrf_checks=True))
+        self.assertEqual(response.status_code, 403)
+
+    def test_carnet_rechazado_en_solicitud(self):
+        adoptante = Adoptante.objects.get()
+        iniciar_sesion(self.client, adoptante.id_usuario)
+        animal = Animal.objects.get()
+        carnet = SimpleUploadedFile('carnet.jpg', b'no soy una foto' * 10, content_type='image/jpeg')
+        response = self.client.post(f'/solicitar_adopcion/{animal.id}/', {'nombre': 'Ana',
+                                                                         'foto_carnet_frontal': carnet})
+        self.assertRedirects(response, '/', fetch_redirect_response=False)
+        self.assertIn('carnet.jpg no es una imagen', [str(m) for m in get_messages(response.wsgi_request)][0])
+        self.assertEqual(SolicitudAdopcion.objects.filter(estado='pendiente').count(), 1)
+
+
+class SubidasPorPartesTests(TestCase):
+    def setUp(self):
+        crear_datos_base(1)
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = self.settings(MEDIA_ROOT=os.path.join(directorio.name, 'media'),
+                                UPLOAD_PARTS_DIR=os.path.join(directorio.name, 'partes'), UPLOAD_CHUNK_BYTES=4096)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.imagen = imagen_png(60, 60)
+
+    def crear(self, contenido=None, campo='comprobante'):
+        contenido = self.imagen if contenido is None else contenido
+        return self.client.post('/api/subidas/', json.dumps({
+            'campo': campo, 'nombre': 'comprobante.png', 'tamano': len(contenido),
+            'sha256': hashlib.sha256(contenido).hexdigest(),
+        }), content_type='application/json')
+
+    def enviar(self, id_subida, offset, parte, checksum=True):
+        cabeceras = {'HTTP_UPLOAD_OFFSET': str(offset)}
+        if checksum:
+            cabeceras['HTTP_UPLOAD_CHECKSUM'] = 'sha256 ' + base64.b64encode(hashlib.sha256(parte).digest()).decode()
+        return self.client.patch(f'/api/subidas/{id_subida}/', parte, content_type='application/offset+octet-stream',
+                                 **cabeceras)
+
+    def subir_todo(self, contenido=None, campo='comprobante'):
+        contenido = self.imagen if contenido is None else contenido
+        subida = self.crear(contenido, campo).json()
+        while not subida['completa']:
+            subida = self.enviar(subida['id'], subida['offset'],
+                                 contenido[subida['offset']:subida['offset'] + subida['tamano_parte']]).json()
+        return subida
+
+    def test_subida_completa_y_retomada(self):
+        subida = self.crear().json()
+        self.assertEqual((subida['offset'], subida['tamano_parte']), (0, 4096))
+        self.assertEqual(self.enviar(subida['id'], 0, self.imagen[:4096]).json()['offset'], 4096)
+
+        # Se corta la conexión: el cliente pregunta dónde quedó
+        estado = self.client.get(f'/api/subidas/{subida["id"]}/')
+        self.assertEqual(estado['Upload-Offset'], '4096')
+        # Recargar la página y elegir el mismo archivo retoma la misma subida
+        self.assertEqual(self.crear().json(), estado.json())
+
+        subida = self.subir_todo()
+        self.assertTrue(subida['completa'])
+        guardada = SubidaParcial.objects.get(id=subida['id'])
+        self.assertRegex(guardada.archivo, r'^comprobantes/comprobante\.[0-9a-f]{12}\.png$')
+        with open(os.path.join(settings.MEDIA_ROOT, guardada.archivo), 'rb') as archivo:
+            self.assertEqual(archivo.read(), self.imagen)
+        self.assertEqual(os.listdir(settings.UPLOAD_PARTS_DIR), [])
+
+    def test_offset_incorrecto_y_parte_danada(self):
+        subida = self.crear().json()
+        response = self.enviar(subida['id'], 4096, self.imagen[4096:8192])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 0)
+
+        parte = self.imagen[:4096]
+        response = self.client.patch(f'/api/subidas/{subida["id"]}/', parte[:-1] + bytes([parte[-1] ^ 1]),
+                                     content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET='0',
+                                     HTTP_UPLOAD_CHECKSUM='sha256 ' + base64.b64encode(hashlib.sha256(parte).digest()).decode())
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['offset'], 0)
+        self.assertEqual(self.enviar(subida['id'], 0, parte).json()['offset'], 4096)
+
+    def test_partes_concurrentes_de_la_misma_subida(self):
+        subida = self.crear().json()
+        os.makedirs(settings.UPLOAD_PARTS_DIR)
+        ruta = os.path.join(settings.UPLOAD_PARTS_DIR, f'{subida["id"]}.part')
+        # Otro PATCH de la misma subida tiene el archivo parcial
+        with open(ruta, 'wb') as otro:
+            fcntl.flock(otro, fcntl.LOCK_EX)
+            response = self.enviar(subida['id'], 0, self.imagen[:4096])
+        self.assertEqual((response.status_code, response.json()['offset']), (409, 0))
+
+        # El offset cambió mientras la parte se escribía: no avanza dos veces
+        def adelantarse(cabecera):
+            SubidaParcial.objects.filter(id=subida['id']).update(recibidos=4096)
+            return 'PNG'
+
+        with mock.patch('mainApp.subidas.formato_por_firma', side_effect=adelantarse):
+            response = self.enviar(subida['id'], 0, self.imagen[:4096])
+        self.assertEqual((response.status_code, response.json()['offset']), (409, 4096))
+        self.assertEqual(SubidaParcial.objects.get(id=subida['id']).recibidos, 4096)
+
+    def test_sha256_del_archivo_completo(self):
+        subida = self.client.post('/api/subidas/', json.dumps({
+            'campo': 'comprobante', 'nombre': 'c.png', 'tamano': len(self.imagen), 'sha256': '0' * 64,
+        }), content_type='application/json').json()
+        offset = 0
+        while offset < len(self.imagen):
+            response = self.enviar(subida['id'], offset, self.imagen[offset:offset + 4096])
+            offset = response.json()['offset'] if response.status_code == 200 else len(self.imagen)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.json()['offset'], 0)
+
+    def test_rechaza_lo_que_no_es_imagen_en_la_primera_parte(self):
+        contenido = b'%PDF-1.7\n' * 1000
+        subida = self.crear(contenido).json()
+        response = self.enviar(subida['id'], 0, contenido[:4096])
+        self.assertEqual(response.status_code, 415)
+        self.assertNotIn('offset', response.json())
+        self.assertFalse(SubidaParcial.objects.exists())
+
+    @override_settings(UPLOAD_MAX_IMAGE_BYTES=1000)
+    def test_rechaza_archivos_grandes_al_crear(self):
+        self.assertEqual(self.crear().status_code, 413)
+
+    def test_solo_la_sesion_que_la_creo(self):
+        subida = self.crear().json()
+        otro = Client()
+        self.assertEqual(otro.get(f'/api/subidas/{subida["id"]}/').status_code, 404)
+
+    def test_donacion_con_comprobante_subido_por_partes(self):
+        subida = self.subir_todo()
+        response = self.client.post('/donacion/', {'nombre_donante': 'Ana', 'monto': '5000', 'fecha': '2024-05-01',
+                                                   'subida_comprobante': subida['id']})
+        self.assertEqual(response.status_code, 302)
+        donacion = Donacion.objects.latest('id')
+        self.assertTrue(donacion.comprobante.name.startswith('comprobantes/comprobante.'))
+        # Ya pertenece a la donación: la limpieza no la toca
+        self.assertFalse(SubidaParcial.objects.exists())
+
+    def test_solicitud_con_carnet_subido_por_partes(self):
+        adoptante = Adoptante.objects.get()
+        iniciar_sesion(self.client, adoptante.id_usuario)
+        subida = self.subir_todo(campo='foto_carnet_frontal')
+        animal = Animal.objects.get()
+        self.client.post(f'/solicitar_adopcion/{animal.id}/', {'nombre': 'Ana',
+                                                              'subida_foto_carnet_frontal': subida['id']})
+        adoptante.refresh_from_db()
+        self.assertTrue(adoptante.foto_carnet_frontal.name.startswith('carnets/comprobante.'))
+
+    def test_limpiar_subidas_abandonadas(self):
+        subida = self.subir_todo()
+        a_medias = self.crear(self.imagen[::-1]).json()
+        self.enviar(a_medias['id'], 0, self.imagen[:4096])
+        guardada = SubidaParcial.objects.get(id=subida['id']).archivo
+        call_command('limpiar_subidas', horas=0, stdout=StringIO())
+        self.assertFalse(SubidaParcial.objects.exists())
+        self.assertFalse(os.path.exists(os.path.join(settings.MEDIA_ROOT, guardada)))
+        self.assertEqual(os.listdir(settings.UPLOAD_PARTS_DIR), [])
+
+
+class ApiModeracionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = crear_datos_base()
+
+    def setUp(self):
+        iniciar_sesion(self.client, self.admin)
+
+    def test_requiere_admin_o_voluntario(self):
+        self.client.logout()
+        self.assertEqual(self.client.get('/api/solicitudes/').status_code, 403)
+        iniciar_sesion(self.client, Usuario.objects.get(cuenta='persona0'))
+        self.assertEqual(self.client.get('/api/solicitudes/').status_code, 403)
+
+    def test_filtra_por_estado_del_mas_nuevo_al_mas_antiguo(self):
+        datos = self.client.get('/api/solicitudes/', {'estado': 'pendiente,aprobada'}).json()
+        self.assertEqual(len(datos['resultados']), 10)
+        self.assertEqual({r['estado'] for r in datos['resultados']}, {'pendiente', 'aprobada'})
+        ids = [r['id'] for r in datos['resultados']]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+        self.assertEqual(datos['resultados'][0]['adoptante']['nombre'], 'Persona 4')
+        self.assertIsNone(datos['siguiente'])
+
+    def test_estado_invalido(self):
+        self.assertEqual(self.client.get('/api/solicitudes/', {'estado': 'borrada'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/donaciones/', {'estado': 'pendiente'}).status_code, 400)
+
+    def test_paginacion_por_clave_recorre_todo_sin_repetir(self):
+        vistos, url = [], '/api/solicitudes/?limite=6&fields=estado'
+        while url:
+            datos = self.client.get(url).json()
+            vistos += [r['id'] for r in datos['resultados']]
+            url = datos['siguiente']
+        self.assertEqual(vistos, list(SolicitudAdopcion.objects.order_by('-id').values_list('id', flat=True)))
+        self.assertIn('fields=estado', self.client.get('/api/solicitudes/?limite=6&fields=estado').json()['siguiente'])
+
+    def test_fields_limita_columnas_y_embebe_relacion(self):
+        with CaptureQueriesContext(connections['default']) as consultas:
+            datos = self.client.get('/api/solicitudes/', {'fields': 'estado,adoptante.email', 'limite': 2}).json()
+        self.assertEqual(datos['resultados'][0].keys(), {'id', 'estado', 'adoptante'})
+        self.assertEqual(datos['resultados'][0]['adoptante'].keys(), {'id', 'email'})
+        sql = next(c['sql'] for c in consultas if 'mainapp_solicitudadopcion' in c['sql'].lower())
+        self.assertIn('email', sql)
+        self.assertNotIn('motivo_rechazo', sql)
+        self.assertNotIn('direccion', sql)
+
+    def test_campos_desconocidos_o_excluidos(self):
+        for fields in ['adoptante.inexistente', 'veterinario.nombre', 'id_animal']:
+            self.assertEqual(self.client.get('/api/solicitudes/', {'fields': fields}).status_code, 400)
+        self.assertEqual(self.client.get('/api/donaciones/', {'fields': 'usuario.contraseña'}).status_code, 400)
+
+    def test_archivos_como_url(self):
+        datos = self.client.get('/api/donaciones/', {'limite': 1}).json()
+        self.assertEqual(datos['resultados'][0]['comprobante'], settings.MEDIA_URL + 'comprobantes/c.jpg')
+        self.assertIsNotNone(datos['siguiente'])
+
+    def test_solo_lectura(self):
+        self.assertEqual(self.client.post('/api/adopciones/').status_code, 405)
+
+
+class FichasApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = crear_datos_base(3)
+        cls.ids = list(Animal.objects.order_by('id').values_list('id', flat=True))
+
+    def setUp(self):
+        iniciar_sesion(self.client, self.admin)
+
+    def test_ficha_sin_animal_responde_404_en_una_consulta(self):
+        with CaptureQueriesContext(connections['default']) as consultas:
+            response = self.client.get('/api/ficha/999999/')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse([c for c in consultas if 'mainapp_animal' in c['sql'].lower()])
+
+    def test_ficha_con_etag_y_304(self):
+        response = self.client.get(f'/api/ficha/{self.ids[0]}/')
+        self.assertEqual(response.json()['proximo_control'], '2025-06-01')
+        etag = response['ETag']
+        self.assertEqual(self.client.get(f'/api/ficha/{self.ids[0]}/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        FichaMedica.objects.filter(id_animal_id=self.ids[0]).update(observaciones='Control anual')
+        self.assertEqual(self.client.get(f'/api/ficha/{self.ids[0]}/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_lote_en_una_consulta_con_etag_por_ficha(self):
+        FichaMedica.objects.filter(id_animal_id=self.ids[2]).delete()
+        ids = ','.join(str(i) for i in self.ids + [999999])
+        with CaptureQueriesContext(connections['default']) as consultas:
+            datos = self.client.get('/api/fichas/', {'ids': ids}).json()
+        self.assertEqual(len([c for c in consultas if 'mainapp_fichamedica' in c['sql'].lower()]), 1)
+        self.assertEqual(set(datos['fichas']), {str(self.ids[0]), str(self.ids[1])})
+        self.assertEqual(datos['no_encontradas'], [self.ids[2], 999999])
+        individual = self.client.get(f'/api/ficha/{self.ids[0]}/')
+        self.assertEqual(datos['fichas'][str(self.ids[0])]['etag'], individual['ETag'])
+        self.assertEqual(datos['fichas'][str(self.ids[0])]['ficha'], individual.json())
+
+    def test_lote_omite_las_fichas_sin_cambios(self):
+        etag = self.client.get(f'/api/ficha/{self.ids[0]}/')['ETag']
+        datos = self.client.get('/api/fichas/', {'ids': f'{self.ids[0]},{self.ids[1]}'},
+                                HTTP_IF_NONE_MATCH=etag).json()
+        self.assertEqual(datos['fichas'][str(self.ids[0])], {'etag': etag, 'sin_cambios': True})
+        self.assertIn('ficha', datos['fichas'][str(self.ids[1])])
+
+    def test_ids_invalidos(self):
+        for ids in ['', 'a,b', ','.join(str(i) for i in range(1, 202))]:
+            self.assertEqual(self.client.get('/api/fichas/', {'ids': ids}).status_code, 400)
+
+
+@override_settings(EVENTS_POLL_SECONDS=0, EVENTS_CLIENT_POLL_SECONDS=15)
+class EventosDashboardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = crear_datos_base(1)
+
+    def setUp(self):
+        iniciar_sesion(self.client, self.admin)
+
+    def nueva_solicitud(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return SolicitudVoluntariado.objects.create(nombre_completo='Ana', email='ana@example.com', telefono='1',
+                                                        direccion='-', instagram='-', equipo='rescatistas',
+                                                        experiencia_previa='-', motivacion='-')
+
+    def test_altas_y_cambios_de_estado(self):
+        solicitud = self.nueva_solicitud()
+        cargada = SolicitudVoluntariado.objects.get(id=solicitud.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            cargada.observaciones_admin = 'Llamar el lunes'
+            cargada.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            cargada.estado = 'entrevista_agendada'
+            cargada.save()
+            cargada.save()
+        self.assertEqual(list(EventoCambio.objects.order_by('id').values_list('modelo', 'objeto_id', 'tipo', 'estado')),
+                         [('solicitudvoluntariado', solicitud.id, 'creada', 'pendiente'),
+                          ('solicitudvoluntariado', solicitud.id, 'estado', 'entrevista_agendada')])
+
+    def test_donacion_sin_estado_solo_avisa_el_alta(self):
+        donacion = Donacion.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            donacion.monto = 2000
+            donacion.save()
+        self.assertFalse(EventoCambio.objects.exists())
+
+    def test_cambio_revertido_no_genera_evento(self):
+        with self.captureOnCommitCallbacks(execute=False) as pendientes:
+            SolicitudAdopcion.objects.update(estado='pendiente')
+            solicitud = SolicitudAdopcion.objects.first()
+            solicitud.estado = 'rechazada'
+            solicitud.save()
+        self.assertEqual(len(pendientes), 1)
+        self.assertFalse(EventoCambio.objects.exists())
+
+    def test_consulta_desde_el_cursor(self):
+        cursor = self.client.get('/ver_solicitudes/').context['eventos_cursor']
+        # Bajo WSGI responde en el momento, sin retener el worker
+        self.assertEqual(self.client.get('/api/eventos/', {'despues': cursor}).json(),
+                         {'eventos': [], 'cursor': cursor, 'reintentar': 15})
+        solicitud = self.nueva_solicitud()
+        datos = self.client.get('/api/eventos/', {'despues': cursor}).json()
+        self.assertEqual([(e['modelo'], e['objeto_id'], e['tipo']) for e in datos['eventos']],
+                         [('solicitudvoluntariado', solicitud.id, 'creada')])
+        self.assertEqual(self.client.get('/api/eventos/', {'despues': datos['cursor']}).json()['eventos'], [])
+
+    def test_requiere_admin_o_voluntario(self):
+        self.client.logout()
+        self.assertEqual(self.client.get('/api/eventos/').status_code, 403)
+        iniciar_sesion(self.client, self.admin)
+        self.assertEqual(self.client.get('/api/eventos/', {'despues': 'x'}).status_code, 400)
+
+    async def test_sse_bajo_asgi(self):
+        await sync_to_async(iniciar_sesion)(self.async_client, self.admin)
+        solicitud = await sync_to_async(self.nueva_solicitud)()
+        response = await self.async_client.get('/api/eventos/', {'despues': 0}, headers={'accept': 'text/event-stream'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        partes = response.streaming_content.__aiter__()
+        self.assertTrue((await anext(partes)).startswith(b'retry:'))
+        evento = (await anext(partes)).decode()
+        self.assertIn('event: solicitudvoluntariado\n', evento)
+        self.assertIn(f'"objeto_id": {solicitud.id}', evento)
+        await partes.aclose()
+
+    def test_limpiar_eventos(self):
+        self.nueva_solicitud()
+        call_command('limpiar_eventos', dias=1, stdout=StringIO())
+        self.assertTrue(EventoCambio.objects.exists())
+        EventoCambio.objects.update(fecha=EventoCambio.objects.get().fecha - timedelta(days=2))
+        call_command('limpiar_eventos', dias=1, stdout=StringIO())
+        self.assertFalse(EventoCambio.objects.exists())
+
+
+@override_settings(EMAIL_BACKEND='mainApp.tests.BackendQueCuentaConexiones')
+class RecordatoriosControlTests(TestCase):
+    hoy = date(2025, 5, 30)
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_datos_base(3)
+        usuario = Usuario.objects.create(nombre='Bea', cuenta='bea', email='bea@example.com', contraseña='x',
+                                         rol='voluntario')
+        voluntario = Voluntario.objects.create(id_usuario=usuario, tipo_voluntariado='hogar', fecha_ingreso='2025-01-01')
+        hogar = HogarTemporal.objects.create(id_voluntario=voluntario, direccion='Casa de Bea', descripcion='-',
+                                             capacidad_animales=2, estado='activo')
+        for nombre, control, disponible in [('Luna', '2025-06-02', True), ('Sol', '2025-07-01', True),
+                                            ('Adoptado', '2025-06-01', False)]:
+            animal = Animal.objects.create(nombre=nombre, especie='Gato', edad=1, sexo='Hembra', estado_salud='Bueno',
+                                           descripcion='-', id_hogar=hogar, disponible=disponible)
+            FichaMedica.objects.create(id_animal=animal, proximo_control=control)
+
+    def setUp(self):
+        BackendQueCuentaConexiones.conexiones = 0
+
+    def enviar(self, **opciones):
+        salida = StringIO()
+        call_command('recordatorios_control', hoy=self.hoy, dias=7, stdout=salida, **opciones)
+        return salida.getvalue()
+
+    def test_un_correo_por_voluntario_en_una_conexion(self):
+        self.assertIn('Enviados 2 correos con 4 controles', self.enviar())
+        self.assertEqual(BackendQueCuentaConexiones.conexiones, 1)
+        por_destinatario = {correo.to[0]: correo for correo in mail.outbox}
+        self.assertEqual(set(por_destinatario), {'admin@example.com', 'bea@example.com'})
+        self.assertIn('(3 animales)', por_destinatario['admin@example.com'].subject)
+        cuerpo = por_destinatario['bea@example.com'].body
+        self.assertIn('Hogar temporal: Casa de Bea', cuerpo)
+        self.assertIn('Luna (Gato): 02/06/2025', cuerpo)
+        self.assertNotIn('Sol', cuerpo)
+        self.assertNotIn('Adoptado', cuerpo)
+
+    def test_volver_a_ejecutar_no_repite(self):
+        self.enviar()
+        mail.outbox.clear()
+        self.assertIn('Enviados 0 correos', self.enviar())
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(BackendQueCuentaConexiones.conexiones, 1)
+
+        FichaMedica.objects.filter(id_animal__nombre='Luna').update(proximo_control='2025-06-05')
+        self.enviar()
+        self.assertEqual([correo.to for correo in mail.outbox], [['bea@example.com']])
+        self.assertEqual(RecordatorioControl.objects.filter(ficha__id_animal__nombre='Luna').count(), 2)
+
+    def test_simular_no_envia_ni_registra(self):
+        self.assertIn('Se enviarían 2 correos con 4 controles', self.enviar(simular=True))
+        self.assertEqual(mail.outbox, [])
+        self.assertFalse(RecordatorioControl.objects.exists())
+
+    def test_pendientes_en_una_consulta_por_rango(self):
+        from mainApp.recordatorios import pendientes
+
+        with CaptureQueriesContext(connections['default']) as consultas:
+            fichas = list(pendientes(self.hoy, 7))
+            [ficha.id_animal.id_hogar.id_voluntario.id_usuario.email for ficha in fichas]
+        self.assertEqual(len(consultas), 1)
+        self.assertIn('BETWEEN', consultas[0]['sql'])
+
+
+class HistorialMedicoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = crear_datos_base(1)
+        cls.animal = Animal.objects.get()
+
+    def setUp(self):
+        iniciar_sesion(self.client, self.admin)
+
+    def editar_ficha(self, **cambios):
+        ficha = FichaMedica.objects.get(id_animal=self.animal)
+        datos = {'accion': 'editar_ficha', 'id_animal': self.animal.id, 'ultimo_control': '',
+                 'proximo_control': '2025-06-01', 'estado_salud_ficha': ficha.estado_salud,
+                 'observaciones': ficha.observaciones, **cambios}
+        self.client.post('/gestionar_animales/', {k: v for k, v in datos.items() if v is not None})
+
+    def test_editar_agrega_eventos_sin_perder_el_anterior(self):
+        self.editar_ficha(vacuna='antirrabica', fecha_vacuna='2025-05-01')
+        self.editar_ficha(vacuna='octuple', fecha_vacuna='2025-05-02', observaciones='Tos leve')
+        self.editar_ficha(vacuna='octuple', fecha_vacuna='2025-05-02', observaciones='Tos leve')
+
+        eventos = list(EventoMedico.objects.filter(id_animal=self.animal).order_by('id').values_list('tipo', 'datos'))
+        self.assertEqual(eventos[0][0], 'apertura')
+        self.assertEqual(eventos[1:], [
+            ('vacunacion', {'ultima_vacunacion': 'Antirrábica 01/05/2025'}),
+            ('vacunacion', {'ultima_vacunacion': 'Óctuple 02/05/2025'}),
+            ('observacion', {'observaciones': 'Tos leve'}),
+        ])
+        ficha = FichaMedica.objects.get(id_animal=self.animal)
+        self.assertEqual(ficha.ultima_vacunacion, 'Óctuple 02/05/2025')
+        self.assertEqual(EventoMedico.objects.filter(registrado_por=self.admin).count(), 3)
+        self.assertEqual(Vacunacion.objects.filter(id_animal=self.animal).count(), 2)
+
+    def test_eventos_de_solo_insercion(self):
+        evento = EventoMedico.objects.get()
+        evento.nota = 'corregido'
+        with self.assertRaises(ValueError):
+            evento.save()
+        with self.assertRaises(ValueError):
+            evento.delete()
+
+    @mock.patch('mainApp.historial.INSTANTANEA_CADA', 3)
+    def test_instantaneas_acotan_la_reconstruccion(self):
+        from mainApp import historial
+
+        for i in range(7):
+            self.editar_ficha(observaciones=f'Control {i}')
+        self.assertEqual(list(InstantaneaMedica.objects.order_by('id').values_list('eventos', flat=True)), [3, 6])
+        intermedio = EventoMedico.objects.filter(datos__observaciones='Control 3').get().id
+
+        with CaptureQueriesContext(connections['default']) as consultas:
+            estado, total = historial.estado_en(self.animal.id)
+        self.assertEqual(len(consultas), 2)
+        self.assertEqual(total, 8)
+        self.assertEqual(estado, historial.estado_de(FichaMedica.objects.get(id_animal=self.animal)))
+        self.assertEqual(historial.estado_en(self.animal.id, intermedio)[0]['observaciones'], 'Control 3')
+
+        salida = StringIO()
+        call_command('instantaneas_historial', verificar=True, stdout=salida)
+        self.assertIn('Fichas distintas de su historial: 0', salida.getvalue())
+
+    @mock.patch('mainApp.historial.LIMITE_POR_PAGINA', 2)
+    def test_linea_de_tiempo_por_paginas(self):
+        for i in range(3):
+            self.editar_ficha(observaciones=f'Control {i}')
+        vistos, url = [], f'/api/ficha/{self.animal.id}/historial/'
+        while url:
+            datos = self.client.get(url).json()
+            vistos += [evento['datos'].get('observaciones') for evento in datos['eventos']]
+            url = datos['siguiente']
+        self.assertEqual(vistos, ['Control 2', 'Control 1', 'Control 0', ''])
+
+
+class VacunasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = crear_datos_base(3)
+        cls.firulais, cls.luna, cls.toby = Animal.objects.order_by('id')
+        cls.hoy = date(2025, 6, 15)
+
+    def dosis(self, animal, vacuna, aplicada, proxima):
+        Vacunacion.objects.create(id_animal=animal, vacuna=vacuna, fecha_aplicacion=aplicada, proxima_dosis=proxima)
+
+    def al_dia(self):
+        from mainApp import vacunas
+
+        return dict(Animal.objects.annotate(al_dia=vacunas.al_dia(hoy=self.hoy)).values_list('id', 'al_dia'))
+
+    def test_al_dia_se_calcula_con_la_ultima_dosis_de_cada_vacuna(self):
+        # Dosis vencida reemplazada por un refuerzo vigente
+        self.dosis(self.firulais, 'antirrabica', date(2024, 1, 10), date(2025, 1, 10))
+        self.dosis(self.firulais, 'antirrabica', date(2025, 1, 12), date(2026, 1, 12))
+        # Una vacuna al día y otra vencida
+        self.dosis(self.luna, 'antirrabica', date(2025, 3, 1), date(2026, 3, 1))
+        self.dosis(self.luna, 'octuple', date(2024, 5, 1), date(2025, 5, 1))
+        # toby no tiene vacunas registradas
+        self.assertEqual(self.al_dia(), {self.firulais.id: True, self.luna.id: False, self.toby.id: False})
+
+    def test_refuerzos_del_mes_en_una_consulta(self):
+        from mainApp import vacunas
+
+        self.dosis(self.firulais, 'antirrabica', date(2024, 6, 20), date(2025, 6, 20))
+        self.dosis(self.luna, 'antirrabica', date(2024, 6, 3), date(2025, 6, 3))
+        self.dosis(self.luna, 'antirrabica', date(2025, 6, 2), date(2026, 6, 2))
+        self.dosis(self.toby, 'octuple', date(2024, 6, 10), date(2025, 6, 10))
+
+        with CaptureQueriesContext(connections['default']) as consultas:
+            nombres = [v.id_animal.nombre for v in vacunas.por_vencer('antirrabica', date(2025, 6, 1), date(2025, 6, 30))]
+        self.assertEqual(nombres, [self.firulais.nombre])
+        self.assertEqual(len(consultas), 1)
+
+    def test_formulario_registra_la_dosis_y_el_api_la_refleja(self):
+        iniciar_sesion(self.client, self.admin)
+        ficha = FichaMedica.objects.get(id_animal=self.toby)
+        self.client.post('/gestionar_animales/', {
+            'accion': 'editar_ficha', 'id_animal': self.toby.id, 'estado_salud_ficha': ficha.estado_salud,
+            'observaciones': ficha.observaciones, 'vacuna': 'leucemia_felina', 'fecha_vacuna': date.today().isoformat(),
+        })
+        vacunacion = Vacunacion.objects.get(id_animal=self.toby)
+        self.assertEqual(vacunacion.proxima_dosis, date.today() + timedelta(days=365))
+        self.assertEqual(vacunacion.registrado_por, self.admin)
+        datos = self.client.get(f'/api/ficha/{self.toby.id}/').json()
+        self.assertTrue(datos['vacunas_al_dia'])
+        self.assertEqual(datos['ultima_vacunacion'], f'Leucemia felina {date.today():%d/%m/%Y}')
+
+    def test_migracion_interpreta_el_texto_libre(self):
+        from importlib import import_module
+
+        interpretar = import_module('mainApp.migrations.0020_vacunacion').interpretar
+        self.assertEqual(interpretar('Antirrábica 01/05/2025'), [('antirrabica', date(2025, 5, 1))])
+        self.assertEqual(interpretar('20/09/2024 (Triple Felina)'), [('triple_felina', date(2024, 9, 20))])
+        self.assertEqual(interpretar('ÓCTUPLE y rabia 2025-02-03'),
+                         [('antirrabica', date(2025, 2, 3)), ('octuple', date(2025, 2, 3))])
+        self.assertEqual(interpretar('Vacunado en marzo'), [])
+        self.assertEqual(interpretar('Antirrábica 31/02/2025'), [])
+
+
+def crear_animal_con_solicitudes(estado='entrevista_realizada'):
+    """Un animal sin adopción y una solicitud en `estado` por cada adoptante existente"""
+    animal = Animal.objects.create(nombre='Kira', especie='Gato', edad=1, sexo='Hembra', estado_salud='Bueno',
+                                   descripcion='Tranquila', id_hogar=HogarTemporal.objects.first())
+    solicitudes = [SolicitudAdopcion.objects.create(id_animal=animal, id_adoptante=adoptante, estado=estado)
+                   for adoptante in Adoptante.objects.order_by('id')]
+    return animal, solicitudes
+
+
+@mock.patch('mainApp.utils.generar_contrato_pdf', return_value=False)
+class TransicionesAdopcionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = crear_datos_base(2)
+        cls.animal, cls.solicitudes = crear_animal_con_solicitudes()
+
+    def setUp(self):
+        iniciar_sesion(self.client, self.admin)
+
+    def post(self, accion, **datos):
+        return self.client.post('/ver_solicitudes/', {'accion': accion, **datos})
+
+    def test_version_vieja_responde_409_sin_cambiar_nada(self, _):
+        solicitud = self.solicitudes[0]
+        self.assertEqual(self.post('rechazar_adopcion', id_adopcion=solicitud.id, version=0).status_code, 302)
+
+        response = self.post('aprobar_adopcion', id_adopcion=solicitud.id, version=0)
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('cambió mientras la revisabas', [str(m) for m in get_messages(response.wsgi_request)][-1])
+        solicitud.refresh_from_db()
+        self.assertEqual((solicitud.estado, solicitud.version), ('rechazada', 1))
+        self.assertFalse(Adopcion.objects.filter(id_animal=self.animal).exists())
+
+    def test_segunda_aprobacion_del_mismo_animal_es_conflicto(self, _):
+        primera, segunda = self.solicitudes
+        self.assertEqual(self.post('aprobar_adopcion', id_adopcion=primera.id, version=0).status_code, 302)
+        self.assertEqual(self.post('aprobar_adopcion', id_adopcion=segunda.id, version=0).status_code, 409)
+
+        self.assertEqual(Adopcion.objects.filter(id_animal=self.animal).count(), 1)
+        segunda.refresh_from_db()
+        self.assertEqual(segunda.estado, 'entrevista_realizada')
+        self.animal.refresh_from_db()
+        self.assertFalse(self.animal.disponible)
+
+    def test_transicion_no_declarada(self, _):
+        from mainApp.transiciones import Conflicto, transicionar
+
+        solicitud = self.solicitudes[0]
+        transicionar(solicitud, 'rechazada')
+        with self.assertRaises(Conflicto):
+            transicionar(solicitud, 'aprobada')
+        self.assertEqual(self.post('agendar_entrevista', id_adopcion=solicitud.id, version=1,
+                                   fecha_entrevista='2025-07-01T10:00').status_code, 409)
+
+    def test_eliminar_despues_de_aprobar_es_conflicto(self, _):
+        solicitud = self.solicitudes[0]
+        self.post('aprobar_adopcion', id_adopcion=solicitud.id, version=0)
+        # El formulario de eliminar se mostró antes de la aprobación
+        self.assertEqual(self.post('eliminar_solicitud', id_solicitud=solicitud.id, version=0).status_code, 409)
+        self.assertTrue(SolicitudAdopcion.objects.filter(id=solicitud.id, estado='aprobada').exists())
+
+        adopcion = Adopcion.objects.get(id_animal=self.animal)
+        self.assertEqual(self.post('eliminar_adopcion', id_adopcion=adopcion.id, version=adopcion.version).status_code,
+                         302)
+        solicitud.refresh_from_db()
+        self.animal.refresh_from_db()
+        self.assertEqual((solicitud.estado, self.animal.disponible), ('rechazada', True))
+
+    def entrevista(self, adopcion, resultado, version):
+        return self.client.post(f'/registrar_entrevista/{adopcion.id}/', {
+            'id_adopcion': adopcion.id, 'fecha': '2025-07-01', 'observaciones': 'Visita al hogar',
+            'resultado': resultado, 'version': version,
+        })
+
+    def test_entrevista_rechazada_cancela_y_libera_al_animal(self, _):
+        solicitud = self.solicitudes[0]
+        self.post('aprobar_adopcion', id_adopcion=solicitud.id, version=0)
+        adopcion = Adopcion.objects.get(id_animal=self.animal)
+
+        self.assertEqual(self.entrevista(adopcion, 'rechazado', adopcion.version).status_code, 302)
+        adopcion.refresh_from_db()
+        solicitud.refresh_from_db()
+        self.animal.refresh_from_db()
+        self.assertEqual((adopcion.estado, adopcion.version), ('cancelada', 1))
+        self.assertEqual((solicitud.estado, self.animal.disponible), ('rechazada', True))
+        self.assertEqual(EntrevistaAdopcion.objects.filter(id_adopcion=adopcion).count(), 1)
+        # La adopción cancelada no impide aprobar otra solicitud del animal
+        self.assertEqual(self.post('aprobar_adopcion', id_adopcion=self.solicitudes[1].id, version=0).status_code, 302)
+
+    def test_entrevista_con_version_vieja_responde_409(self, _):
+        self.post('aprobar_adopcion', id_adopcion=self.solicitudes[0].id, version=0)
+        adopcion = Adopcion.objects.get(id_animal=self.animal)
+        self.assertEqual(self.entrevista(adopcion, 'aprobado', adopcion.version).status_code, 302)
+        adopcion.refresh_from_db()
+        self.assertEqual(adopcion.estado, 'completada')
+        self.assertIsNotNone(adopcion.fecha_completada)
+
+        # El formulario se mostró antes de que la adopción se completara
+        response = self.entrevista(adopcion, 'rechazado', 0)
+        self.assertEqual(response.status_code, 409)
+        adopcion.refresh_from_db()
+        self.assertEqual((adopcion.estado, adopcion.version), ('completada', 1))
+        self.assertEqual(EntrevistaAdopcion.objects.filter(id_adopcion=adopcion).count(), 1)
+
+    def test_cambio_condicional_registra_evento(self, _):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post('rechazar_adopcion', id_adopcion=self.solicitudes[0].id, version=0)
+        evento = EventoCambio.objects.get(objeto_id=self.solicitudes[0].id)
+        self.assertEqual((evento.tipo, evento.estado), ('estado', 'rechazada'))
+
+
+# La base en memoria de SQLite no espera los bloqueos: falla con "table is
+# locked". Corre contra PostgreSQL o MySQL, donde importa el FOR UPDATE.
+@skipUnlessDBFeature('has_select_for_update')
+@mock.patch('mainApp.utils.generar_contrato_pdf', return_value=False)
+class ConcurrenciaAdopcionTests(TransactionTestCase):
+    def setUp(self):
+        self.admin = crear_datos_base(2)
+        self.animal, self.solicitudes = crear_animal_con_solicitudes()
+
+    def test_aprobaciones_simultaneas_crean_una_sola_adopcion(self, _):
+        barrera = threading.Barrier(len(self.solicitudes))
+        resultados = []
+
+        def aprobar(solicitud):
+            client = Client()
+            iniciar_sesion(client, self.admin)
+            # Los dos moderadores cargaron el dashboard y aprueban a la vez
+            barrera.wait()
+            try:
+                resultados.append(client.post('/ver_solicitudes/', {'accion': 'aprobar_adopcion',
+                                                                     'id_adopcion': solicitud.id, 'version': 0}))
+            finally:
+                connections.close_all()
+
+        hilos = [threading.Thread(target=aprobar, args=(solicitud,)) for solicitud in self.solicitudes]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(sorted(response.status_code for response in resultados), [302, 409])
+        self.assertEqual(Adopcion.objects.filter(id_animal=self.animal).count(), 1)
+        self.assertEqual(SolicitudAdopcion.objects.filter(id_animal=self.animal, estado='aprobada').count(), 1)
+        self.animal.refresh_from_db()
+        self.assertFalse(self.animal.disponible)
+
+
+@mock.patch('mainApp.utils.generar_contrato_pdf', return_value=False)
+class AuditoriaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = crear_datos_base(2)
+        cls.animal, cls.solicitudes = crear_animal_con_solicitudes()
+
+    def setUp(self):
+        iniciar_sesion(self.client, self.admin)
+
+    def post(self, url, accion, **datos):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(url, {'accion': accion, **datos})
+
+    def eventos(self, **filtros):
+        return {(e.modelo, e.operacion): e for e in EventoAuditoria.objects.filter(**filtros)}
+
+    def test_fuera_de_una_accion_no_se_audita(self, _):
+        self.assertFalse(EventoAuditoria.objects.exists())
+
+    def test_aprobar_registra_actor_accion_y_diff(self, _):
+        solicitud = self.solicitudes[0]
+        self.post('/ver_solicitudes/', 'aprobar_adopcion', id_adopcion=solicitud.id, version=0)
+
+        eventos = self.eventos()
+        self.assertEqual(set(eventos), {('SolicitudAdopcion', 'cambio'), ('Adopcion', 'alta'), ('Animal', 'cambio'),
+                                        ('Contrato', 'alta')})
+        cambio = eventos['SolicitudAdopcion', 'cambio']
+        self.assertEqual((cambio.actor_id, cambio.actor, cambio.accion, cambio.objeto_id),
+                         (self.admin.id, 'admin', 'aprobar_adopcion', solicitud.id))
+        self.assertEqual(cambio.cambios, {'estado': ['entrevista_realizada', 'aprobada'],
+                                          'fecha_aprobacion': [None, date.today().isoformat()],
+                                          'procesado_por_id': [None, self.admin.id]})
+        # Solo lo que cambió, sin version ni marcas auto_now
+        self.assertEqual(eventos['Animal', 'cambio'].cambios, {'disponible': [True, False]})
+        self.assertEqual(eventos['Adopcion', 'alta'].cambios['aprobado_por_id'], self.admin.id)
+
+    def test_eliminar_adopcion_deja_rastro(self, _):
+        self.post('/ver_solicitudes/', 'aprobar_adopcion', id_adopcion=self.solicitudes[0].id, version=0)
+        adopcion = Adopcion.objects.get(id_animal=self.animal)
+        self.post('/ver_solicitudes/', 'eliminar_adopcion', id_adopcion=adopcion.id, version=adopcion.version)
+
+        baja = self.eventos(accion='eliminar_adopcion')['Adopcion', 'baja']
+        self.assertEqual((baja.objeto_id, baja.cambios['id_adoptante_id']), (adopcion.id, adopcion.id_adoptante_id))
+        self.assertEqual(self.eventos(accion='eliminar_adopcion')['SolicitudAdopcion', 'cambio'].cambios['estado'],
+                         ['aprobada', 'rechazada'])
+
+    def test_conflicto_no_audita_lo_revertido(self, _):
+        primera, segunda = self.solicitudes
+        self.post('/ver_solicitudes/', 'aprobar_adopcion', id_adopcion=primera.id, version=0)
+        total = EventoAuditoria.objects.count()
+        self.assertEqual(self.post('/ver_solicitudes/', 'aprobar_adopcion', id_adopcion=segunda.id,
+                                   version=0).status_code, 409)
+        self.assertEqual(EventoAuditoria.objects.count(), total)
+
+    def test_eliminar_usuario_sin_contrasena_en_el_registro(self, _):
+        usuario = Usuario.objects.create(nombre='Temporal', cuenta='temporal', email='t@example.com',
+                                         contraseña=make_password('secreto123'))
+        self.post('/gestionar_usuarios/', 'eliminar_usuario', id_usuario=usuario.id)
+
+        self.assertFalse(Usuario.objects.filter(id=usuario.id).exists())
+        baja = EventoAuditoria.objects.get(modelo='Usuario', operacion='baja')
+        self.assertEqual((baja.objeto_id, baja.cambios['cuenta'], baja.actor), (usuario.id, 'temporal', 'admin'))
+        self.assertNotIn('contraseña', baja.cambios)
+
+    def test_solo_insercion(self, _):
+        self.post('/gestionar_usuarios/', 'cambiar_rol', id_usuario=self.admin.id, nuevo_rol='voluntario')
+        evento = EventoAuditoria.objects.get()
+        self.assertEqual(evento.cambios, {'rol': ['admin', 'voluntario']})
+        with self.assertRaises(ValueError):
+            evento.save()
+        with self.assertRaises(ValueError):
+            evento.delete()
+
+    def test_escritor_inserta_por_lotes(self, _):
+        from mainApp.auditoria import Escritor
+
+        escritor = Escritor()
+        lotes = []
+        with override_settings(AUDIT_BATCH_SIZE=2, AUDIT_FLUSH_SECONDS=1), \
+                mock.patch.object(escritor, 'escribir', side_effect=lambda eventos: lotes.append(len(eventos))):
+            for i in range(5):
+                escritor.encolar(EventoAuditoria(operacion='alta', modelo='Animal', objeto_id=i))
+            escritor.vaciar()
+        self.assertEqual(sum(lotes), 5)
+        self.assertTrue(all(tamano <= 2 for tamano in lotes))
+        self.assertNotEqual(escritor.hilo.ident, threading.get_ident())
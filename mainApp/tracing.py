@@ -0,0 +1,279 @@
+"""
+Trazas livianas por request.
+
+Cada request muestreado genera una traza con un span raíz y spans hijos para
+cada consulta SQL, render de plantilla, envío de correo y generación de PDF.
+Los spans se exportan en un hilo aparte a un archivo JSONL o a un colector
+OTLP/HTTP (formato JSON de OpenTelemetry), así que cualquier colector
+compatible con OpenTelemetry puede recibirlos.
+
+- TRACING_ENABLED: activa el middleware
+- TRACING_SAMPLE_RATE: fracción de requests muestreados (0 a 1); si llega una
+  cabecera traceparent se respeta la decisión del llamador
+- TRACING_EXPORTER: 'jsonl' (TRACING_JSONL_PATH) u 'otlp' (TRACING_OTLP_ENDPOINT)
+
+El trace_id se agrega a los logs con TraceIdFilter.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import queue
+import random
+import re
+import secrets
+import threading
+import time
+import urllib.request
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import DjangoTemplates as _DjangoTemplates
+
+logger = logging.getLogger('mainApp.tracing')
+
+_traza = contextvars.ContextVar('traza', default=None)
+_span_padre = contextvars.ContextVar('span_padre', default=None)
+
+_TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+
+class Traza:
+    def __init__(self, trace_id, muestreada):
+        self.trace_id = trace_id
+        self.muestreada = muestreada
+        self.spans = []
+
+
+class Span:
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'nombre', 'tipo', 'inicio', 'fin', 'atributos', 'error')
+
+    def __init__(self, trace_id, parent_id, nombre, tipo, atributos):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.nombre = nombre
+        self.tipo = tipo
+        self.inicio = time.time_ns()
+        self.fin = None
+        self.atributos = atributos
+        self.error = None
+
+    def como_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'nombre': self.nombre,
+            'tipo': self.tipo,
+            'inicio_ns': self.inicio,
+            'duracion_ms': round((self.fin - self.inicio) / 1e6, 3),
+            'atributos': self.atributos,
+            'error': self.error,
+        }
+
+
+def trace_id_actual():
+    traza = _traza.get()
+    return traza.trace_id if traza else None
+
+
+@contextmanager
+def span(nombre, tipo='interno', **atributos):
+    """Abre un span hijo del span actual. Fuera de una traza muestreada no hace nada."""
+    traza = _traza.get()
+    if traza is None or not traza.muestreada:
+        yield None
+        return
+    padre = _span_padre.get()
+    nuevo = Span(traza.trace_id, padre.span_id if padre else None, nombre, tipo, atributos)
+    token = _span_padre.set(nuevo)
+    try:
+        yield nuevo
+    except Exception as e:
+        nuevo.error = f'{type(e).__name__}: {e}'
+        raise
+    finally:
+        nuevo.fin = time.time_ns()
+        _span_padre.reset(token)
+        traza.spans.append(nuevo)
+
+
+def trazar(nombre, tipo='interno'):
+    """Decorador que envuelve cada llamada en un span"""
+    def decorador(funcion):
+        @wraps(funcion)
+        def wrapper(*args, **kwargs):
+            with span(nombre, tipo):
+                return funcion(*args, **kwargs)
+        return wrapper
+    return decorador
+
+
+def _span_sql(execute, sql, params, many, context):
+    with span('sql', 'db', **{'db.statement': sql[:1000], 'db.alias': context['connection'].alias}):
+        return execute(sql, params, many, context)
+
+
+# ------------------------
+# PLANTILLAS
+# ------------------------
+class _PlantillaTrazada:
+    def __init__(self, plantilla):
+        self.plantilla = plantilla
+
+    def __getattr__(self, nombre):
+        return getattr(self.plantilla, nombre)
+
+    def render(self, context=None, request=None):
+        with span(f'render {self.plantilla.origin.template_name}', 'template'):
+            return self.plantilla.render(context, request)
+
+
+class DjangoTemplates(_DjangoTemplates):
+    """Backend de plantillas de Django que abre un span por cada render"""
+
+    def from_string(self, template_code):
+        return _PlantillaTrazada(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _PlantillaTrazada(super().get_template(template_name))
+
+
+# ------------------------
+# EXPORTACIÓN
+# ------------------------
+def _otlp(spans):
+    def atributo(clave, valor):
+        if isinstance(valor, bool):
+            return {'key': clave, 'value': {'boolValue': valor}}
+        if isinstance(valor, int):
+            return {'key': clave, 'value': {'intValue': str(valor)}}
+        return {'key': clave, 'value': {'stringValue': str(valor)}}
+
+    return {'resourceSpans': [{
+        'resource': {'attributes': [atributo('service.name', settings.TRACING_SERVICE_NAME)]},
+        'scopeSpans': [{
+            'scope': {'name': 'mainApp.tracing'},
+            'spans': [{
+                'traceId': s.trace_id,
+                'spanId': s.span_id,
+                'parentSpanId': s.parent_id or '',
+                'name': s.nombre,
+                'kind': 2 if s.tipo == 'http' else 1,  # SERVER / INTERNAL
+                'startTimeUnixNano': str(s.inicio),
+                'endTimeUnixNano': str(s.fin),
+                'attributes': [atributo(k, v) for k, v in s.atributos.items()] + [atributo('tipo', s.tipo)],
+                'status': {'code': 2, 'message': s.error} if s.error else {'code': 1},
+            } for s in spans],
+        }],
+    }]}
+
+
+class Exportador:
+    """Exporta los spans desde un hilo en segundo plano para no sumar latencia al request"""
+
+    def __init__(self):
+        self.cola = queue.Queue(maxsize=1000)
+        self.hilo = None
+        self.lock = threading.Lock()
+
+    def enviar(self, spans):
+        with self.lock:
+            if self.hilo is None or not self.hilo.is_alive():
+                self.hilo = threading.Thread(target=self._bucle, name='exportador-trazas', daemon=True)
+                self.hilo.start()
+        try:
+            self.cola.put_nowait(spans)
+        except queue.Full:
+            logger.warning('Cola de trazas llena, se descartan %d spans', len(spans))
+
+    def _bucle(self):
+        while True:
+            lote = [self.cola.get()]
+            while len(lote) < 50:
+                try:
+                    lote.append(self.cola.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.exportar([s for spans in lote for s in spans])
+            except Exception:
+                logger.exception('No se pudieron exportar las trazas')
+            finally:
+                for _ in lote:
+                    self.cola.task_done()
+
+    def exportar(self, spans):
+        if settings.TRACING_EXPORTER == 'otlp':
+            datos = json.dumps(_otlp(spans)).encode()
+            peticion = urllib.request.Request(settings.TRACING_OTLP_ENDPOINT, data=datos,
+                                              headers={'Content-Type': 'application/json'})
+            urllib.request.urlopen(peticion, timeout=5).close()
+        elif settings.TRACING_EXPORTER == 'jsonl':
+            with open(settings.TRACING_JSONL_PATH, 'a', encoding='utf-8') as archivo:
+                for s in spans:
+                    archivo.write(json.dumps(s.como_dict(), ensure_ascii=False) + '\n')
+
+    def vaciar(self):
+        """Espera a que se exporten los spans pendientes (pruebas y apagado)"""
+        if self.hilo is not None and self.hilo.is_alive():
+            self.cola.join()
+
+
+exportador = Exportador()
+atexit.register(exportador.vaciar)
+
+
+# ------------------------
+# MIDDLEWARE Y LOGS
+# ------------------------
+class TracingMiddleware:
+    """Crea la traza del request y exporta sus spans al terminar"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'TRACING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        padre = _TRACEPARENT.match(request.META.get('HTTP_TRACEPARENT', ''))
+        if padre:
+            trace_id, parent_id, muestreada = padre.group(1), padre.group(2), padre.group(3) == '01'
+        else:
+            trace_id, parent_id = secrets.token_hex(16), None
+            muestreada = random.random() < settings.TRACING_SAMPLE_RATE
+
+        traza = Traza(trace_id, muestreada)
+        token_traza = _traza.set(traza)
+        try:
+            with ExitStack() as stack:
+                raiz = stack.enter_context(span(f'{request.method} {request.path}', 'http',
+                                                **{'http.method': request.method, 'http.target': request.path}))
+                if raiz is not None:
+                    raiz.parent_id = parent_id
+                    for alias in connections:
+                        stack.enter_context(connections[alias].execute_wrapper(_span_sql))
+                response = self.get_response(request)
+                if raiz is not None:
+                    raiz.atributos['http.status_code'] = response.status_code
+                    if request.resolver_match:
+                        raiz.atributos['http.route'] = request.resolver_match.url_name
+        finally:
+            _traza.reset(token_traza)
+
+        response['X-Trace-Id'] = trace_id
+        if traza.spans and settings.TRACING_EXPORTER:
+            exportador.enviar(traza.spans)
+        return response
+
+
+class TraceIdFilter(logging.Filter):
+    """Agrega trace_id a cada registro de log ('-' fuera de un request trazado)"""
+
+    def filter(self, record):
+        record.trace_id = trace_id_actual() or '-'
+        return True
@@ -0,0 +1,187 @@
+"""
+Estados de SolicitudAdopcion y Adopcion con varios moderadores a la vez.
+
+TRANSICIONES declara a qué estados se puede pasar desde cada uno. Cada cambio
+es un UPDATE condicional:
+
+    UPDATE ... SET estado = <nuevo>, version = version + 1
+    WHERE id = <id> AND estado = <leído> AND version = <la que vio el moderador>
+
+Los formularios del dashboard mandan la versión de la fila que mostraron. Si
+otro moderador la cambió entre medio, el UPDATE no toca ninguna fila y se
+lanza Conflicto. ver_solicitudes lo convierte en un 409 con el dashboard
+actualizado, en vez de pisar el cambio del otro.
+
+Aprobar, eliminar y registrar una entrevista de adopción además bloquean la
+fila del animal (SELECT ... FOR UPDATE) durante la transacción. Así dos
+aprobaciones de solicitudes distintas del mismo animal, o una aprobación y
+una eliminación, se ejecutan una después de la otra, y la segunda ve la
+Adopcion que creó la primera.
+
+update() no emite señales: transicionar registra el evento del dashboard
+(mainApp.eventos) y el de auditoría (mainApp.auditoria), e invalida la
+generación 'dashboard' a mano.
+"""
+from datetime import date
+
+from django.db import transaction
+from django.db.models import F
+
+from mainApp import auditoria
+from mainApp.cache import incrementar_generacion
+from mainApp.eventos import registrar
+from mainApp.models import Adopcion, Animal, EventoCambio, SolicitudAdopcion
+
+TRANSICIONES = {
+    SolicitudAdopcion: {
+        'pendiente': {'entrevista_agendada', 'rechazada'},
+        # Reagendar vuelve a 'entrevista_agendada'
+        'entrevista_agendada': {'entrevista_agendada', 'entrevista_realizada', 'aprobada', 'rechazada'},
+        'entrevista_realizada': {'aprobada', 'rechazada'},
+        # Al eliminar la adopción la solicitud queda rechazada
+        'aprobada': {'rechazada'},
+        'rechazada': set(),
+    },
+    Adopcion: {
+        'en_proceso': {'contrato_generado', 'completada', 'cancelada'},
+        # Regenerar el contrato
+        'contrato_generado': {'contrato_generado', 'completada', 'cancelada'},
+        'completada': set(),
+        'cancelada': set(),
+    },
+}
+
+# Resultado de EntrevistaAdopcion -> estado de la Adopcion. Cualquier otro
+# resultado cuenta como rechazo, como hacía registrar_entrevista.
+RESULTADOS_ENTREVISTA = {'aprobado': 'completada', 'rechazado': 'cancelada'}
+
+
+class Conflicto(Exception):
+    """La fila cambió desde que el moderador la vio, o la transición no es válida"""
+
+
+def _nombre(instancia):
+    return 'La solicitud' if isinstance(instancia, SolicitudAdopcion) else 'La adopción'
+
+
+def _estado_actual(instancia):
+    modelo = type(instancia)
+    estado = modelo.objects.filter(pk=instancia.pk).values_list('estado', flat=True).first()
+    if estado is None:
+        return Conflicto(f'{_nombre(instancia)} fue eliminada por otro moderador.')
+    return Conflicto(f'{_nombre(instancia)} cambió mientras la revisabas (ahora: '
+                     f'{dict(modelo.ESTADOS)[estado]}). Revisa el estado actual y vuelve a intentarlo.')
+
+
+def permitida(modelo, desde, hacia):
+    return hacia in TRANSICIONES[modelo].get(desde, ())
+
+
+def _validar(instancia, hacia, version):
+    if version is not None and version != instancia.version:
+        raise _estado_actual(instancia)
+    if not permitida(type(instancia), instancia.estado, hacia):
+        raise Conflicto(f'{_nombre(instancia)} está en "{instancia.get_estado_display()}" y no puede '
+                        f'pasar a "{dict(instancia.ESTADOS)[hacia]}".')
+
+
+def transicionar(instancia, hacia, version=None, **campos):
+    """
+    Pasa `instancia` al estado `hacia` con un UPDATE condicional y guarda
+    `campos` en el mismo UPDATE. `version` es la que vio el moderador (None:
+    la de la instancia). Lanza Conflicto si la transición no es válida o si
+    la fila cambió.
+    """
+    _validar(instancia, hacia, version)
+    modelo, desde = type(instancia), instancia.estado
+    filas = (modelo.objects.filter(pk=instancia.pk, estado=desde, version=instancia.version)
+             .update(estado=hacia, version=F('version') + 1, **campos))
+    if not filas:
+        raise _estado_actual(instancia)
+
+    antes = {'estado': desde, **{campo: getattr(instancia, campo) for campo in campos}}
+    instancia.estado = hacia
+    instancia.version += 1
+    for campo, valor in campos.items():
+        setattr(instancia, campo, valor)
+    auditoria.registrar_cambio(instancia, antes)
+    if modelo.__name__ in EventoCambio.MODELOS:
+        instancia._estado_cargado = desde
+        registrar(instancia, created=False)
+    incrementar_generacion('dashboard')
+    return instancia
+
+
+def _bloquear_animal(id_animal):
+    return Animal.objects.select_for_update().get(pk=id_animal)
+
+
+@transaction.atomic
+def aprobar(solicitud, usuario_id, version=None):
+    """Aprueba la solicitud, crea la Adopcion y deja al animal no disponible"""
+    animal = _bloquear_animal(solicitud.id_animal_id)
+    if Adopcion.objects.filter(id_animal=animal).exclude(estado='cancelada').exists():
+        raise Conflicto(f'{animal.nombre} ya tiene una adopción aprobada por otro moderador.')
+    transicionar(solicitud, 'aprobada', version, fecha_aprobacion=date.today(), procesado_por_id=usuario_id)
+    adopcion = Adopcion.objects.create(id_animal=animal, id_adoptante_id=solicitud.id_adoptante_id,
+                                       solicitud_origen=solicitud, aprobado_por_id=usuario_id, estado='en_proceso')
+    animal.disponible = False
+    animal.save()
+    return adopcion
+
+
+def _borrar(instancia, version):
+    if version is not None and version != instancia.version:
+        raise _estado_actual(instancia)
+    borradas, _ = (type(instancia).objects
+                   .filter(pk=instancia.pk, estado=instancia.estado, version=instancia.version).delete())
+    if not borradas:
+        raise _estado_actual(instancia)
+
+
+@transaction.atomic
+def eliminar_solicitud(solicitud, version=None):
+    animal = _bloquear_animal(solicitud.id_animal_id)
+    _borrar(solicitud, version)
+    # Si la solicitud fue aprobada, el animal vuelve a estar disponible
+    if solicitud.estado == 'aprobada':
+        animal.disponible = True
+        animal.save()
+
+
+def _rechazar_origen(adopcion, motivo):
+    if adopcion.solicitud_origen_id:
+        solicitud = SolicitudAdopcion.objects.filter(pk=adopcion.solicitud_origen_id, estado='aprobada').first()
+        if solicitud:
+            transicionar(solicitud, 'rechazada', motivo_rechazo=motivo)
+
+
+@transaction.atomic
+def registrar_entrevista(adopcion, entrevista, version=None):
+    """
+    Guarda la entrevista y pasa la adopción al estado de su resultado:
+    aprobada, completada; rechazada, cancelada (rechaza la solicitud de origen
+    y libera al animal). Si la transición falla no se guarda la entrevista.
+    """
+    hacia = RESULTADOS_ENTREVISTA.get(entrevista.resultado, 'cancelada')
+    animal = _bloquear_animal(adopcion.id_animal_id)
+    if hacia == 'completada':
+        transicionar(adopcion, hacia, version, fecha_completada=date.today())
+    else:
+        transicionar(adopcion, hacia, version)
+        _rechazar_origen(adopcion, 'Adopción cancelada tras la entrevista')
+        animal.disponible = True
+        animal.save()
+    entrevista.id_adopcion = adopcion
+    entrevista.save()
+    return entrevista
+
+
+@transaction.atomic
+def eliminar_adopcion(adopcion, version=None):
+    """Elimina la adopción (y en cascada su contrato), rechaza la solicitud de origen y libera al animal"""
+    animal = _bloquear_animal(adopcion.id_animal_id)
+    _borrar(adopcion, version)
+    _rechazar_origen(adopcion, 'Adopción cancelada por administración')
+    animal.disponible = True
+    animal.save()
@@ -3,6 +3,11 @@ from django.core.files.base import ContentFile
 from io import BytesIO
 import os
 
+from mainApp.metrics import cronometrar
+from mainApp.tracing import trazar
+
+@cronometrar('rescatando_contrato_pdf_duration_seconds')
+@trazar('generar_contrato_pdf', 'pdf')
 def generar_contrato_pdf(contrato):
     """
     Genera un PDF del contrato de adopción.
@@ -0,0 +1,79 @@
+"""
+Vacunas de cada animal.
+
+Cada dosis es una fila de Vacunacion (vacuna, fecha de aplicación, próxima
+dosis). La próxima dosis se guarda al registrar, calculada con VIGENCIA_DIAS
+si no se indica otra, para que "qué animales necesitan refuerzo antirrábico
+este mes" sea una consulta por rango sobre el índice (vacuna, proxima_dosis).
+
+"Vacunas al día" ya no es un campo que alguien marca a mano: al_dia() es una
+expresión que se agrega a la consulta del catálogo o de las fichas. Un animal
+está al día si tiene al menos una dosis registrada y la última dosis de
+ninguna de sus vacunas está vencida. Como depende de la fecha, nunca queda
+desactualizada.
+
+FichaMedica.ultima_vacunacion queda como resumen legible de la última dosis
+("Antirrábica 01/05/2025") y sus cambios pasan por el historial médico.
+"""
+from datetime import date, timedelta
+
+from django.db.models import BooleanField, Exists, ExpressionWrapper, OuterRef
+
+from mainApp.models import Vacunacion
+
+# Días hasta el refuerzo de cada vacuna
+VIGENCIA_DIAS = {
+    'antirrabica': 365,
+    'octuple': 365,
+    'sextuple': 365,
+    'triple_felina': 365,
+    'leucemia_felina': 365,
+}
+
+
+def proxima_dosis(vacuna, fecha_aplicacion):
+    return fecha_aplicacion + timedelta(days=VIGENCIA_DIAS[vacuna])
+
+
+def resumen(vacunacion):
+    """Texto para FichaMedica.ultima_vacunacion"""
+    return f'{vacunacion.get_vacuna_display()} {vacunacion.fecha_aplicacion:%d/%m/%Y}'
+
+
+def registrar(id_animal, vacuna, fecha_aplicacion, proxima=None, usuario_id=None):
+    """
+    Registra una dosis y la devuelve. Registrar dos veces la misma vacuna en
+    la misma fecha no duplica la fila.
+    """
+    vacunacion, _ = Vacunacion.objects.get_or_create(
+        id_animal_id=id_animal, vacuna=vacuna, fecha_aplicacion=fecha_aplicacion,
+        defaults={'proxima_dosis': proxima or proxima_dosis(vacuna, fecha_aplicacion),
+                  'registrado_por_id': usuario_id},
+    )
+    return vacunacion
+
+
+def ultimas_dosis():
+    """La dosis más reciente de cada vacuna de cada animal"""
+    posterior = Vacunacion.objects.filter(id_animal=OuterRef('id_animal'), vacuna=OuterRef('vacuna'),
+                                          fecha_aplicacion__gt=OuterRef('fecha_aplicacion'))
+    return Vacunacion.objects.filter(~Exists(posterior))
+
+
+def al_dia(animal='pk', hoy=None):
+    """
+    Expresión booleana para .annotate(). `animal` es la columna del animal en
+    la consulta de afuera: 'pk' sobre Animal, 'id_animal' sobre FichaMedica.
+    """
+    hoy = hoy or date.today()
+    vencidas = ultimas_dosis().filter(id_animal=OuterRef(animal), proxima_dosis__lt=hoy)
+    registradas = Vacunacion.objects.filter(id_animal=OuterRef(animal))
+    return ExpressionWrapper(Exists(registradas) & ~Exists(vencidas), output_field=BooleanField())
+
+
+def por_vencer(vacuna, desde, hasta):
+    """Últimas dosis de `vacuna` cuyo refuerzo cae entre desde y hasta (vencidas si desde es antes de hoy)"""
+    return (ultimas_dosis()
+            .filter(vacuna=vacuna, proxima_dosis__range=(desde, hasta))
+            .select_related('id_animal')
+            .order_by('proxima_dosis', 'id_animal__nombre'))
@@ -1,9 +1,12 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib import messages
 from django.contrib.auth.hashers import make_password, check_password
-from django.core.mail import send_mail
 from django.conf import settings
+from django.db import transaction
 from django.utils.html import escape
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from collections import namedtuple
+import asyncio
 import re
 
 # Create your views here.
@@ -12,6 +15,13 @@ from mainApp.forms import (UsuarioForm, VoluntarioForm, HogarTemporalForm, Anima
                            EntrevistaAdopcionForm, InscripcionVoluntarioForm, FichaMedicaForm)
 from mainApp.models import (Usuario, Voluntario, HogarTemporal, Animal, Adoptante, 
                             SolicitudAdopcion, Adopcion, Donacion, EntrevistaAdopcion, Contrato, SolicitudVoluntariado, PasswordResetToken)
+from mainApp.instrumentation import presupuesto_consultas
+from mainApp.memoria import presupuesto_memoria
+from mainApp.replicas import lectura_en_replica
+from mainApp.auditoria import auditada, registrar_baja
+from mainApp.subidas import (archivo_del_formulario, formulario_valido, rechazos, reclamar,
+                             subida_de_imagenes)
+from mainApp.correo import enviar_correo
 import datetime
 
 # Función para sanitizar entrada de texto
@@ -33,11 +43,20 @@ def validate_email(email):
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
     return re.match(pattern, email) is not None
 
+@presupuesto_memoria(9000)
+@presupuesto_consultas(6)
+@lectura_en_replica
 def index(request):
-    animales = Animal.objects.filter(disponible=True).prefetch_related('fichamedica')
-    # Agregar la ficha médica a cada animal para acceso más fácil en el template
+    from mainApp import vacunas
+
+    # vacunas_al_dia se calcula en la misma consulta (mainApp.vacunas)
+    animales = (Animal.objects.filter(disponible=True).prefetch_related('fichamedica')
+                .annotate(vacunas_al_dia=vacunas.al_dia()))
+    # Agregar la ficha médica a cada animal para acceso más fácil en el template.
+    # all() usa las fichas ya precargadas; first() o exists() consultarían de nuevo
     for animal in animales:
-        animal.ficha = animal.fichamedica.first() if animal.fichamedica.exists() else None
+        fichas = animal.fichamedica.all()
+        animal.ficha = fichas[0] if fichas else None
     return render(request, 'index.html', {'animales': animales})
 
 def login_view(request):
@@ -139,6 +158,7 @@ def register_usuario(request):
     
     return render(request, 'login.html')
 
+@presupuesto_consultas(5)
 def ayudar(request):
     context = {}
     if request.session.get('usuario_id'):
@@ -153,25 +173,36 @@ def ayudar(request):
 
 # Decorador personalizado para verificar permisos
 def requiere_permiso(roles_permitidos):
+    def rechazar(request, usuario_rol):
+        if not usuario_rol:
+            messages.error(request, 'Debes iniciar sesión')
+            return redirect('login')
+        if usuario_rol not in roles_permitidos:
+            messages.error(request, 'No tienes permisos para acceder a esta página')
+            return redirect('index')
+        return None
+
     def decorador(vista):
+        # Las vistas async leen la sesión sin bloquear el event loop
+        if iscoroutinefunction(vista):
+            async def wrapper(request, *args, **kwargs):
+                respuesta = rechazar(request, await request.session.aget('usuario_rol'))
+                return respuesta or await vista(request, *args, **kwargs)
+            return wrapper
+
         def wrapper(request, *args, **kwargs):
-            usuario_rol = request.session.get('usuario_rol')
-            if not usuario_rol:
-                messages.error(request, 'Debes iniciar sesión')
-                return redirect('login')
-            if usuario_rol not in roles_permitidos:
-                messages.error(request, 'No tienes permisos para acceder a esta página')
-                return redirect('index')
-            return vista(request, *args, **kwargs)
+            respuesta = rechazar(request, request.session.get('usuario_rol'))
+            return respuesta or vista(request, *args, **kwargs)
         return wrapper
     return decorador
 
 # Ejemplo de vista protegida para agregar animales
+@subida_de_imagenes
 @requiere_permiso(['admin', 'voluntario'])
 def agregar_animal(request):
     if request.method == 'POST':
         form = AnimalForm(request.POST, request.FILES)
-        if form.is_valid():
+        if formulario_valido(form, request):
             form.save()
             messages.success(request, 'Animal agregado exitosamente')
             return redirect('index')
@@ -180,6 +211,7 @@ def agregar_animal(request):
     return render(request, 'agregar_animal.html', {'form': form})
 
 # Vista para solicitud de adopción (público)
+@subida_de_imagenes
 def solicitar_adopcion(request, animal_id):
     animal = get_object_or_404(Animal, id=animal_id)
     usuario_id = request.session.get('usuario_id')
@@ -189,11 +221,17 @@ def solicitar_adopcion(request, animal_id):
         return redirect('login')
     
     if request.method == 'POST':
+        # El formulario está en el modal del catálogo
+        if rechazos(request):
+            for mensaje in rechazos(request).values():
+                messages.error(request, mensaje)
+            return redirect('index')
+        
         usuario = Usuario.objects.get(id=usuario_id)
         
-        # Manejar fotos del carnet si se subieron
-        foto_carnet_frontal = request.FILES.get('foto_carnet_frontal', None)
-        foto_carnet_trasera = request.FILES.get('foto_carnet_trasera', None)
+        # Manejar fotos del carnet si se subieron (con el formulario o antes, por partes)
+        foto_carnet_frontal, subida_frontal = archivo_del_formulario(request, 'foto_carnet_frontal')
+        foto_carnet_trasera, subida_trasera = archivo_del_formulario(request, 'foto_carnet_trasera')
         
         # Crear o actualizar adoptante con todos los datos del formulario completo
         adoptante, created = Adoptante.objects.get_or_create(
@@ -265,6 +303,7 @@ def solicitar_adopcion(request, animal_id):
             adoptante.acepta_enviar_fotos = request.POST.get('acepta_enviar_fotos') == '1'
             adoptante.acepta_tenencia_indoor = request.POST.get('acepta_tenencia_indoor') == '1'
             adoptante.save()
+        reclamar(subida_frontal, subida_trasera)
         
         # Crear SOLICITUD de adopción (no adopción directa)
         solicitud = SolicitudAdopcion.objects.create(
@@ -279,17 +318,23 @@ def solicitar_adopcion(request, animal_id):
     return render(request, 'solicitar_adopcion.html', {'animal': animal})
 
 # Vista para donaciones (público)
+@presupuesto_memoria(10000)
+@subida_de_imagenes
 def realizar_donacion(request):
     if request.method == 'POST':
         form = DonacionForm(request.POST, request.FILES)
         usuario_id = request.session.get('usuario_id')
+        # El comprobante puede venir de una subida por partes ya terminada
+        comprobante, subida = archivo_del_formulario(request, 'comprobante')
+        if subida:
+            form.fields['comprobante'].required = False
         
         # Validar que usuarios no registrados ingresen su nombre
         if not usuario_id and not request.POST.get('nombre_donante'):
             messages.error(request, 'Por favor ingresa tu nombre completo')
             return render(request, 'donacion.html', {'form': form, 'usuario_logueado': False})
         
-        if form.is_valid():
+        if formulario_valido(form, request):
             donacion = form.save(commit=False)
             if usuario_id:
                 donacion.id_usuario = Usuario.objects.get(id=usuario_id)
@@ -298,7 +343,10 @@ def realizar_donacion(request):
             if not donacion.fecha:
                 from datetime import date
                 donacion.fecha = date.today()
+            if subida:
+                donacion.comprobante = comprobante
             donacion.save()
+            reclamar(subida)
             messages.success(request, '¡Gracias por tu donación!')
             return redirect('index')
     else:
@@ -308,6 +356,9 @@ def realizar_donacion(request):
     return render(request, 'donacion.html', {'form': form, 'usuario_logueado': usuario_logueado})
 
 # Vista para ver comprobantes (público)
+@presupuesto_memoria(1000)
+@presupuesto_consultas(11)
+@lectura_en_replica
 def ver_comprobantes(request):
     donaciones = Donacion.objects.filter(comprobante__isnull=False).order_by('-fecha')
     return render(request, 'ver_comprobantes.html', {'donaciones': donaciones})
@@ -351,25 +402,28 @@ def inscripcion_voluntario(request):
 
 # Vista para registrar entrevistas (admin/voluntario)
 @requiere_permiso(['admin', 'voluntario'])
+@auditada
 def registrar_entrevista(request, adopcion_id):
+    from mainApp import transiciones
+
     adopcion = get_object_or_404(Adopcion, id=adopcion_id)
     
     if request.method == 'POST':
         form = EntrevistaAdopcionForm(request.POST)
         if form.is_valid():
-            entrevista = form.save(commit=False)
-            entrevista.id_adopcion = adopcion
-            entrevista.save()
-            
-            # Actualizar estado de adopción según resultado
-            if entrevista.resultado == 'aprobado':
-                adopcion.estado = 'aprobado'
-            else:
-                adopcion.estado = 'rechazado'
-            adopcion.save()
+            version = int(request.POST['version']) if request.POST.get('version', '').isdigit() else None
+            # El resultado decide el estado de la adopción (aprobado: completada,
+            # si no: cancelada) con la misma transición condicional del dashboard
+            try:
+                transiciones.registrar_entrevista(adopcion, form.save(commit=False), version)
+            except transiciones.Conflicto as conflicto:
+                messages.error(request, str(conflicto))
+                response = _listar_solicitudes(request)
+                response.status_code = 409
+                return response
             
             messages.success(request, 'Entrevista registrada exitosamente')
-            return redirect('lista_adopciones')
+            return redirect('ver_solicitudes')
     else:
         form = EntrevistaAdopcionForm()
     
@@ -377,6 +431,7 @@ def registrar_entrevista(request, adopcion_id):
 
 # Vista para listar solicitudes de adopción (admin/voluntario)
 @requiere_permiso(['admin', 'voluntario'])
+@lectura_en_replica
 def lista_adopciones(request):
     adopciones = Adopcion.objects.all().order_by('-fecha_solicitud')
     return render(request, 'lista_adopciones.html', {'adopciones': adopciones})
@@ -399,6 +454,7 @@ def cambiar_rol_usuario(request, usuario_id):
     return redirect('gestionar_usuarios')
 
 # Vista para perfil de usuario
+@presupuesto_consultas(5)
 def perfil(request):
     usuario_id = request.session.get('usuario_id')
     if not usuario_id:
@@ -436,6 +492,7 @@ def perfil(request):
     return render(request, 'perfil.html', {'usuario': usuario})
 
 # Vista para mis adopciones
+@presupuesto_consultas(6)
 def mis_adopciones(request):
     usuario_id = request.session.get('usuario_id')
     if not usuario_id:
@@ -460,14 +517,39 @@ def mis_adopciones(request):
         'adopciones': adopciones
     })
 
+def _registrar_vacuna(request, id_animal):
+    """Dosis de los campos vacuna/fecha_vacuna/proxima_dosis del formulario, o None si no se indicó"""
+    from mainApp import vacunas
+
+    vacuna, fecha = request.POST.get('vacuna'), request.POST.get('fecha_vacuna')
+    if not vacuna or not fecha:
+        return None
+    if vacuna not in vacunas.VIGENCIA_DIAS:
+        raise ValueError(f'Vacuna desconocida: {vacuna}')
+    proxima = request.POST.get('proxima_dosis')
+    return vacunas.registrar(id_animal, vacuna, datetime.date.fromisoformat(fecha),
+                             datetime.date.fromisoformat(proxima) if proxima else None,
+                             usuario_id=request.session.get('usuario_id'))
+
 # Vista para gestionar animales (admin/voluntario)
+@presupuesto_memoria(1600)
+@presupuesto_consultas(7)
+@subida_de_imagenes
 @requiere_permiso(['admin', 'voluntario'])
+@lectura_en_replica
+@auditada
 def gestionar_animales(request):
+    from mainApp import historial, vacunas
     from mainApp.models import FichaMedica
     
     if request.method == 'POST':
         accion = request.POST.get('accion')
         
+        if rechazos(request):
+            for mensaje in rechazos(request).values():
+                messages.error(request, mensaje)
+            return redirect('gestionar_animales')
+        
         if accion == 'agregar':
             try:
                 # Obtener o crear hogar temporal
@@ -516,13 +598,13 @@ def gestionar_animales(request):
                     id_hogar=hogar
                 )
                 
+                vacunacion = _registrar_vacuna(request, animal.id)
                 # Crear ficha médica automáticamente
                 FichaMedica.objects.create(
                     id_animal=animal,
                     esterilizado=request.POST.get('esterilizado') == 'on',
                     fecha_esterilizacion=request.POST.get('fecha_esterilizacion') or None,
-                    vacunas_al_dia=request.POST.get('vacunas_al_dia') == 'on',
-                    ultima_vacunacion=request.POST.get('ultima_vacunacion', ''),
+                    ultima_vacunacion=vacunas.resumen(vacunacion) if vacunacion else '',
                     ultimo_control=request.POST.get('ultimo_control') or None,
                     proximo_control=request.POST.get('proximo_control') or None,
                     estado_salud=request.POST.get('estado_salud_ficha', 'Por evaluar'),
@@ -560,16 +642,21 @@ def gestionar_animales(request):
                 animal = get_object_or_404(Animal, id=id_animal)
                 ficha = FichaMedica.objects.get(id_animal=animal)
                 
-                ficha.esterilizado = request.POST.get('esterilizado') == 'on'
-                ficha.fecha_esterilizacion = request.POST.get('fecha_esterilizacion') or None
-                ficha.vacunas_al_dia = request.POST.get('vacunas_al_dia') == 'on'
-                ficha.ultima_vacunacion = request.POST.get('ultima_vacunacion', '')
-                ficha.ultimo_control = request.POST.get('ultimo_control') or None
-                ficha.proximo_control = request.POST.get('proximo_control') or None
-                ficha.estado_salud = request.POST.get('estado_salud_ficha', '')
-                ficha.observaciones = request.POST.get('observaciones', '')
-                
-                ficha.save()
+                valores = {
+                    'esterilizado': request.POST.get('esterilizado') == 'on',
+                    'fecha_esterilizacion': request.POST.get('fecha_esterilizacion') or None,
+                }
+                vacunacion = _registrar_vacuna(request, animal.id)
+                if vacunacion:
+                    valores['ultima_vacunacion'] = vacunas.resumen(vacunacion)
+                valores.update({
+                    'ultimo_control': request.POST.get('ultimo_control') or None,
+                    'proximo_control': request.POST.get('proximo_control') or None,
+                    'estado_salud': request.POST.get('estado_salud_ficha', ''),
+                    'observaciones': request.POST.get('observaciones', ''),
+                })
+                # La ficha no se sobrescribe: cada cambio queda en el historial (mainApp.historial)
+                historial.registrar_cambios(ficha, valores, usuario_id=request.session.get('usuario_id'))
                 messages.success(request, f'Ficha médica de {animal.nombre} actualizada exitosamente')
             except Exception as e:
                 messages.error(request, f'Error al editar ficha médica: {str(e)}')
@@ -588,60 +675,102 @@ def gestionar_animales(request):
     hogares = HogarTemporal.objects.all()
     return render(request, 'gestionar_animales.html', {'animales': animales, 'hogares': hogares})
 
-# API para obtener ficha médica
+# API para obtener ficha médica (una consulta, ver mainApp.api)
+@presupuesto_consultas(5)
 @requiere_permiso(['admin', 'voluntario'])
-def obtener_ficha_medica(request, id_animal):
-    from django.http import JsonResponse
-    from mainApp.models import FichaMedica
-    
-    try:
-        animal = get_object_or_404(Animal, id=id_animal)
-        ficha = FichaMedica.objects.get(id_animal=animal)
-        
-        data = {
-            'esterilizado': ficha.esterilizado,
-            'fecha_esterilizacion': ficha.fecha_esterilizacion.isoformat() if ficha.fecha_esterilizacion else None,
-            'vacunas_al_dia': ficha.vacunas_al_dia,
-            'ultima_vacunacion': ficha.ultima_vacunacion,
-            'ultimo_control': ficha.ultimo_control.isoformat() if ficha.ultimo_control else None,
-            'proximo_control': ficha.proximo_control.isoformat() if ficha.proximo_control else None,
-            'estado_salud': ficha.estado_salud,
-            'observaciones': ficha.observaciones
-        }
-        return JsonResponse(data)
-    except FichaMedica.DoesNotExist:
-        return JsonResponse({'error': 'Ficha médica no encontrada'}, status=404)
-    except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
+async def obtener_ficha_medica(request, id_animal):
+    from mainApp import api
+
+    return await api.ficha(request, id_animal)
+
+# Historial médico de un animal, por páginas (ver mainApp.historial)
+@presupuesto_consultas(5)
+@requiere_permiso(['admin', 'voluntario'])
+async def historial_ficha_medica(request, id_animal):
+    from mainApp import api
+
+    return await api.historial_ficha(request, id_animal)
+
+# Fichas médicas de varios animales: /api/fichas/?ids=1,2,3
+@presupuesto_consultas(5)
+@requiere_permiso(['admin', 'voluntario'])
+async def obtener_fichas_medicas(request):
+    from mainApp import api
+
+    return await api.fichas(request)
 
 # Vista para ver solicitudes (admin/voluntario)
+@presupuesto_memoria(10500)
+@presupuesto_consultas(21)
 @requiere_permiso(['admin', 'voluntario'])
-def ver_solicitudes(request):
+@lectura_en_replica
+async def ver_solicitudes(request):
+    # El trabajo con la base de datos va en un hilo; los correos se envían
+    # después, en paralelo y sin bloquear el worker
+    if request.method == 'POST':
+        from mainApp.transiciones import Conflicto
+
+        try:
+            correos = await sync_to_async(_procesar_accion_solicitud)(request)
+        except Conflicto as conflicto:
+            # Otro moderador llegó antes: el dashboard actualizado, sin aplicar nada
+            messages.error(request, str(conflicto))
+            response = await sync_to_async(_listar_solicitudes)(request)
+            response.status_code = 409
+            return response
+        await _enviar_correos(request, correos)
+        return redirect('ver_solicitudes')
+    return await sync_to_async(_listar_solicitudes)(request)
+
+
+# Correo que una acción de ver_solicitudes deja listo para enviar. exito y
+# error son los mensajes para el admin según el resultado del envío.
+CorreoPendiente = namedtuple('CorreoPendiente', 'asunto mensaje destinatarios exito error nivel',
+                             defaults=[messages.SUCCESS])
+
+
+async def _enviar_correos(request, correos):
+    resultados = await asyncio.gather(
+        *(enviar_correo(c.asunto, c.mensaje, c.destinatarios) for c in correos), return_exceptions=True,
+    )
+    for correo, resultado in zip(correos, resultados):
+        if isinstance(resultado, Exception):
+            messages.warning(request, f'{correo.error}: {str(resultado)}')
+        else:
+            messages.add_message(request, correo.nivel, correo.exito)
+
+
+@auditada
+def _procesar_accion_solicitud(request):
+    """
+    Aplica la acción del POST de ver_solicitudes y devuelve los correos a
+    enviar. Los cambios de estado de adopción pasan por mainApp.transiciones
+    con la versión que mostró el formulario; si otro moderador cambió la fila
+    se lanza transiciones.Conflicto.
+    """
+    from mainApp import transiciones
     from mainApp.models import EntrevistaVoluntario
     from datetime import datetime
-    from django.core.mail import send_mail
-    from django.conf import settings
     
-    if request.method == 'POST':
-        accion = request.POST.get('accion')
-        usuario_id = request.session.get('usuario_id')
+    correos = []
+    accion = request.POST.get('accion')
+    usuario_id = request.session.get('usuario_id')
+    version = int(request.POST['version']) if request.POST.get('version', '').isdigit() else None
+    
+    if accion == 'agendar_entrevista':
+        id_solicitud = request.POST.get('id_adopcion')  # Mantener nombre del campo por compatibilidad
+        fecha_entrevista = request.POST.get('fecha_entrevista')
+        link_zoom = request.POST.get('link_zoom', '')  # Solo para enviar por correo
         
-        if accion == 'agendar_entrevista':
-            id_solicitud = request.POST.get('id_adopcion')  # Mantener nombre del campo por compatibilidad
-            fecha_entrevista = request.POST.get('fecha_entrevista')
-            link_zoom = request.POST.get('link_zoom', '')  # Solo para enviar por correo
-            
-            solicitud = get_object_or_404(SolicitudAdopcion, id=id_solicitud)
-            solicitud.estado = 'entrevista_agendada'
-            solicitud.fecha_entrevista = fecha_entrevista
-            solicitud.procesado_por_id = usuario_id
-            solicitud.save()
-            
-            # Enviar correo al adoptante
-            try:
-                fecha_formateada = datetime.strptime(fecha_entrevista, '%Y-%m-%dT%H:%M').strftime('%d/%m/%Y a las %H:%M')
-                asunto = f'🐾 Entrevista Agendada - Adopción de {solicitud.id_animal.nombre}'
-                mensaje = f"""
+        solicitud = get_object_or_404(SolicitudAdopcion, id=id_solicitud)
+        transiciones.transicionar(solicitud, 'entrevista_agendada', version,
+                                  fecha_entrevista=fecha_entrevista, procesado_por_id=usuario_id)
+        
+        # Enviar correo al adoptante
+        try:
+            fecha_formateada = datetime.strptime(fecha_entrevista, '%Y-%m-%dT%H:%M').strftime('%d/%m/%Y a las %H:%M')
+            asunto = f'🐾 Entrevista Agendada - Adopción de {solicitud.id_animal.nombre}'
+            mensaje = f"""
 Hola {solicitud.id_adoptante.nombre},
 
 ¡Tenemos buenas noticias! Tu solicitud para adoptar a {solicitud.id_animal.nombre} ha sido revisada y hemos agendado una entrevista contigo.
@@ -660,72 +789,50 @@ Si tienes alguna duda o necesitas reagendar, contáctanos por Instagram @rescata
 
 Con cariño,
 Equipo RescatandoAndo Stgo 🐶🐱
-                """
-                
-                send_mail(
-                    asunto,
-                    mensaje,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [solicitud.id_adoptante.email],
-                    fail_silently=False,
-                )
-                messages.success(request, f'Entrevista agendada para {solicitud.id_adoptante.nombre}. Correo enviado exitosamente.')
-            except Exception as e:
-                messages.warning(request, f'Entrevista agendada pero hubo un error al enviar el correo: {str(e)}')
-        
-        elif accion == 'marcar_entrevista_realizada':
-            id_solicitud = request.POST.get('id_adopcion')
-            observaciones = request.POST.get('observaciones', '')
+            """
             
-            solicitud = get_object_or_404(SolicitudAdopcion, id=id_solicitud)
-            solicitud.estado = 'entrevista_realizada'
-            solicitud.observaciones_entrevista = observaciones
-            solicitud.save()
-            messages.info(request, 'Entrevista marcada como realizada')
+            correos.append(CorreoPendiente(
+                asunto, mensaje, [solicitud.id_adoptante.email],
+                exito=f'Entrevista agendada para {solicitud.id_adoptante.nombre}. Correo enviado exitosamente.',
+                error='Entrevista agendada pero hubo un error al enviar el correo',
+            ))
+        except Exception as e:
+            messages.warning(request, f'Entrevista agendada pero hubo un error al enviar el correo: {str(e)}')
+    
+    elif accion == 'marcar_entrevista_realizada':
+        id_solicitud = request.POST.get('id_adopcion')
+        observaciones = request.POST.get('observaciones', '')
         
-        elif accion == 'aprobar_adopcion':
-            id_solicitud = request.POST.get('id_adopcion')
-            solicitud = get_object_or_404(SolicitudAdopcion, id=id_solicitud)
-            solicitud.estado = 'aprobada'
-            solicitud.fecha_aprobacion = datetime.now().date()
-            solicitud.procesado_por_id = usuario_id
-            solicitud.save()
-            
-            # CREAR LA ADOPCIÓN REAL y marcar animal como no disponible
-            adopcion = Adopcion.objects.create(
-                id_animal=solicitud.id_animal,
-                id_adoptante=solicitud.id_adoptante,
-                solicitud_origen=solicitud,
-                aprobado_por_id=usuario_id,
-                estado='en_proceso'
-            )
-            
-            # Marcar animal como no disponible
-            animal = solicitud.id_animal
-            animal.disponible = False
-            animal.save()
-            
-            # Generar el contrato automáticamente
-            from mainApp.utils import generar_contrato_pdf
-            contrato = Contrato.objects.create(
-                id_adopcion=adopcion,
-                id_adoptante=solicitud.id_adoptante,
-                acepta_seguimiento=solicitud.id_adoptante.acepta_seguimiento,
-                compromiso_cuidado=f'Compromiso de cuidado para {solicitud.id_animal.nombre}'
-            )
-            
-            if generar_contrato_pdf(contrato):
-                adopcion.estado = 'contrato_generado'
-                adopcion.fecha_contrato = datetime.now().date()
-                adopcion.save()
-                mensaje_contrato = ' Contrato generado automáticamente.'
-            else:
-                mensaje_contrato = ' Contrato creado pero falta generar PDF (instala reportlab).'
-            
-            # Enviar correo de aprobación
-            try:
-                asunto = f'🎉 ¡Adopción Aprobada! - {solicitud.id_animal.nombre}'
-                mensaje = f"""
+        solicitud = get_object_or_404(SolicitudAdopcion, id=id_solicitud)
+        transiciones.transicionar(solicitud, 'entrevista_realizada', version, observaciones_entrevista=observaciones)
+        messages.info(request, 'Entrevista marcada como realizada')
+    
+    elif accion == 'aprobar_adopcion':
+        id_solicitud = request.POST.get('id_adopcion')
+        solicitud = get_object_or_404(SolicitudAdopcion, id=id_solicitud)
+        # CREAR LA ADOPCIÓN REAL y marcar animal como no disponible, con el
+        # animal bloqueado: una sola adopción por animal aunque aprueben dos
+        adopcion = transiciones.aprobar(solicitud, usuario_id, version)
+        
+        # Generar el contrato automáticamente
+        from mainApp.utils import generar_contrato_pdf
+        contrato = Contrato.objects.create(
+            id_adopcion=adopcion,
+            id_adoptante=solicitud.id_adoptante,
+            acepta_seguimiento=solicitud.id_adoptante.acepta_seguimiento,
+            compromiso_cuidado=f'Compromiso de cuidado para {solicitud.id_animal.nombre}'
+        )
+        
+        if generar_contrato_pdf(contrato):
+            transiciones.transicionar(adopcion, 'contrato_generado', fecha_contrato=datetime.now().date())
+            mensaje_contrato = ' Contrato generado automáticamente.'
+        else:
+            mensaje_contrato = ' Contrato creado pero falta generar PDF (instala reportlab).'
+        
+        # Enviar correo de aprobación
+        try:
+            asunto = f'🎉 ¡Adopción Aprobada! - {solicitud.id_animal.nombre}'
+            mensaje = f"""
 Hola {solicitud.id_adoptante.nombre},
 
 ¡Felicitaciones! 🎊 
@@ -744,34 +851,30 @@ Recuerda que estaremos en contacto constante para hacer seguimiento y asegurarno
 
 Con mucho cariño,
 Equipo RescatandoAndo Stgo 🐶🐱💕
-                """
-                
-                send_mail(
-                    asunto,
-                    mensaje,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [solicitud.id_adoptante.email],
-                    fail_silently=False,
-                )
-                messages.success(request, f'Solicitud aprobada. Adopción creada, {solicitud.id_animal.nombre} marcado como no disponible.{mensaje_contrato} Correo enviado.')
-            except Exception as e:
-                messages.warning(request, f'Adopción aprobada pero hubo un error al enviar el correo: {str(e)}')
-        
-        elif accion == 'rechazar_adopcion':
-            id_solicitud = request.POST.get('id_adopcion')
-            motivo = request.POST.get('motivo_rechazo', '')
+            """
             
-            solicitud = get_object_or_404(SolicitudAdopcion, id=id_solicitud)
-            solicitud.estado = 'rechazada'
-            solicitud.motivo_rechazo = motivo
-            solicitud.procesado_por_id = usuario_id
-            solicitud.save()
-            messages.warning(request, 'Solicitud de adopción rechazada')
+            correos.append(CorreoPendiente(
+                asunto, mensaje, [solicitud.id_adoptante.email],
+                exito=f'Solicitud aprobada. Adopción creada, {solicitud.id_animal.nombre} marcado como no disponible.{mensaje_contrato} Correo enviado.',
+                error='Adopción aprobada pero hubo un error al enviar el correo',
+            ))
+        except Exception as e:
+            messages.warning(request, f'Adopción aprobada pero hubo un error al enviar el correo: {str(e)}')
+    
+    elif accion == 'rechazar_adopcion':
+        id_solicitud = request.POST.get('id_adopcion')
+        motivo = request.POST.get('motivo_rechazo', '')
         
-        elif accion == 'generar_contrato':
-            id_adopcion = request.POST.get('id_adopcion')
-            adopcion = get_object_or_404(Adopcion, id=id_adopcion)
-            
+        solicitud = get_object_or_404(SolicitudAdopcion, id=id_solicitud)
+        transiciones.transicionar(solicitud, 'rechazada', version, motivo_rechazo=motivo, procesado_por_id=usuario_id)
+        messages.warning(request, 'Solicitud de adopción rechazada')
+    
+    elif accion == 'generar_contrato':
+        id_adopcion = request.POST.get('id_adopcion')
+        adopcion = get_object_or_404(Adopcion, id=id_adopcion)
+        
+        # Si otro moderador cambió la adopción, el contrato nuevo se descarta
+        with transaction.atomic():
             # Crear el contrato
             contrato = Contrato.objects.create(
                 id_adopcion=adopcion,
@@ -782,45 +885,45 @@ Equipo RescatandoAndo Stgo 🐶🐱💕
             
             # Generar el PDF del contrato
             from mainApp.utils import generar_contrato_pdf
-            if generar_contrato_pdf(contrato):
-                adopcion.estado = 'contrato_generado'
-                adopcion.fecha_contrato = datetime.now().date()
-                adopcion.save()
-                messages.success(request, f'Contrato generado exitosamente para {adopcion.id_adoptante.nombre}')
-            else:
-                messages.error(request, 'Error al generar el PDF del contrato. Instala reportlab: pip install reportlab')
-        
-        elif accion == 'aprobar_voluntario':
-            id_entrevista = request.POST.get('id_entrevista')
-            entrevista = get_object_or_404(EntrevistaVoluntario, id=id_entrevista)
-            entrevista.resultado = 'aprobado'
-            entrevista.save()
-            messages.success(request, 'Voluntario aprobado')
+            generado = generar_contrato_pdf(contrato)
+            if generado:
+                transiciones.transicionar(adopcion, 'contrato_generado', version, fecha_contrato=datetime.now().date())
+        if generado:
+            messages.success(request, f'Contrato generado exitosamente para {adopcion.id_adoptante.nombre}')
+        else:
+            messages.error(request, 'Error al generar el PDF del contrato. Instala reportlab: pip install reportlab')
+    
+    elif accion == 'aprobar_voluntario':
+        id_entrevista = request.POST.get('id_entrevista')
+        entrevista = get_object_or_404(EntrevistaVoluntario, id=id_entrevista)
+        entrevista.resultado = 'aprobado'
+        entrevista.save()
+        messages.success(request, 'Voluntario aprobado')
+    
+    elif accion == 'rechazar_voluntario':
+        id_entrevista = request.POST.get('id_entrevista')
+        entrevista = get_object_or_404(EntrevistaVoluntario, id=id_entrevista)
+        entrevista.resultado = 'rechazado'
+        entrevista.save()
+        messages.warning(request, 'Voluntario rechazado')
+    
+    # Acciones para solicitudes de voluntariado
+    elif accion == 'agendar_entrevista_voluntariado':
+        id_solicitud = request.POST.get('id_solicitud')
+        fecha_entrevista = request.POST.get('fecha_entrevista')
+        link_zoom = request.POST.get('link_zoom', '')  # Solo para enviar por correo
         
-        elif accion == 'rechazar_voluntario':
-            id_entrevista = request.POST.get('id_entrevista')
-            entrevista = get_object_or_404(EntrevistaVoluntario, id=id_entrevista)
-            entrevista.resultado = 'rechazado'
-            entrevista.save()
-            messages.warning(request, 'Voluntario rechazado')
+        solicitud = get_object_or_404(SolicitudVoluntariado, id=id_solicitud)
+        solicitud.estado = 'entrevista_agendada'
+        solicitud.fecha_entrevista = fecha_entrevista
+        solicitud.procesado_por_id = usuario_id
+        solicitud.save()
         
-        # Acciones para solicitudes de voluntariado
-        elif accion == 'agendar_entrevista_voluntariado':
-            id_solicitud = request.POST.get('id_solicitud')
-            fecha_entrevista = request.POST.get('fecha_entrevista')
-            link_zoom = request.POST.get('link_zoom', '')  # Solo para enviar por correo
-            
-            solicitud = get_object_or_404(SolicitudVoluntariado, id=id_solicitud)
-            solicitud.estado = 'entrevista_agendada'
-            solicitud.fecha_entrevista = fecha_entrevista
-            solicitud.procesado_por_id = usuario_id
-            solicitud.save()
-            
-            # Enviar correo al voluntario
-            try:
-                fecha_formateada = datetime.strptime(fecha_entrevista, '%Y-%m-%dT%H:%M').strftime('%d/%m/%Y a las %H:%M')
-                asunto = f'🙌 Entrevista Agendada - Voluntariado en {solicitud.get_equipo_display()}'
-                mensaje = f"""
+        # Enviar correo al voluntario
+        try:
+            fecha_formateada = datetime.strptime(fecha_entrevista, '%Y-%m-%dT%H:%M').strftime('%d/%m/%Y a las %H:%M')
+            asunto = f'🙌 Entrevista Agendada - Voluntariado en {solicitud.get_equipo_display()}'
+            mensaje = f"""
 Hola {solicitud.nombre_completo},
 
 ¡Excelentes noticias! Tu solicitud para unirte como voluntario/a en el equipo de {solicitud.get_equipo_display()} ha sido revisada y hemos agendado una entrevista contigo.
@@ -840,33 +943,30 @@ Si tienes alguna duda o necesitas reagendar, contáctanos por Instagram @rescata
 
 Con cariño,
 Equipo RescatandoAndo Stgo 🐾
-                """
-                
-                send_mail(
-                    asunto,
-                    mensaje,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [solicitud.email],
-                    fail_silently=False,
-                )
-                messages.success(request, f'Entrevista agendada para {solicitud.nombre_completo}. Correo enviado exitosamente.')
-            except Exception as e:
-                messages.warning(request, f'Entrevista agendada pero hubo un error al enviar el correo: {str(e)}')
-        
-        elif accion == 'aprobar_voluntariado':
-            id_solicitud = request.POST.get('id_solicitud')
-            observaciones = request.POST.get('observaciones_admin', '')
-            
-            solicitud = get_object_or_404(SolicitudVoluntariado, id=id_solicitud)
-            solicitud.estado = 'aprobada'
-            solicitud.observaciones_admin = observaciones
-            solicitud.procesado_por_id = usuario_id
-            solicitud.save()
+            """
             
-            # Enviar correo de aprobación
-            try:
-                asunto = f'🎉 ¡Bienvenido/a al Equipo! - {solicitud.get_equipo_display()}'
-                mensaje = f"""
+            correos.append(CorreoPendiente(
+                asunto, mensaje, [solicitud.email],
+                exito=f'Entrevista agendada para {solicitud.nombre_completo}. Correo enviado exitosamente.',
+                error='Entrevista agendada pero hubo un error al enviar el correo',
+            ))
+        except Exception as e:
+            messages.warning(request, f'Entrevista agendada pero hubo un error al enviar el correo: {str(e)}')
+    
+    elif accion == 'aprobar_voluntariado':
+        id_solicitud = request.POST.get('id_solicitud')
+        observaciones = request.POST.get('observaciones_admin', '')
+        
+        solicitud = get_object_or_404(SolicitudVoluntariado, id=id_solicitud)
+        solicitud.estado = 'aprobada'
+        solicitud.observaciones_admin = observaciones
+        solicitud.procesado_por_id = usuario_id
+        solicitud.save()
+        
+        # Enviar correo de aprobación
+        try:
+            asunto = f'🎉 ¡Bienvenido/a al Equipo! - {solicitud.get_equipo_display()}'
+            mensaje = f"""
 Hola {solicitud.nombre_completo},
 
 ¡Felicitaciones! 🎊 
@@ -887,33 +987,30 @@ Próximos pasos:
 
 Con mucho cariño,
 Equipo RescatandoAndo Stgo 🙌💕
-                """
-                
-                send_mail(
-                    asunto,
-                    mensaje,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [solicitud.email],
-                    fail_silently=False,
-                )
-                messages.success(request, f'Solicitud de {solicitud.nombre_completo} aprobada. Correo enviado exitosamente.')
-            except Exception as e:
-                messages.warning(request, f'Solicitud aprobada pero hubo un error al enviar el correo: {str(e)}')
-        
-        elif accion == 'rechazar_voluntariado':
-            id_solicitud = request.POST.get('id_solicitud')
-            observaciones = request.POST.get('observaciones_admin', '')
-            
-            solicitud = get_object_or_404(SolicitudVoluntariado, id=id_solicitud)
-            solicitud.estado = 'rechazada'
-            solicitud.observaciones_admin = observaciones
-            solicitud.procesado_por_id = usuario_id
-            solicitud.save()
+            """
             
-            # Enviar correo de rechazo (opcional, de forma amable)
-            try:
-                asunto = 'Actualización sobre tu solicitud de voluntariado - RescatandoAndo'
-                mensaje = f"""
+            correos.append(CorreoPendiente(
+                asunto, mensaje, [solicitud.email],
+                exito=f'Solicitud de {solicitud.nombre_completo} aprobada. Correo enviado exitosamente.',
+                error='Solicitud aprobada pero hubo un error al enviar el correo',
+            ))
+        except Exception as e:
+            messages.warning(request, f'Solicitud aprobada pero hubo un error al enviar el correo: {str(e)}')
+    
+    elif accion == 'rechazar_voluntariado':
+        id_solicitud = request.POST.get('id_solicitud')
+        observaciones = request.POST.get('observaciones_admin', '')
+        
+        solicitud = get_object_or_404(SolicitudVoluntariado, id=id_solicitud)
+        solicitud.estado = 'rechazada'
+        solicitud.observaciones_admin = observaciones
+        solicitud.procesado_por_id = usuario_id
+        solicitud.save()
+        
+        # Enviar correo de rechazo (opcional, de forma amable)
+        try:
+            asunto = 'Actualización sobre tu solicitud de voluntariado - RescatandoAndo'
+            mensaje = f"""
 Hola {solicitud.nombre_completo},
 
 Gracias por tu interés en formar parte del equipo de voluntarios de RescatandoAndo.
@@ -931,66 +1028,54 @@ Esto no significa que no valores para nosotros. Te invitamos a:
 
 Con cariño,
 Equipo RescatandoAndo Stgo 🐾
-                """
-                
-                send_mail(
-                    asunto,
-                    mensaje,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [solicitud.email],
-                    fail_silently=False,
-                )
-                messages.warning(request, f'Solicitud de {solicitud.nombre_completo} rechazada. Correo enviado.')
-            except Exception as e:
-                messages.warning(request, f'Solicitud rechazada pero hubo un error al enviar el correo: {str(e)}')
-        
-        elif accion == 'eliminar_solicitud':
-            id_solicitud = request.POST.get('id_solicitud')
-            solicitud = get_object_or_404(SolicitudAdopcion, id=id_solicitud)
-            animal_nombre = solicitud.id_animal.nombre
-            
-            # Si la solicitud fue aprobada, volver a hacer disponible el animal
-            if solicitud.estado == 'aprobada':
-                solicitud.id_animal.disponible = True
-                solicitud.id_animal.save()
-            
-            solicitud.delete()
-            messages.success(request, f'Solicitud de {animal_nombre} eliminada correctamente.')
-        
-        elif accion == 'eliminar_adopcion':
-            id_adopcion = request.POST.get('id_adopcion')
-            adopcion = get_object_or_404(Adopcion, id=id_adopcion)
-            animal = adopcion.id_animal
-            animal_nombre = animal.nombre
-            
-            # Si tiene solicitud origen, cambiar su estado a "cancelada" o eliminarla
-            if adopcion.solicitud_origen:
-                solicitud = adopcion.solicitud_origen
-                solicitud.estado = 'rechazada'
-                solicitud.motivo_rechazo = 'Adopción cancelada por administración'
-                solicitud.save()
-            
-            # Eliminar contratos relacionados
-            Contrato.objects.filter(id_adopcion=adopcion).delete()
-            
-            # Volver a hacer disponible el animal
-            animal.disponible = True
-            animal.save()
+            """
             
-            adopcion.delete()
-            messages.success(request, f'Adopción de {animal_nombre} eliminada. Animal disponible nuevamente.')
-        
-        return redirect('ver_solicitudes')
+            correos.append(CorreoPendiente(
+                asunto, mensaje, [solicitud.email],
+                exito=f'Solicitud de {solicitud.nombre_completo} rechazada. Correo enviado.',
+                error='Solicitud rechazada pero hubo un error al enviar el correo',
+                nivel=messages.WARNING,
+            ))
+        except Exception as e:
+            messages.warning(request, f'Solicitud rechazada pero hubo un error al enviar el correo: {str(e)}')
+    
+    elif accion == 'eliminar_solicitud':
+        id_solicitud = request.POST.get('id_solicitud')
+        solicitud = get_object_or_404(SolicitudAdopcion.objects.select_related('id_animal'), id=id_solicitud)
+        animal_nombre = solicitud.id_animal.nombre
+        # Si la solicitud fue aprobada, el animal vuelve a estar disponible
+        transiciones.eliminar_solicitud(solicitud, version)
+        messages.success(request, f'Solicitud de {animal_nombre} eliminada correctamente.')
     
-    # GET - Mostrar SOLICITUDES DE ADOPCIÓN (no adopciones) agrupadas por estado
-    solicitudes_pendientes = SolicitudAdopcion.objects.filter(estado='pendiente').order_by('-fecha_solicitud')
-    solicitudes_entrevista = SolicitudAdopcion.objects.filter(estado__in=['entrevista_agendada', 'entrevista_realizada']).order_by('-fecha_solicitud')
-    solicitudes_aprobadas = SolicitudAdopcion.objects.filter(estado='aprobada').order_by('-fecha_solicitud')
-    solicitudes_rechazadas = SolicitudAdopcion.objects.filter(estado='rechazada').order_by('-fecha_solicitud')
+    elif accion == 'eliminar_adopcion':
+        id_adopcion = request.POST.get('id_adopcion')
+        adopcion = get_object_or_404(Adopcion.objects.select_related('id_animal'), id=id_adopcion)
+        animal_nombre = adopcion.id_animal.nombre
+        # Borra la adopción y su contrato, rechaza la solicitud origen y deja
+        # al animal disponible nuevamente
+        transiciones.eliminar_adopcion(adopcion, version)
+        messages.success(request, f'Adopción de {animal_nombre} eliminada. Animal disponible nuevamente.')
+    
+    return correos
+
+
+def _listar_solicitudes(request):
+    from django.core.handlers.asgi import ASGIRequest
+    from mainApp.eventos import ultimo_id
+    from mainApp.models import EntrevistaVoluntario
+
+    # Mostrar SOLICITUDES DE ADOPCIÓN (no adopciones) agrupadas por estado
+    # select_related: las claves de {% cache_fila %} leen la marca del adoptante y del animal
+    solicitudes = SolicitudAdopcion.objects.select_related('id_animal', 'id_adoptante__id_usuario')
+    solicitudes_pendientes = solicitudes.filter(estado='pendiente').order_by('-fecha_solicitud')
+    solicitudes_entrevista = solicitudes.filter(estado__in=['entrevista_agendada', 'entrevista_realizada']).order_by('-fecha_solicitud')
+    solicitudes_aprobadas = solicitudes.filter(estado='aprobada').order_by('-fecha_solicitud')
+    solicitudes_rechazadas = solicitudes.filter(estado='rechazada').order_by('-fecha_solicitud')
     
     # ADOPCIONES REALES (solo las aprobadas)
-    adopciones_en_proceso = Adopcion.objects.filter(estado__in=['en_proceso', 'contrato_generado']).order_by('-fecha_adopcion')
-    adopciones_completadas = Adopcion.objects.filter(estado='completada').order_by('-fecha_adopcion')
+    adopciones = Adopcion.objects.select_related('id_animal', 'id_adoptante__id_usuario')
+    adopciones_en_proceso = adopciones.filter(estado__in=['en_proceso', 'contrato_generado']).order_by('-fecha_adopcion')
+    adopciones_completadas = adopciones.filter(estado='completada').order_by('-fecha_adopcion')
     
     # Solicitudes de voluntariado por estado
     voluntariado_pendientes = SolicitudVoluntariado.objects.filter(estado='pendiente').order_by('-fecha_solicitud')
@@ -1002,7 +1087,7 @@ Equipo RescatandoAndo Stgo 🐾
     total_solicitudes_voluntariado = SolicitudVoluntariado.objects.all().count()
     
     voluntarios = EntrevistaVoluntario.objects.all().order_by('-fecha')
-    donaciones = Donacion.objects.all().order_by('-fecha')
+    donaciones = Donacion.objects.select_related('id_usuario').order_by('-fecha')
     
     return render(request, 'lista_adopciones.html', {
         'adopciones_pendientes': solicitudes_pendientes,
@@ -1017,11 +1102,17 @@ Equipo RescatandoAndo Stgo 🐾
         'voluntariado_rechazadas': voluntariado_rechazadas,
         'total_solicitudes_voluntariado': total_solicitudes_voluntariado,
         'voluntarios': voluntarios,
-        'donaciones': donaciones
+        'donaciones': donaciones,
+        # Cursor y modo de los avisos en vivo (mainApp.eventos)
+        'eventos_cursor': ultimo_id(),
+        'eventos_sse': isinstance(request, ASGIRequest),
     })
 
 # Vista actualizada para gestionar usuarios (admin)
+@presupuesto_consultas(5)
 @requiere_permiso(['admin'])
+@lectura_en_replica
+@auditada
 def gestionar_usuarios_view(request):
     if request.method == 'POST':
         accion = request.POST.get('accion')
@@ -1068,6 +1159,8 @@ def gestionar_usuarios_view(request):
                     else:
                         # Si no tiene relaciones, eliminar
                         cursor.execute("DELETE FROM mainApp_usuario WHERE id = %s", [id_usuario])
+                        # El DELETE directo no emite post_delete
+                        registrar_baja(usuario)
                         messages.success(request, f'Usuario {nombre_usuario} eliminado correctamente')
                         
             except Usuario.DoesNotExist:
@@ -1082,6 +1175,73 @@ def gestionar_usuarios_view(request):
     return render(request, 'gestionar_usuarios.html', {'usuarios': usuarios})
 
 
+# Métricas en formato Prometheus (token de METRICS_TOKEN o sesión admin)
+def metricas(request):
+    from django.http import HttpResponse, Http404
+    from django.utils.crypto import constant_time_compare
+    from mainApp.metrics import exportar
+
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    
+    autorizacion = request.META.get('HTTP_AUTHORIZATION', '')
+    token_valido = settings.METRICS_TOKEN and constant_time_compare(autorizacion, f'Bearer {settings.METRICS_TOKEN}')
+    if not token_valido and request.session.get('usuario_rol') != 'admin':
+        response = HttpResponse('No autorizado', status=401, content_type='text/plain')
+        response['WWW-Authenticate'] = 'Bearer'
+        return response
+    
+    return HttpResponse(exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# API JSON del dashboard de moderación (filtros, fields= y paginación en mainApp.api)
+@presupuesto_consultas(5)
+@lectura_en_replica
+def api_moderacion(request, recurso):
+    from mainApp import api
+
+    return api.listar(request, recurso)
+
+# Avisos en vivo de ver_solicitudes: SSE bajo ASGI, consultas periódicas bajo WSGI (ver mainApp.eventos)
+async def eventos_dashboard(request):
+    from mainApp import eventos
+
+    return await eventos.eventos(request)
+
+# Subidas por partes de carnets y comprobantes (ver mainApp.subidas)
+def crear_subida(request):
+    from mainApp import subidas
+
+    return subidas.crear_subida(request)
+
+def subida_parcial(request, id_subida):
+    from mainApp import subidas
+
+    return subidas.subida_parcial(request, id_subida)
+
+# Carpetas privadas de archivos subidos: requieren sesión (ver mainApp.medios)
+def servir_medio(request, ruta):
+    from mainApp.medios import servir
+
+    return servir(request, ruta)
+
+# Perfilar un request puntual (solo admin, requiere PROFILING_ENABLED)
+@requiere_permiso(['admin'])
+def perfilar(request):
+    from django.http import Http404
+    from django.utils.http import url_has_allowed_host_and_scheme
+    from mainApp.profiling import PARAMETRO, generar_token
+
+    if not settings.PROFILING_ENABLED:
+        raise Http404
+    
+    # Solo se permite redirigir a rutas del mismo sitio
+    url = request.GET.get('url', '/')
+    if not url_has_allowed_host_and_scheme(url, allowed_hosts={request.get_host()}):
+        url = '/'
+    separador = '&' if '?' in url else '?'
+    return redirect(f"{url}{separador}{PARAMETRO}={generar_token(request.session['usuario_id'])}")
+
+
 def solicitar_voluntariado(request):
     """Vista para procesar solicitud de voluntariado - REQUIERE LOGIN"""
     usuario_id = request.session.get('usuario_id')
@@ -1120,24 +1280,24 @@ def solicitar_voluntariado(request):
 
 
 # Vista para solicitar recuperación de contraseña
-def recuperar_contrasena(request):
+async def recuperar_contrasena(request):
     if request.method == 'POST':
         email = request.POST.get('email')
         
         try:
             # Usar filter().first() en lugar de get() para evitar error con duplicados
-            usuario = Usuario.objects.filter(email=email).first()
+            usuario = await Usuario.objects.filter(email=email).afirst()
             
             if not usuario:
                 messages.error(request, 'No existe un usuario con ese correo electrónico.')
-                return render(request, 'recuperar_contrasena.html')
+                return await sync_to_async(render)(request, 'recuperar_contrasena.html')
             
             # Eliminar tokens antiguos del usuario
-            PasswordResetToken.objects.filter(usuario=usuario).delete()
+            await PasswordResetToken.objects.filter(usuario=usuario).adelete()
             
             # Crear nuevo token
             token = PasswordResetToken.generate_token()
-            PasswordResetToken.objects.create(usuario=usuario, token=token)
+            await PasswordResetToken.objects.acreate(usuario=usuario, token=token)
             
             # Enviar email
             reset_url = f"{request.scheme}://{request.get_host()}/resetear-contrasena/{token}/"
@@ -1157,13 +1317,8 @@ Saludos,
 Equipo RescatandoAndo 🐾
             """
             
-            send_mail(
-                'Recuperación de Contraseña - RescatandoAndo',
-                mensaje,
-                settings.DEFAULT_FROM_EMAIL,
-                [email],
-                fail_silently=False,
-            )
+            # La espera al servidor SMTP no bloquea el worker
+            await enviar_correo('Recuperación de Contraseña - RescatandoAndo', mensaje, [email])
             
             messages.success(request, 'Te hemos enviado un correo con instrucciones para recuperar tu contraseña.')
             return redirect('login')
@@ -1171,7 +1326,7 @@ Equipo RescatandoAndo 🐾
         except Exception as e:
             messages.error(request, f'Error al enviar el correo: {str(e)}')
     
-    return render(request, 'recuperar_contrasena.html')
+    return await sync_to_async(render)(request, 'recuperar_contrasena.html')
 
 
 # Vista para resetear contraseña con token
@@ -0,0 +1,134 @@
+"""
+Arranque del servidor de producción (ver gunicorn.conf.py).
+
+- dimensionar: workers e hilos según las CPUs y la memoria disponibles.
+- precalentar: con preload_app se ejecuta una vez en el proceso maestro,
+  antes del fork. Importa reportlab, compila todas las plantillas de
+  templates/ (quedan en el loader cacheado) y resuelve las URLs. Los workers
+  heredan todo eso por copy-on-write, así que el primer request de cada
+  worker no paga esas importaciones.
+- abrir_conexion: en cada worker, después del fork. Las conexiones a la base
+  (y el pool de psycopg) no se pueden compartir entre procesos, así que el
+  maestro cierra las suyas antes del fork y cada worker abre las propias.
+  Solo tiene sentido con pool o con el worker sync: con gthread el hilo del
+  hook no atiende requests, y su conexión quedaría ociosa toda la vida del
+  worker.
+
+Este módulo no importa modelos al cargarse: gunicorn.conf.py lo usa antes de
+configurar Django.
+"""
+import logging
+import math
+import os
+import time
+
+logger = logging.getLogger('mainApp.rendimiento')
+
+# Memoria residente aproximada de un worker con la aplicación cargada
+MEMORIA_POR_WORKER_MB = 150
+MAXIMO_HILOS = 4
+
+
+def cpus_disponibles():
+    """CPUs que puede usar este proceso (respeta taskset y cpusets)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def memoria_disponible_mb():
+    """Límite del cgroup si existe (contenedores), si no la memoria física"""
+    for ruta in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(ruta) as archivo:
+                valor = archivo.read().strip()
+        except OSError:
+            continue
+        # 'max' o un número enorme significan que no hay límite
+        if valor.isdigit() and int(valor) < 1 << 60:
+            return int(valor) // (1024 * 1024)
+    try:
+        return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def dimensionar(cpus, memoria_mb, memoria_por_worker_mb=MEMORIA_POR_WORKER_MB):
+    """
+    Devuelve (workers, hilos). El objetivo es 2 * CPUs + 1 requests en paralelo.
+    Si la memoria no alcanza para tantos workers, se usan menos workers con
+    más hilos cada uno (hasta MAXIMO_HILOS).
+    """
+    objetivo = 2 * cpus + 1
+    workers = objetivo
+    if memoria_mb:
+        # Se deja un worker de margen para el maestro y los picos
+        workers = min(workers, max(1, memoria_mb // memoria_por_worker_mb - 1))
+    hilos = min(MAXIMO_HILOS, math.ceil(objetivo / workers))
+    return workers, hilos
+
+
+def precalentar():
+    """Carga en el proceso actual lo que de otro modo pagaría el primer request"""
+    from django.conf import settings
+    from django.db import connections
+    from django.template import TemplateSyntaxError
+    from django.template.loader import get_template
+    from django.urls import get_resolver
+
+    tiempos = {}
+
+    inicio = time.perf_counter()
+    try:
+        import reportlab.platypus  # noqa: F401
+        import reportlab.lib.styles  # noqa: F401
+    except ImportError:
+        logger.warning('reportlab no está instalado; los PDF no estarán disponibles')
+    tiempos['reportlab_ms'] = (time.perf_counter() - inicio) * 1000
+
+    inicio = time.perf_counter()
+    plantillas = 0
+    for raiz, _, archivos in os.walk(settings.TEMPLATES_DIR):
+        for nombre in archivos:
+            if not nombre.endswith('.html'):
+                continue
+            ruta = os.path.relpath(os.path.join(raiz, nombre), settings.TEMPLATES_DIR)
+            try:
+                get_template(ruta.replace(os.sep, '/'))
+                plantillas += 1
+            except TemplateSyntaxError as e:
+                logger.warning('No se pudo compilar %s: %s', ruta, e)
+    tiempos['plantillas_ms'] = (time.perf_counter() - inicio) * 1000
+
+    inicio = time.perf_counter()
+    get_resolver().url_patterns
+    tiempos['urls_ms'] = (time.perf_counter() - inicio) * 1000
+
+    inicio = time.perf_counter()
+    abrir_conexion()
+    tiempos['base_ms'] = (time.perf_counter() - inicio) * 1000
+    # Con preload esto corre en el maestro: su conexión no debe heredarse, y
+    # tampoco el pool de psycopg, cuyos hilos no sobreviven al fork
+    for conexion in connections.all():
+        conexion.close()
+        if getattr(conexion, 'pool', None):
+            conexion.close_pool()
+
+    logger.info('Precalentamiento: %d plantillas, %s', plantillas,
+                ', '.join(f'{k}={v:.0f}' for k, v in tiempos.items()))
+    return plantillas, tiempos
+
+
+def abrir_conexion(solo_pool=False):
+    """
+    Abre la conexión a la base de este proceso (y valida las credenciales).
+    Con solo_pool, sin pool no hace nada: la conexión sería de este hilo.
+    """
+    from django.db import connection
+
+    if getattr(connection, 'pool', None):
+        # Llena el pool hasta DB_POOL_MIN_SIZE sin retener una conexión en este hilo
+        connection.pool.open(wait=True)
+    elif not solo_pool:
+        connection.ensure_connection()